@@ -0,0 +1,59 @@
+from telegram import Chat, ChatMember, ChatMemberUpdated
+from cache import AsyncTTLCache
+from utils import env_float, env_int
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+class AdminRoster:
+    """Caches the administrator list of each chat.
+
+    A chat's roster is loaded with a single getChatAdministrators call and
+    kept for ADMIN_ROSTER_TTL seconds. Chat member updates patch cached
+    rosters in place, so promotions and demotions take effect immediately;
+    patching doesn't extend that time, so every roster is still reloaded
+    in full at least once per TTL.
+    """
+
+    def __init__(self, ttl: float | None = None, max_chats: int | None = None):
+        self.cache = AsyncTTLCache(
+            "admins",
+            ttl=ttl or env_float("ADMIN_ROSTER_TTL", 10 * 60),
+            max_entries=max_chats or env_int("ADMIN_ROSTER_MAX_CHATS", 10_000),
+            persist=True,
+        )
+
+    async def get(self, chat: Chat) -> frozenset[int]:
+        """Returns the user IDs of the chat's administrators."""
+        return await self.cache.get_or_fetch(chat.id, lambda: self._load(chat))
+
+    async def is_admin(self, chat: Chat, user_id: int) -> bool:
+        """Checks a user against the chat's cached roster."""
+        return user_id in await self.get(chat)
+
+    @staticmethod
+    async def _load(chat: Chat) -> frozenset[int]:
+        administrators = await chat.get_administrators()
+        return frozenset(member.user.id for member in administrators)
+
+    def apply_update(self, update: ChatMemberUpdated) -> None:
+        """Patches a cached roster from a chat member update."""
+        chat_id = update.chat.id
+        roster = self.cache.get(chat_id)
+        if roster is None:
+            # A roster saved before a restart may not be restored yet; it is out of date now
+            self.cache.invalidate(chat_id)
+            return
+        user_id = update.new_chat_member.user.id
+        if update.new_chat_member.status in ADMIN_STATUSES:
+            roster = roster | {user_id}
+        else:
+            roster = roster - {user_id}
+        self.cache.replace(chat_id, roster)
+
+    def invalidate(self, chat_id: int) -> None:
+        """Forgets a chat's roster so the next check reloads it."""
+        self.cache.invalidate(chat_id)
+
+
+admin_roster = AdminRoster()
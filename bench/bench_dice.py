@@ -0,0 +1,44 @@
+"""Micro-benchmark for the /roll dice engine.
+
+Shows that time and peak memory stay flat as the number of dice grows.
+Run from the repository root:
+
+    python bench/bench_dice.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice  # noqa: E402
+
+
+def measure(expression: str, repeat: int = 5) -> tuple[float, int]:
+    """Returns the best wall time and the peak traced memory of one roll."""
+    spec = dice.parse(expression)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        dice.format_result(dice.roll(spec))
+        best = min(best, time.perf_counter() - started)
+    # Memory is traced separately because tracemalloc slows allocation down
+    tracemalloc.start()
+    dice.format_result(dice.roll(spec))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    print(f"{'expression':<22}{'time (ms)':>12}{'peak (KiB)':>14}")
+    for count in (10, 1_000, 10_000, 100_000, 10_000_000, 1_000_000_000):
+        for suffix in ("", "kh3"):
+            expression = f"{count}d6{suffix}"
+            elapsed, peak = measure(expression)
+            print(f"{expression:<22}{elapsed * 1000:>12.3f}{peak / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Micro-benchmark for the cost of recording metrics.
+
+Compares a bare async handler with the same handler wrapped the way
+metrics.instrument_handlers wraps every registered callback, and times the
+raw Histogram.observe and Counter.inc calls. Run from the repository root:
+
+    python bench/bench_metrics.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+
+CALLS = 200_000
+
+
+async def handler(update, context) -> None:
+    return None
+
+
+async def time_handler(callback, calls: int = CALLS) -> float:
+    """Returns the mean time of one awaited call, in nanoseconds."""
+    started = time.perf_counter()
+    for _ in range(calls):
+        await callback(None, None)
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def time_call(call, calls: int = CALLS) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+async def run() -> None:
+    wrapped = metrics._timed(handler, "bench")
+    bare = min([await time_handler(handler) for _ in range(3)])
+    timed = min([await time_handler(wrapped) for _ in range(3)])
+    histogram = metrics.Histogram("bench_seconds", "Benchmark histogram.", ("command",))
+    counter = metrics.Counter("bench_total", "Benchmark counter.", ("command",))
+    observe = min(time_call(lambda: histogram.observe(0.042, "bench")) for _ in range(3))
+    inc = min(time_call(lambda: counter.inc("bench")) for _ in range(3))
+
+    print(f"{'measurement':<28}{'ns/call':>10}")
+    print(f"{'bare handler':<28}{bare:>10.0f}")
+    print(f"{'instrumented handler':<28}{timed:>10.0f}")
+    print(f"{'  overhead':<28}{timed - bare:>10.0f}")
+    print(f"{'Histogram.observe':<28}{observe:>10.0f}")
+    print(f"{'Counter.inc':<28}{inc:>10.0f}")
+    started = time.perf_counter()
+    text = metrics.render()
+    print(f"render(): {len(text)} bytes in {(time.perf_counter() - started) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
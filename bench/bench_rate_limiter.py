@@ -0,0 +1,84 @@
+"""Drives bursts of sends through PriorityRateLimiter against the fake Bot API.
+
+The fake API answers 429 whenever a chat or the bot exceeds Telegram's flood
+limits, so a correct scheduler should finish with no rejected calls and with
+moderation actions completing before fun replies. Replies beyond what a chat
+may have waiting are dropped by the limiter and counted separately. Run from the repository
+root:
+
+    python bench/bench_rate_limiter.py --sends 300 --chats 20
+    python bench/bench_rate_limiter.py --no-limiter   # for comparison
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram.error import RetryAfter  # noqa: E402
+from telegram.ext import ExtBot  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from rate_limiter import PriorityRateLimiter, SendDropped  # noqa: E402
+
+PORT = 18081
+
+
+async def run(sends: int, chats: int, use_limiter: bool) -> None:
+    api = FakeBotAPI()
+    await api.start(port=PORT)
+    limiter = PriorityRateLimiter() if use_limiter else None
+    bot = ExtBot("123:bench", base_url=f"http://127.0.0.1:{PORT}/bot", rate_limiter=limiter)
+    await bot.initialize()
+
+    finished: dict[str, list[float]] = {"moderation": [], "reply": []}
+    failures = 0
+    dropped = 0
+    started = time.perf_counter()
+
+    async def send(i: int) -> None:
+        nonlocal failures, dropped
+        chat_id = -1000 - random.randrange(chats) if i % 2 else 1 + random.randrange(chats)
+        try:
+            if i % 10 == 0:
+                await bot.ban_chat_member(chat_id=-1000 - random.randrange(chats), user_id=i)
+                finished["moderation"].append(time.perf_counter() - started)
+            else:
+                await bot.send_message(chat_id=chat_id, text=f"message {i}")
+                finished["reply"].append(time.perf_counter() - started)
+        except RetryAfter:
+            failures += 1
+        except SendDropped:
+            dropped += 1
+
+    await asyncio.gather(*(send(i) for i in range(sends)))
+    elapsed = time.perf_counter() - started
+    await bot.shutdown()
+    await api.stop()
+
+    print(f"limiter:           {'on' if use_limiter else 'off'}")
+    print(f"sends:             {sends} in {elapsed:.2f}s")
+    print(f"failed (429):      {failures}")
+    print(f"dropped (queued):  {dropped}")
+    print(f"fake API:          {api.stats()}")
+    for kind, times in finished.items():
+        if times:
+            print(f"{kind + ' done by:':<19}{sorted(times)[len(times) // 2]:.2f}s median, {max(times):.2f}s max")
+    if limiter:
+        print(f"limiter stats:     {limiter.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sends", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--no-limiter", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.sends, args.chats, not args.no_limiter))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compares upstream tail latency with and without the resilience layer.
+
+Requests go through get_json to the local upstream stubs, under a command
+deadline, with the stubs injecting faults on one host:
+
+- spikes: a share of requests take `--spike-latency` seconds longer, which
+  hedged requests should hide;
+- outage: every request is slow and then fails, which the circuit breaker
+  should turn into fast failures.
+
+Run from the repository root:
+
+    python bench/bench_resilience.py --requests 500 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+import resilience  # noqa: E402
+from http_client import get_json  # noqa: E402
+from upstream_stubs import StubTransport, UpstreamStubs  # noqa: E402
+
+HOST = "api.coingecko.com"
+URL = f"https://{HOST}/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
+
+
+def summarize(latencies: list[float], failures: int) -> str:
+    ordered = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return f"p50 {pct(0.5):7.1f} ms  p95 {pct(0.95):7.1f} ms  p99 {pct(0.99):7.1f} ms  failed {failures}"
+
+
+async def drive(client: httpx.AsyncClient, requests: int, concurrency: int, deadline: float) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                with resilience.deadline(deadline):
+                    await get_json(client, URL)
+            except httpx.HTTPError:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, failures
+
+
+async def run(args) -> None:
+    stubs = UpstreamStubs(latency=args.latency)
+    await stubs.start()
+    scenarios = {
+        "spikes": {"host_spike_rate": {HOST: args.spike_rate}},
+        "outage": {"host_latency": {HOST: 0.5}, "host_error_rate": {HOST: 1.0}},
+    }
+    for scenario, faults in scenarios.items():
+        stubs.host_spike_rate = faults.get("host_spike_rate", {})
+        stubs.host_latency = faults.get("host_latency", {})
+        stubs.host_error_rate = faults.get("host_error_rate", {})
+        stubs.spike_latency = args.spike_latency
+        print(f"{scenario}:")
+        for label, resilient in (("plain", False), ("resilient", True)):
+            resilience._breakers.clear()
+            transport = StubTransport(stubs.port)
+            if resilient:
+                transport = resilience.ResilientTransport(transport)
+            async with httpx.AsyncClient(transport=transport) as client:
+                # Warm up so the hedge delay reflects the host's normal latency
+                await drive(client, 100, args.concurrency, args.deadline)
+                resilience._breakers.clear()
+                latencies, failures = await drive(client, args.requests, args.concurrency, args.deadline)
+            print(f"  {label:<10} {summarize(latencies, failures)}")
+    # Let the stubs finish requests abandoned by hedging or deadlines
+    await asyncio.sleep(args.spike_latency)
+    await stubs.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean upstream latency in seconds")
+    parser.add_argument("--spike-rate", type=float, default=0.05)
+    parser.add_argument("--spike-latency", type=float, default=1.0)
+    parser.add_argument("--deadline", type=float, default=3.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark for startup time and command dispatch.
+
+Starts fresh interpreters to time `import main` and build_application,
+with handler modules loaded lazily (the default) and eagerly
+(PRELOAD_HANDLERS=1), and lists the slow optional modules each leaves
+imported. Then compares the cost of finding the handler for a command
+through the CommandRouter with trying one CommandHandler per command in
+turn, as the application did before. Run from the repository root:
+
+    python bench/bench_startup.py
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Modules that only some commands need
+WATCHED = ("qrcode", "PIL", "qr_engine", "calculator", "dice", "timezones", "wiki_engine", "admins")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.build_application("123456:bench")
+built = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "build_ms": (built - imported) * 1000,
+    "modules": len(sys.modules),
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (WATCHED,)
+
+
+def probe(preload: bool, runs: int) -> dict:
+    """Returns the fastest of several cold starts in a fresh interpreter."""
+    env = dict(os.environ, PRELOAD_HANDLERS="1" if preload else "0", METRICS_PORT="0", LOG_LEVEL="WARNING")
+    results = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=ROOT, env=env, text=True)
+        result = json.loads(output.splitlines()[-1])
+        result["process_ms"] = (time.perf_counter() - started) * 1000
+        results.append(result)
+    return min(results, key=lambda result: result["process_ms"])
+
+
+def make_updates(commands: list[str], bot, count: int) -> list:
+    from telegram import Update
+    rng = random.Random(1)
+    updates = []
+    for update_id in range(count):
+        text = f"/{rng.choice(commands)} some args"
+        updates.append(Update.de_json({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": 1, "type": "private"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+            },
+        }, bot))
+    return updates
+
+
+def time_dispatch(handlers: list, updates: list) -> float:
+    """Returns the mean time to find the handler for one update, in microseconds."""
+    started = time.perf_counter()
+    for update in updates:
+        for handler in handlers:
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                break
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+def dispatch_costs(count: int) -> tuple[float, float]:
+    from telegram import User
+    from telegram.ext import CommandHandler, ExtBot
+    from handlers import ROUTES
+    from router import CommandRouter
+
+    async def callback(update, context) -> None:
+        return None
+
+    bot = ExtBot("123456:bench")
+    bot._bot_user = User(123456, "Bench", is_bot=True, username="BenchBot")
+    updates = make_updates(list(ROUTES), bot, count)
+    per_command = [CommandHandler(command, callback) for command in ROUTES]
+    router = [CommandRouter(ROUTES)]
+    sequential = min(time_dispatch(per_command, updates) for _ in range(3))
+    routed = min(time_dispatch(router, updates) for _ in range(3))
+    return sequential, routed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per configuration")
+    parser.add_argument("--updates", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'startup':<8}{'import ms':>11}{'build ms':>10}{'process ms':>12}{'modules':>9}  slow modules loaded")
+    for name, preload in (("eager", True), ("lazy", False)):
+        result = probe(preload, args.runs)
+        print(f"{name:<8}{result['import_ms']:>11.1f}{result['build_ms']:>10.1f}{result['process_ms']:>12.1f}"
+              f"{result['modules']:>9}  {', '.join(result['loaded']) or '-'}")
+
+    sequential, routed = dispatch_costs(args.updates)
+    print(f"dispatch: {sequential:.2f} us/update with one CommandHandler per command, "
+          f"{routed:.2f} us/update through the router")
+
+
+if __name__ == "__main__":
+    main()
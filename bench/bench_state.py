@@ -0,0 +1,124 @@
+"""Benchmark for the SQLite state store.
+
+Fills persisted caches shaped like the bot's (QR file_ids, admin rosters,
+Wikipedia articles and definitions), writes them with one write-behind
+flush, then restarts the store and restores them. Reports how long the
+event loop was blocked at worst during the flush and the restore, next
+to how long each took, and the database size. The worst block during the
+restore includes the garbage collector's first full pass over the
+restored entries, which the same entries cached live would also cost. Run from the repository
+root:
+
+    python bench/bench_state.py --entries 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache  # noqa: E402
+from persistence import StateStore  # noqa: E402
+from wiki_engine import FOUND, WikiResult  # noqa: E402
+
+CACHES = ("qr_file_ids", "admins", "wiki", "define")
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(count))
+
+
+def fill(entries: int, rng: random.Random) -> dict[str, cache.AsyncTTLCache]:
+    caches = {
+        name: cache.AsyncTTLCache(name, ttl=3600, max_entries=entries, max_bytes=1 << 30, persist=True)
+        for name in CACHES
+    }
+    for i in range(entries):
+        caches["qr_file_ids"].set(f"{i:064x}", "AgACAgIAAxkDAAI" + "".join(rng.choices(string.ascii_letters, k=60)))
+        caches["admins"].set(-1000000000000 - i, frozenset(rng.randrange(10**9) for _ in range(rng.randint(1, 8))))
+    for i in range(entries // 4):
+        title = words(rng, 2).title()
+        caches["wiki"].set(title, WikiResult(FOUND, title, summary=words(rng, 60),
+                                             url=f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"))
+        caches["define"].set(words(rng, 1), words(rng, 15))
+    return caches
+
+
+class LagProbe:
+    """Measures the longest stretch the event loop couldn't run a timer."""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.worst = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.worst = max(self.worst, time.perf_counter() - started - self.interval)
+
+    def __enter__(self) -> "LagProbe":
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._task.cancel()
+
+
+async def write(path: str, entries: int) -> dict:
+    cache._registry.clear()
+    store = StateStore(path, flush_interval=3600)
+    await store.open()
+    fill(entries, random.Random(1))
+    await asyncio.sleep(0.1)
+    with LagProbe() as probe:
+        # Let the probe take its first sample, so the changes collected on the loop are included
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        await store._flush()
+        elapsed = time.perf_counter() - started
+    await store.flush()
+    return {"rows": store.rows_written, "flush_s": elapsed, "worst_lag_s": probe.worst,
+            "size_mb": store.size_bytes / 2**20}
+
+
+async def restore(path: str, entries: int) -> dict:
+    cache._registry.clear()
+    store = StateStore(path, flush_interval=3600)
+    caches = {name: cache.AsyncTTLCache(name, ttl=3600, max_entries=entries, max_bytes=1 << 30, persist=True)
+              for name in CACHES}
+    started = time.perf_counter()
+    with LagProbe() as probe:
+        await store.open()
+        opened = time.perf_counter() - started
+        while len(store.restore_seconds) < len(caches):
+            await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    await store.flush()
+    return {"restored": sum(len(c) for c in caches.values()), "open_s": opened, "restore_s": elapsed,
+            "worst_lag_s": probe.worst}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20000, help="QR file_ids and admin rosters each")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-state-"), "state.db")
+    written = asyncio.run(write(path, args.entries))
+    restored = asyncio.run(restore(path, args.entries))
+    print(f"flush:   {written['rows']} rows in {written['flush_s'] * 1000:.0f}ms, "
+          f"event loop blocked at most {written['worst_lag_s'] * 1000:.1f}ms, database {written['size_mb']:.1f} MB")
+    print(f"restore: {restored['restored']} entries in {restored['restore_s'] * 1000:.0f}ms "
+          f"(open {restored['open_s'] * 1000:.1f}ms), event loop blocked at most {restored['worst_lag_s'] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Micro-benchmark for the /time city index.
+
+Reports how long the bundled index takes to load and how much memory it
+holds, then the latency of exact, prefix, typo (fuzzy) and unknown lookups.
+Run from the repository root:
+
+    python bench/bench_timezones.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import timezones  # noqa: E402
+
+QUERIES = {
+    "exact": ["London", "New York", "Tokyo", "São Paulo", "nyc", "Bengaluru"],
+    "prefix": ["lond", "san fr", "buenos", "johannes"],
+    "fuzzy": ["londn", "new yrok", "tokio", "sydny"],
+    "unknown": ["atlantis", "xyzzy"],
+}
+
+
+def per_lookup(queries: list[str], repeat: int = 2000) -> float:
+    """Returns the mean time of one lookup, in microseconds."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            timezones.city_index.lookup(query)
+    return (time.perf_counter() - started) / (repeat * len(queries)) * 1e6
+
+
+def main() -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    entries = len(timezones.city_index)
+    load = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"loaded {entries} names in {load * 1000:.2f} ms, holding {size / 1024:.1f} KiB")
+
+    print(f"{'lookup':<10}{'us/lookup':>12}")
+    for kind, queries in QUERIES.items():
+        print(f"{kind:<10}{per_lookup(queries):>12.2f}")
+    # The first fuzzy lookup of a query scans every name; repeats are cached
+    started = time.perf_counter()
+    timezones.city_index.lookup("amsterdma")
+    print(f"{'uncached':<10}{(time.perf_counter() - started) * 1e6:>12.2f}")
+
+    cities = ", ".join(QUERIES["exact"] + QUERIES["prefix"])
+    started = time.perf_counter()
+    for _ in range(1000):
+        timezones.format_result(timezones.current_times(timezones.parse(cities)))
+    print(f"/time with 10 cities: {(time.perf_counter() - started):.3f} ms per command")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark for the sharded multi-process mode.
+
+Starts a ShardedIngress with 1, 2, 4... worker processes against a local
+fake Bot API and pushes the same CPU-heavy mix of commands (/calc, /roll,
+/time, /qr and /info) through it, timing how long it takes until every
+update is acknowledged. Updates are sent as raw JSON, as the ingress gets
+them from Telegram. Run from the repository root:
+
+    python bench/bench_workers.py --workers 1 2 4 --updates 4000
+
+The speed-up can't exceed the number of cores; the fake Bot API shares a
+core with the ingress.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from loadtest import UpdateGenerator  # noqa: E402
+
+COMMANDS = ["calc", "roll", "time", "qr", "info"]
+
+
+def configure_workers(bot_api_port: int) -> None:
+    """Sets the environment the worker processes inherit."""
+    os.environ.update({
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{bot_api_port}/bot",
+        "CORPUS_DIR": tempfile.mkdtemp(prefix="bench-workers-corpus-"),
+        "STATE_PERSISTENCE": "false",
+        # Nothing here calls upstream APIs; keep background fetchers quiet
+        "CORPUS_REFILL_INTERVAL": "3600",
+        "IMAGE_POOL_REFILL_INTERVAL": "3600",
+        "CRYPTO_REFRESH_INTERVAL": "3600",
+        "CAT_API_URL": "http://127.0.0.1:9/",
+        "DOG_API_URL": "http://127.0.0.1:9/",
+        "CRYPTO_API_URL": "http://127.0.0.1:9/",
+        # Measure processing, not Telegram's flood limits
+        "SEND_GLOBAL_RATE": "1000000",
+        "SEND_CHAT_RATE": "1000000",
+        "SEND_GROUP_RATE": "1000000",
+    })
+
+
+async def measure(workers: int, updates: list[dict]) -> dict:
+    import sharding
+    ingress = sharding.ShardedIngress("123456:bench", workers=workers)
+    started = time.perf_counter()
+    await ingress.start()
+    await asyncio.wait_for(ingress.wait_ready(), 60)
+    startup = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for data in updates:
+        await ingress.dispatch(data, json.dumps(data).encode())
+    finished = await ingress.wait_idle(timeout=300)
+    elapsed = time.perf_counter() - started
+    stats = ingress.stats()
+    await ingress.stop()
+    return {
+        "workers": workers,
+        "startup_s": round(startup, 2),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(updates) / elapsed, 1),
+        "finished": finished,
+        "per_worker": [worker["acked"] for worker in stats.values()],
+        "restarts": sum(worker["restarts"] for worker in stats.values()),
+    }
+
+
+async def run(args) -> list[dict]:
+    bot_api = FakeBotAPI(enforce_limits=False)
+    await bot_api.start()
+    configure_workers(bot_api.port)
+    generator = UpdateGenerator(COMMANDS, args.chats, seed=1)
+    updates = [generator.next()[1] for _ in range(args.updates)]
+    results = []
+    for workers in args.workers:
+        results.append(await measure(workers, updates))
+    await bot_api.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=4000)
+    parser.add_argument("--chats", type=int, default=500)
+    args = parser.parse_args()
+
+    # utils reads LOG_LEVEL when the bot modules are imported, here and in the workers
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    results = asyncio.run(run(args))
+    base = results[0]["throughput_per_s"]
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>8}{'startup s':>11}{'updates/s':>11}{'speed-up':>10}  acked per worker")
+    for result in results:
+        print(f"{result['workers']:>8}{result['startup_s']:>11.2f}{result['throughput_per_s']:>11.1f}"
+              f"{result['throughput_per_s'] / base:>10.2f}  {result['per_worker']}"
+              f"{'' if result['finished'] else ' (timed out)'}")
+
+
+if __name__ == "__main__":
+    main()
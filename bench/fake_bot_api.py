@@ -0,0 +1,152 @@
+"""A local stand-in for the Telegram Bot API that enforces flood limits.
+
+Accepts the same requests as https://api.telegram.org/bot<token>/<method>,
+answers with plausible results, and replies 429 with retry_after when a
+chat or the bot as a whole sends faster than Telegram allows. GET /stats
+returns the request and rejection counters as JSON.
+
+Run it on its own:
+
+    python bench/fake_bot_api.py --port 8081
+
+and point the bot at it with TELEGRAM_API_URL=http://127.0.0.1:8081/bot.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qs
+from stub_server import StubServer
+
+BOT_USER = {"id": 4242, "is_bot": True, "first_name": "Bench", "username": "BenchBot"}
+SEND_METHODS = {
+    "sendMessage", "sendPhoto", "sendPoll", "sendDocument", "sendAnimation",
+    "sendMediaGroup", "copyMessage", "forwardMessage",
+}
+
+
+class FakeBotAPI(StubServer):
+    """Serves Bot API methods with optional latency, errors and flood limits."""
+
+    def __init__(self, chat_rate: float = 1.0, group_per_minute: int = 20, global_rate: float = 30.0,
+                 latency: float = 0.0, error_rate: float = 0.0, enforce_limits: bool = True):
+        super().__init__()
+        self.chat_rate = chat_rate
+        self.group_per_minute = group_per_minute
+        self.global_rate = global_rate
+        self.latency = latency
+        self.error_rate = error_rate
+        self.enforce_limits = enforce_limits
+        self._chat_sends: dict[str, deque] = defaultdict(deque)
+        self._global_sends: deque = deque()
+        self._message_id = 0
+        self.calls: dict[str, int] = defaultdict(int)
+        self.rejected: dict[str, int] = defaultdict(int)
+        self.errors = 0
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "rejected": dict(self.rejected), "errors": self.errors}
+
+    def _retry_after(self, chat_id: str) -> int | None:
+        """Returns a retry_after value if this send would break a flood limit."""
+        now = time.monotonic()
+        window = self._global_sends
+        while window and now - window[0] >= 1:
+            window.popleft()
+        if len(window) >= self.global_rate:
+            return 1
+        is_group = chat_id.startswith("-") or chat_id.startswith("@")
+        sends = self._chat_sends[chat_id]
+        horizon = 60 if is_group else 1
+        limit = self.group_per_minute if is_group else self.chat_rate
+        while sends and now - sends[0] >= horizon:
+            sends.popleft()
+        if len(sends) >= limit:
+            return max(1, int(horizon - (now - sends[0])) + 1)
+        sends.append(now)
+        window.append(now)
+        return None
+
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "sendPhoto", "sendPoll", "sendDocument", "sendAnimation", "copyMessage", "forwardMessage"):
+            self._message_id += 1
+            chat_id = int(params.get("chat_id", 0)) if str(params.get("chat_id", "0")).lstrip("-").isdigit() else 0
+            message = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "from": BOT_USER,
+            }
+            if method == "sendMessage":
+                message["text"] = params.get("text", "")
+            if method == "sendPhoto":
+                message["photo"] = [{"file_id": f"photo-{self._message_id}", "file_unique_id": f"u{self._message_id}", "width": 1, "height": 1}]
+            return message
+        if method == "getChatAdministrators":
+            return [{"status": "creator", "is_anonymous": False,
+                     "user": {"id": 1, "is_bot": False, "first_name": "Owner"}}]
+        if method == "getChatMember":
+            return {"status": "member", "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "User"}}
+        if method == "getUpdates":
+            return []
+        return True
+
+    async def handle(self, http_method: str, target: str, headers: dict, body: bytes) -> tuple[int, dict]:
+        if http_method == "GET" and target == "/stats":
+            return 200, self.stats()
+        method = target.rstrip("/").rsplit("/", 1)[-1]
+        params = self._parse(headers.get("content-type", ""), body)
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(random.expovariate(1 / self.latency))
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        if self.enforce_limits and method in SEND_METHODS:
+            retry_after = self._retry_after(str(params.get("chat_id", "")))
+            if retry_after is not None:
+                self.rejected[method] += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }
+        return 200, {"ok": True, "result": self._result(method, params)}
+
+    @staticmethod
+    def _parse(content_type: str, body: bytes) -> dict:
+        if not body:
+            return {}
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        # multipart/form-data: only the simple text fields are needed here
+        fields = re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n', body)
+        return {name.decode(): value.decode(errors="replace") for name, value in fields}
+
+
+async def _main(args) -> None:
+    api = FakeBotAPI(latency=args.latency, error_rate=args.error_rate, enforce_limits=not args.no_limits)
+    await api.start(args.host, args.port)
+    print(f"Fake Bot API on http://{args.host}:{args.port}/bot<token>/<method>")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean added latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 500")
+    parser.add_argument("--no-limits", action="store_true", help="don't enforce flood limits")
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,294 @@
+"""Load test that pushes synthetic updates through the real Application.
+
+Every command registered by main.build_application is exercised with
+realistic arguments, from a spread of private and group chats. The bot
+talks to a local fake Bot API and to local stubs of the upstream APIs, so
+no network access or real token is needed. Latency and error rates of both
+can be configured.
+
+Reports throughput, per-command latency percentiles (from enqueueing an
+update until its handlers finish), event-loop lag and peak RSS, and writes
+them as JSON so runs can be compared:
+
+    python bench/loadtest.py --updates 5000 --rate 500 --output results/baseline.json
+    python bench/loadtest.py --upstream-latency 0.2 --upstream-error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import CommandHandler, TypeHandler  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from upstream_stubs import StubTransport, UpstreamStubs  # noqa: E402
+
+ADMIN_ID = 1  # the chat creator reported by the fake Bot API
+BOT_USERNAME = "BenchBot"
+
+COMMAND_ARGS = {
+    "roll": ["2d6", "4d6kh3+1", "100d20", "1000000d6"],
+    "rps": ["rock", "paper", "scissors"],
+    "8ball": ["will it work?", "is this fast?"],
+    "weather": ["London", "Tokyo"],
+    "crypto": ["bitcoin", "btc eth sol", "doge in eur gbp", "pepe arb op in usd", "kaspa"],
+    "qr": ["https://example.com", "hello world"],
+    "shorten": ["https://example.com/a/very/long/path"],
+    "translate": ["de good morning", "fr thank you"],
+    "calc": ["1+2*3", "(4+5)/3", "2**64", "9**9**9"],
+    "wiki": ["Python (programming language)", "Telegram", "Mercury"],
+    "time": ["London", "New York", "Tokyo", "London, Paris, Sao Paulo, Sydney", "tokio"],
+    "poll": ['"Lunch?" "Pizza" "Sushi"', '"Best OS?" "Linux" "BSD"'],
+    "define": ["hello", "latency", "throughput"],
+}
+REPLY_COMMANDS = {"pin", "kick", "ban", "mute"}
+
+
+def registered_commands(application) -> list[str]:
+    """Returns every command the application routes or has a CommandHandler for."""
+    from router import CommandRouter  # imported late, like main, so LOG_LEVEL is picked up
+    commands = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, (CommandHandler, CommandRouter)):
+                commands.update(handler.commands)
+    return sorted(commands)
+
+
+class UpdateGenerator:
+    """Builds realistic command updates spread across chats and users."""
+
+    def __init__(self, commands: list[str], chats: int, seed: int):
+        self.commands = commands
+        self.chats = chats
+        self.random = random.Random(seed)
+        self.update_id = 0
+        self.message_id = 0
+
+    def _message(self, chat_id: int, user_id: int, text: str) -> dict:
+        self.message_id += 1
+        chat = {"id": chat_id, "type": "private", "first_name": "User"} if chat_id > 0 else \
+            {"id": chat_id, "type": "supergroup", "title": f"Group {-chat_id}"}
+        return {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": chat,
+            "from": {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"},
+            "text": text,
+        }
+
+    def next(self) -> tuple[str, dict]:
+        command = self.random.choice(self.commands)
+        index = self.random.randrange(self.chats)
+        in_group = command in REPLY_COMMANDS or index % 2 == 0
+        user_id = 1000 + self.random.randrange(10_000)
+        chat_id = -1_000_000_000_000 - index if in_group else user_id
+        if command in REPLY_COMMANDS and self.random.random() < 0.5:
+            user_id = ADMIN_ID
+        text = f"/{command}"
+        if self.random.random() < 0.2:
+            text += f"@{BOT_USERNAME}"
+        if command in COMMAND_ARGS:
+            text += " " + self.random.choice(COMMAND_ARGS[command])
+        message = self._message(chat_id, user_id, text)
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        if command in REPLY_COMMANDS:
+            message["reply_to_message"] = self._message(chat_id, 50_000 + self.random.randrange(1000), "spam")
+        self.update_id += 1
+        return command, {"update_id": self.update_id, "message": message}
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def monitor_loop_lag(samples: list[float], interval: float = 0.01) -> None:
+    """Records how late the event loop wakes up from short sleeps."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    bot_api = FakeBotAPI(latency=args.bot_api_latency, error_rate=args.bot_api_error_rate,
+                         enforce_limits=args.rate_limit)
+    await bot_api.start()
+    upstreams = UpstreamStubs(latency=args.upstream_latency, error_rate=args.upstream_error_rate)
+    await upstreams.start()
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{bot_api.port}/bot"
+    # Keep entries learned from the stubs out of the real corpora and state store
+    os.environ["CORPUS_DIR"] = tempfile.mkdtemp(prefix="loadtest-corpus-")
+    os.environ["STATE_DB"] = os.path.join(os.environ["CORPUS_DIR"], "state.db")
+
+    import main  # imported late so the environment above is picked up
+    import image_pool
+    import corpus
+    import crypto_prices
+    from metrics import InstrumentedTransport
+    from resilience import ResilientTransport
+
+    application = main.build_application("123456:bench", rate_limit=args.rate_limit)
+    commands = [c for c in registered_commands(application) if not args.commands or c in args.commands]
+
+    enqueued: dict[int, tuple[str, float]] = {}
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    all_done = asyncio.Event()
+    feeding_done = False
+
+    async def finished(update: Update, context) -> None:
+        if update.update_id not in enqueued:
+            return
+        command, started = enqueued.pop(update.update_id)
+        latencies[command].append(time.perf_counter() - started)
+        if not enqueued and feeding_done:
+            all_done.set()
+
+    async def on_error(update: object, context) -> None:
+        if isinstance(update, Update) and update.update_id in enqueued:
+            errors[enqueued[update.update_id][0]] += 1
+
+    # Runs after the command handlers because later groups wait for earlier ones
+    application.add_handler(TypeHandler(Update, finished), group=1000)
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    await application.post_init(application)
+    # Send upstream API calls to the local stubs
+    await image_pool.stop_image_pools(application)
+    await corpus.stop_corpora(application)
+    await crypto_prices.stop_price_table(application)
+    await application.bot_data["http_client"].aclose()
+    application.bot_data["http_client"] = httpx.AsyncClient(
+        transport=ResilientTransport(InstrumentedTransport(StubTransport(upstreams.port))), timeout=10
+    )
+    await image_pool.start_image_pools(application)
+    for store in corpus.CORPORA:
+        store.start(application.bot_data["http_client"])
+    await crypto_prices.start_price_table(application)
+    await application.start()
+
+    lag: list[float] = []
+    lag_task = asyncio.create_task(monitor_loop_lag(lag))
+    generator = UpdateGenerator(commands, args.chats, args.seed)
+    interval = 1 / args.rate if args.rate else 0
+    started = time.perf_counter()
+    for i in range(args.updates):
+        command, data = generator.next()
+        update = Update.de_json(data, application.bot)
+        enqueued[update.update_id] = (command, time.perf_counter())
+        await application.update_queue.put(update)
+        if interval:
+            delay = started + (i + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif i % 100 == 0:
+            await asyncio.sleep(0)
+    feeding_done = True
+    if not enqueued:
+        all_done.set()
+    try:
+        await asyncio.wait_for(all_done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    lag_task.cancel()
+
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    await bot_api.stop()
+    await upstreams.stop()
+
+    completed = sum(len(v) for v in latencies.values())
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "updates": args.updates,
+        "completed": completed,
+        "timed_out": len(enqueued),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(completed / elapsed, 1),
+        "overall": percentiles([x for values in latencies.values() for x in values]),
+        "per_command": {command: percentiles(values) for command, values in sorted(latencies.items())},
+        "handler_errors": dict(errors),
+        "loop_lag": percentiles(lag),
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "bot_api": bot_api.stats(),
+        "upstream_calls": upstreams.calls,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0, help="updates per second (0 = as fast as possible)")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--commands", nargs="*", help="only exercise these commands")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--rate-limit", action="store_true", help="enable the send rate limiter and enforce flood limits")
+    parser.add_argument("--bot-api-latency", type=float, default=0.0)
+    parser.add_argument("--bot-api-error-rate", type=float, default=0.0)
+    parser.add_argument("--upstream-latency", type=float, default=0.0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    # utils reads LOG_LEVEL when the bot modules are imported
+    os.environ["LOG_LEVEL"] = args.log_level
+    logging.getLogger().setLevel(args.log_level)
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Local stand-ins for the upstream APIs called from the handlers package.
+
+UpstreamStubs answers for every host the bot talks to (jokeapi, thecatapi,
+dog.ceo, quotable, uselessfacts, CoinGecko, dictionaryapi.dev and the
+MediaWiki API) with configurable latency and error rates. Faults can be
+injected globally or per host: latency spikes (a share of requests that
+take `spike_latency` seconds longer), 503 errors, and connection resets.
+The per-host dicts may be changed while running to simulate an outage
+starting or ending. StubTransport is
+an httpx transport that sends every request to the stubs instead of the
+real host, keeping the original host in the X-Upstream-Host header.
+"""
+import asyncio
+import random
+import time
+from urllib.parse import parse_qs, urlsplit
+import httpx
+from stub_server import StubServer
+
+UPSTREAM_HOST_HEADER = "x-upstream-host"
+
+
+class UpstreamStubs(StubServer):
+    """Serves canned upstream API responses."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, host_latency: dict[str, float] | None = None,
+                 host_error_rate: dict[str, float] | None = None, spike_rate: float = 0.0, spike_latency: float = 2.0,
+                 reset_rate: float = 0.0, host_spike_rate: dict[str, float] | None = None,
+                 host_reset_rate: dict[str, float] | None = None):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.host_latency = host_latency or {}
+        self.host_error_rate = host_error_rate or {}
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.reset_rate = reset_rate
+        self.host_spike_rate = host_spike_rate or {}
+        self.host_reset_rate = host_reset_rate or {}
+        self.calls: dict[str, int] = {}
+
+    async def handle(self, method: str, target: str, headers: dict, body: bytes) -> tuple[int, object]:
+        host = headers.get(UPSTREAM_HOST_HEADER, "")
+        self.calls[host] = self.calls.get(host, 0) + 1
+        latency = self.host_latency.get(host, self.latency)
+        if latency:
+            await asyncio.sleep(random.expovariate(1 / latency))
+        if random.random() < self.host_spike_rate.get(host, self.spike_rate):
+            await asyncio.sleep(self.spike_latency)
+        if random.random() < self.host_reset_rate.get(host, self.reset_rate):
+            # StubServer closes the connection without answering
+            raise ConnectionResetError("injected reset")
+        if random.random() < self.host_error_rate.get(host, self.error_rate):
+            return 503, {"error": "unavailable"}
+        parts = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        return self.respond(host, parts.path, query)
+
+    @staticmethod
+    def respond(host: str, path: str, query: dict) -> tuple[int, object]:
+        n = random.randrange(1_000_000)
+        if host == "v2.jokeapi.dev":
+            return 200, {"type": "single", "joke": f"Benchmark joke #{n}."}
+        if host == "api.thecatapi.com":
+            return 200, [{"id": str(n), "url": f"https://example.com/cat/{n}.jpg"}]
+        if host == "dog.ceo":
+            return 200, {"status": "success", "message": f"https://example.com/dog/{n}.jpg"}
+        if host == "api.quotable.io":
+            return 200, {"content": f"Benchmark quote #{n}.", "author": "Bench"}
+        if host == "uselessfacts.jsph.pl":
+            return 200, {"text": f"Benchmark fact #{n}."}
+        if host == "api.coingecko.com":
+            ids = [coin for coin in query.get("ids", "").split(",") if coin]
+            currencies = query.get("vs_currencies", "usd").split(",")
+            prices = {coin: {cur: round(random.uniform(1, 70000), 2) for cur in currencies} for coin in ids}
+            if query.get("include_last_updated_at") == "true":
+                for coin_prices in prices.values():
+                    coin_prices["last_updated_at"] = int(time.time()) - random.randrange(60)
+            return 200, prices
+        if host == "api.dictionaryapi.dev":
+            word = path.rsplit("/", 1)[-1]
+            return 200, [{"word": word, "meanings": [{"definitions": [{"definition": f"A benchmark meaning of {word}."}]}]}]
+        if host.endswith("wikipedia.org"):
+            title = query.get("titles", "Benchmark")
+            return 200, {"query": {"pages": [{
+                "title": title,
+                "extract": f"{title} is a benchmark article.",
+                "fullurl": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}",
+            }]}}
+        return 404, {"error": "unknown upstream"}
+
+
+class StubTransport(httpx.AsyncHTTPTransport):
+    """Sends every request to the local upstream stubs."""
+
+    def __init__(self, port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.stub_port = port
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers[UPSTREAM_HOST_HEADER] = request.url.host
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.stub_port)
+        return await super().handle_async_request(request)
@@ -0,0 +1,93 @@
+"""Replays recorded updates against a locally running webhook server.
+
+Start the bot in webhook mode without registering a webhook with Telegram
+(leave WEBHOOK_URL unset), then post updates to it:
+
+    BOT_MODE=webhook WEBHOOK_PORT=8443 WEBHOOK_SECRET=test python main.py
+    python bench/webhook_replay.py --url http://127.0.0.1:8443/telegram --secret test updates.jsonl
+
+The input file holds one JSON update per line. Without a file, /ping
+updates from a spread of chats are generated instead. Reports request
+latency percentiles and throughput.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+
+def synthetic_updates(count: int, chats: int) -> list[dict]:
+    """Builds simple /ping updates spread across a number of chats."""
+    updates = []
+    for i in range(count):
+        chat_id = -1000000000000 - (i % chats)
+        updates.append({
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup", "title": f"Chat {i % chats}"},
+                "from": {"id": 100000 + i % 997, "is_bot": False, "first_name": "Load"},
+                "text": "/ping",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+            },
+        })
+    return updates
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def replay(url: str, secret: str, updates: list[dict], concurrency: int) -> None:
+    latencies = []
+    statuses: dict[int, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(json.dumps(update).encode())
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret, "Content-Type": "application/json"}
+
+        async def worker():
+            while not queue.empty():
+                body = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post(url, content=body, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"requests:   {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s)")
+    print(f"statuses:   {statuses}")
+    print(f"mean:       {statistics.mean(latencies) * 1000:.2f} ms")
+    for pct in (50, 95, 99):
+        print(f"p{pct}:        {percentile(latencies, pct) * 1000:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("updates", nargs="?", help="file with one JSON update per line")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--count", type=int, default=5000, help="synthetic updates to send without a file")
+    parser.add_argument("--chats", type=int, default=100, help="chats to spread synthetic updates over")
+    parser.add_argument("--concurrency", type=int, default=40)
+    args = parser.parse_args()
+
+    if args.updates:
+        with open(args.updates, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = synthetic_updates(args.count, args.chats)
+    asyncio.run(replay(args.url, args.secret, updates, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+_registry: dict[str, "AsyncTTLCache"] = {}
+_watchers: list[Callable[["AsyncTTLCache"], None]] = []
+
+
+def _deep_sizeof(obj: Any, seen: set | None = None) -> int:
+    """Roughly estimates the memory used by a decoded JSON value."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class AsyncTTLCache:
+    """An LRU cache with per-entry expiry and single-flight loading.
+
+    Concurrent misses on the same key share one in-flight fetch. Entries are
+    evicted least-recently-used first once either the entry count or the
+    estimated memory use exceeds its bound.
+
+    A cache created with `persist=True` is picked up by the state store,
+    which has it record the keys set or removed so only changes are written.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024, max_bytes: int = 4 * 1024 * 1024,
+                 persist: bool = False):
+        self.name = name
+        self.persist = persist
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, size, value)
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.restored = 0
+        # Keys set and keys removed since the last drain_changes(), once tracked
+        self._changed: set[Hashable] | None = None
+        self._removed: set[Hashable] | None = None
+        _registry[name] = self
+        for watcher in _watchers:
+            watcher(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns a fresh cached value without loading it."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return default
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Stores a value, evicting older entries if the cache is full."""
+        if key in self._entries:
+            self._remove(key)
+        size = _deep_sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        if self._changed is not None:
+            self._changed.add(key)
+            self._removed.discard(key)
+        self._evict()
+
+    def replace(self, key: Hashable, value: Any) -> bool:
+        """Swaps the value of a fresh entry, keeping its expiry.
+
+        Unlike set(), this doesn't extend how long the key is trusted.
+        Returns False, storing nothing, if there is no fresh entry.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return False
+        size = _deep_sizeof(value)
+        if size > self.max_bytes:
+            self._remove(key)
+            return False
+        self._entries[key] = (entry[0], size, value)
+        self._entries.move_to_end(key)
+        self._bytes += size - entry[1]
+        if self._changed is not None:
+            self._changed.add(key)
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drops a single entry, and any persisted copy not restored yet."""
+        if key in self._entries:
+            self._remove(key)
+        elif self._removed is not None:
+            self._removed.add(key)
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        if self._changed is not None:
+            self._removed.update(self._entries)
+            self._changed.clear()
+        self._entries.clear()
+        self._bytes = 0
+
+    def track_changes(self) -> None:
+        """Starts recording the keys set and removed, for drain_changes()."""
+        if self._changed is None:
+            self._changed = set()
+            self._removed = set()
+
+    def drain_changes(self) -> tuple[list[tuple[Hashable, float, Any]], list[Hashable]]:
+        """Returns the entries set and the keys removed since the last call.
+
+        Entries come as (key, expires_at, value), with expires_at in wall-clock
+        time so it stays meaningful after a restart.
+        """
+        offset = time.time() - time.monotonic()
+        changed = []
+        for key in self._changed:
+            entry = self._entries.get(key)
+            if entry is not None:
+                changed.append((key, entry[0] + offset, entry[2]))
+        removed = list(self._removed)
+        self._changed = set()
+        self._removed = set()
+        return changed, removed
+
+    def requeue_changes(self, changed: Iterable[Hashable], removed: Iterable[Hashable]) -> None:
+        """Hands back drained keys whose changes couldn't be saved, unless they changed again since."""
+        if self._changed is None:
+            return
+        for key in changed:
+            if key not in self._removed:
+                self._changed.add(key)
+        for key in removed:
+            if key not in self._changed:
+                self._removed.add(key)
+
+    def restore(self, entries: Iterable[tuple[Hashable, float, Any]]) -> int:
+        """Loads persisted (key, expires_at, value) entries, newest first.
+
+        Restored entries rank as less recently used than every live one. Keys
+        set or removed since startup are skipped, as they are newer than the
+        persisted copy, and restoring stops once the cache is full. Returns
+        the number of entries restored.
+        """
+        offset = time.monotonic() - time.time()
+        restored = 0
+        for key, expires_at, value in entries:
+            if len(self._entries) >= self.max_entries:
+                break
+            if key in self._entries or (self._removed is not None and key in self._removed):
+                continue
+            size = _deep_sizeof(value)
+            if self._bytes + size > self.max_bytes:
+                break
+            self._entries[key] = (expires_at + offset, size, value)
+            self._entries.move_to_end(key, last=False)
+            self._bytes += size
+            restored += 1
+        self.restored += restored
+        return restored
+
+    async def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float | None = None
+    ) -> Any:
+        """Returns the cached value for key, calling fetch once on a miss.
+
+        Exceptions raised by fetch are passed to every waiting caller and are
+        not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] >= time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, fetch, ttl))
+            self._inflight[key] = task
+        # Shield the shared fetch so one cancelled caller doesn't fail the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float | None) -> Any:
+        try:
+            value = await fetch()
+            self.set(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        if self._changed is not None:
+            self._changed.discard(key)
+            self._removed.add(key)
+
+    def stats(self) -> dict[str, int]:
+        """Returns the cache counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+            "restored": self.restored,
+        }
+
+
+def watch_caches(watcher: Callable[[AsyncTTLCache], None]) -> None:
+    """Calls `watcher` with every cache, existing ones now and new ones as they are created."""
+    _watchers.append(watcher)
+    for cache in list(_registry.values()):
+        watcher(cache)
+
+
+def unwatch_caches(watcher: Callable[[AsyncTTLCache], None]) -> None:
+    if watcher in _watchers:
+        _watchers.remove(watcher)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Returns the counters of every cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
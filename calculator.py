@@ -0,0 +1,176 @@
+import ast
+import asyncio
+import math
+import multiprocessing
+import operator
+import time
+from functools import lru_cache
+from utils import env_int, env_float, env_bool
+
+MAX_EXPRESSION_LENGTH = env_int("CALC_MAX_LENGTH", 200)
+MAX_INSTRUCTIONS = env_int("CALC_MAX_INSTRUCTIONS", 200)
+MAX_INT_BITS = env_int("CALC_MAX_INT_BITS", 1024)
+MAX_EXPONENT = env_int("CALC_MAX_EXPONENT", 4096)
+CPU_BUDGET = env_float("CALC_CPU_BUDGET", 0.05)
+COMPILE_CACHE_SIZE = env_int("CALC_CACHE_SIZE", 1024)
+
+# Heavy expressions may be evaluated in a worker process with a hard timeout
+OFFLOAD = env_bool("CALC_OFFLOAD", False)
+OFFLOAD_TIMEOUT = env_float("CALC_OFFLOAD_TIMEOUT", 1.0)
+OFFLOAD_MIN_INSTRUCTIONS = env_int("CALC_OFFLOAD_MIN_INSTRUCTIONS", 50)
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CalcError(ValueError):
+    """Raised when an expression is invalid or exceeds the evaluation limits."""
+
+
+def _check_number(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalcError("Number too large")
+    # Floats past ~1.8e308 become inf, e.g. 1e308 * 10 or a literal 1e400
+    if isinstance(value, float) and not math.isfinite(value):
+        raise CalcError("Number too large")
+    return value
+
+
+def _check_binary(op, left, right) -> None:
+    """Rejects operations whose result would exceed the size limits."""
+    if op is operator.pow:
+        if abs(right) > MAX_EXPONENT:
+            raise CalcError("Exponent too large")
+        if isinstance(left, int) and isinstance(right, int) and right > 0 and abs(left) > 1:
+            if math.log2(abs(left)) * right > MAX_INT_BITS:
+                raise CalcError("Result too large")
+    elif op is operator.mul and isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_INT_BITS + 1:
+            raise CalcError("Result too large")
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expression: str) -> tuple:
+    """Compiles an expression into a tuple of stack-machine instructions."""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise CalcError("Expression too long")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise CalcError("Invalid expression") from None
+
+    code = []
+
+    def emit(node):
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            code.append((None, _check_number(node.value)))
+        elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+            emit(node.left)
+            emit(node.right)
+            code.append((BINARY_OPS[type(node.op)], 2))
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+            emit(node.operand)
+            code.append((UNARY_OPS[type(node.op)], 1))
+        else:
+            raise CalcError("Unsupported expression")
+        if len(code) > MAX_INSTRUCTIONS:
+            raise CalcError("Expression too complex")
+
+    emit(tree.body)
+    return tuple(code)
+
+
+def run(code: tuple, budget: float = CPU_BUDGET):
+    """Evaluates compiled instructions within the CPU budget."""
+    deadline = time.process_time() + budget
+    stack = []
+    for op, arg in code:
+        if op is None:
+            stack.append(arg)
+            continue
+        if arg == 2:
+            right = stack.pop()
+            left = stack.pop()
+            _check_binary(op, left, right)
+            try:
+                value = op(left, right)
+            except ZeroDivisionError:
+                raise CalcError("Division by zero") from None
+            except OverflowError:
+                # Float powers raise instead of returning inf, e.g. 2.0 ** 4000
+                raise CalcError("Result too large") from None
+        else:
+            value = op(stack.pop())
+        if isinstance(value, complex):
+            # A fractional power of a negative number, e.g. (-8) ** 0.5
+            raise CalcError("Result is not a real number")
+        stack.append(_check_number(value))
+        if time.process_time() > deadline:
+            raise CalcError("Expression took too long")
+    return stack.pop()
+
+
+def evaluate(expression: str):
+    """Compiles (or reuses) and evaluates an arithmetic expression."""
+    return run(compile_expression(expression))
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = multiprocessing.get_context("spawn").Pool(1)
+    return _pool
+
+
+def _terminate_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+
+
+async def evaluate_async(expression: str):
+    """Evaluates an expression, offloading heavy ones to a worker process.
+
+    The worker is killed if it does not answer within OFFLOAD_TIMEOUT.
+    """
+    code = compile_expression(expression)
+    if not OFFLOAD or len(code) < OFFLOAD_MIN_INSTRUCTIONS:
+        return run(code)
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    _get_pool().apply_async(
+        run,
+        (code,),
+        callback=lambda value: loop.call_soon_threadsafe(resolve, future.set_result, value),
+        error_callback=lambda exc: loop.call_soon_threadsafe(resolve, future.set_exception, exc),
+    )
+    try:
+        return await asyncio.wait_for(future, OFFLOAD_TIMEOUT)
+    except asyncio.TimeoutError:
+        _terminate_pool()
+        raise CalcError("Expression took too long") from None
+
+
+def shutdown() -> None:
+    """Stops the worker process, if one was started."""
+    _terminate_pool()
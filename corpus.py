@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import os
+import random
+from collections import OrderedDict, deque
+from typing import Any, Callable
+import httpx
+from telegram.ext import Application
+from http_client import get_json, BOT_DATA_KEY
+from utils import logger, env_int, env_float
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Entries learned from the upstream APIs are appended here so they survive restarts
+CORPUS_DIR = os.getenv("CORPUS_DIR", os.path.join(DATA_DIR, "learned"))
+MAX_SIZE = env_int("CORPUS_MAX_SIZE", 5000)
+REFILL_INTERVAL = env_float("CORPUS_REFILL_INTERVAL", 30.0)
+MAX_BACKOFF = env_float("CORPUS_MAX_BACKOFF", 600.0)
+RECENT_SIZE = env_int("CORPUS_RECENT_SIZE", 20)
+MAX_CHATS = env_int("CORPUS_MAX_CHATS", 10_000)
+
+JOKE_API_URL = "https://v2.jokeapi.dev/joke/Any?blacklistFlags=nsfw,religious,political,racist,sexist,explicit&type=single"
+QUOTE_API_URL = "https://api.quotable.io/random"
+FACT_API_URL = "https://uselessfacts.jsph.pl/random.json?language=en"
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(" ".join(text.lower().split()).encode(), digest_size=8).digest()
+
+
+def _encode(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _decode(line: str) -> str:
+    return line.replace("\\\\", "\0").replace("\\n", "\n").replace("\0", "\\")
+
+
+class Corpus:
+    """A local store of short texts for one command, grown from an upstream API.
+
+    Entries are kept in a list for O(1) random picks and deduplicated by an
+    8-byte digest of their normalized text. They are loaded from the bundled
+    data/<name>.txt and from entries learned earlier (one entry per line,
+    newlines escaped), and a background task adds new ones from the upstream
+    API until `max_size` is reached. Each chat remembers the last
+    `recent_size` entries it was sent, so picks avoid repeating them.
+    """
+
+    def __init__(self, name: str, url: str, extract: Callable[[Any], str], max_size: int = MAX_SIZE,
+                 refill_interval: float = REFILL_INTERVAL, recent_size: int = RECENT_SIZE):
+        self.name = name
+        self.url = url
+        self.extract = extract
+        self.max_size = max_size
+        self.refill_interval = refill_interval
+        self.recent_size = recent_size
+        self.entries: list[str] = []
+        self._digests: set[bytes] = set()
+        self._recent: OrderedDict[int, deque[int]] = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.duplicates = 0
+        self.failures = 0
+
+    @property
+    def bundled_path(self) -> str:
+        return os.path.join(DATA_DIR, f"{self.name}.txt")
+
+    @property
+    def learned_path(self) -> str:
+        return os.path.join(CORPUS_DIR, f"{self.name}.txt")
+
+    def load(self) -> None:
+        """Reads the bundled and learned entries from disk."""
+        for path in (self.bundled_path, self.learned_path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        line = line.rstrip("\n")
+                        if line and not line.startswith("#"):
+                            self.add(_decode(line))
+            except FileNotFoundError:
+                pass
+
+    def add(self, text: str) -> bool:
+        """Adds an entry unless it is already known. Returns whether it was added."""
+        digest = _digest(text)
+        if digest in self._digests:
+            self.duplicates += 1
+            return False
+        self._digests.add(digest)
+        self.entries.append(text)
+        return True
+
+    def pick(self, chat_id: int) -> str | None:
+        """Returns a random entry not recently sent to the chat, or None if empty."""
+        if not self.entries:
+            return None
+        recent = self._recent.get(chat_id)
+        if recent is None:
+            recent = self._recent[chat_id] = deque(maxlen=self.recent_size)
+            if len(self._recent) > MAX_CHATS:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(chat_id)
+        # A few tries are enough unless the chat has seen most of the corpus
+        for _ in range(8):
+            index = random.randrange(len(self.entries))
+            if index not in recent:
+                break
+        recent.append(index)
+        return self.entries[index]
+
+    async def fetch(self, client: httpx.AsyncClient) -> str:
+        """Asks the upstream API for one entry."""
+        return self.extract(await get_json(client, self.url))
+
+    def _persist(self, text: str) -> None:
+        os.makedirs(CORPUS_DIR, exist_ok=True)
+        with open(self.learned_path, "a", encoding="utf-8") as f:
+            f.write(_encode(text) + "\n")
+
+    async def learn(self, text: str) -> None:
+        """Adds a fetched entry and appends it to the learned file off the event loop."""
+        if self.add(text):
+            try:
+                await asyncio.to_thread(self._persist, text)
+            except OSError as e:
+                logger.warning("Saving %s entry failed: %s", self.name, e)
+
+    def start(self, client: httpx.AsyncClient) -> None:
+        self._task = asyncio.create_task(self._refill(client))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refill(self, client: httpx.AsyncClient) -> None:
+        backoff = self.refill_interval
+        while True:
+            if len(self.entries) < self.max_size:
+                try:
+                    await self.learn(await self.fetch(client))
+                    backoff = self.refill_interval
+                except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError) as e:
+                    self.failures += 1
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    logger.warning("Refilling %s corpus failed, retrying in ~%.0fs: %s", self.name, backoff, e)
+                    await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                    continue
+            await asyncio.sleep(self.refill_interval * random.uniform(0.5, 1.5))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "duplicates": self.duplicates,
+            "failures": self.failures,
+            "chats": len(self._recent),
+        }
+
+
+joke_corpus = Corpus("jokes", JOKE_API_URL, lambda data: data["joke"])
+quote_corpus = Corpus("quotes", QUOTE_API_URL, lambda data: f'"{data["content"]}" - {data["author"]}')
+fact_corpus = Corpus("facts", FACT_API_URL, lambda data: data["text"])
+CORPORA = (joke_corpus, quote_corpus, fact_corpus)
+
+
+async def start_corpora(application: Application) -> None:
+    """Loads every corpus from disk and starts refilling it in the background."""
+    for corpus in CORPORA:
+        await asyncio.to_thread(corpus.load)
+        corpus.start(application.bot_data[BOT_DATA_KEY])
+    logger.info("Corpora loaded: %s", ", ".join(f"{c.name}={len(c.entries)}" for c in CORPORA))
+
+
+async def stop_corpora(application: Application) -> None:
+    for corpus in CORPORA:
+        await corpus.stop()
@@ -0,0 +1,271 @@
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+import httpx
+from telegram.ext import Application
+from cache import AsyncTTLCache
+from http_client import get_json, BOT_DATA_KEY
+from utils import logger, env_int, env_float
+
+PRICE_API_URL = os.getenv("CRYPTO_API_URL", "https://api.coingecko.com/api/v3/simple/price")
+REFRESH_INTERVAL = env_float("CRYPTO_REFRESH_INTERVAL", 60.0)
+MAX_BACKOFF = env_float("CRYPTO_MAX_BACKOFF", 600.0)
+# Prices older than this are refetched for cold coins and flagged as stale in replies
+MAX_AGE = env_float("CRYPTO_MAX_AGE", 120.0)
+MAX_COINS = env_int("CRYPTO_MAX_COINS", 20)
+MAX_CURRENCIES = 5
+
+HOT_COINS = tuple(os.getenv(
+    "CRYPTO_HOT_COINS",
+    "bitcoin,ethereum,tether,binancecoin,solana,ripple,usd-coin,dogecoin,cardano,tron,"
+    "the-open-network,avalanche-2,shiba-inu,polkadot,chainlink,bitcoin-cash,litecoin,monero,stellar,cosmos",
+).split(","))
+HOT_CURRENCIES = tuple(os.getenv("CRYPTO_HOT_CURRENCIES", "usd,eur,gbp").split(","))
+
+# Ticker symbols and common names that CoinGecko knows by another id
+ALIASES = {
+    "btc": "bitcoin",
+    "xbt": "bitcoin",
+    "eth": "ethereum",
+    "ether": "ethereum",
+    "usdt": "tether",
+    "bnb": "binancecoin",
+    "sol": "solana",
+    "xrp": "ripple",
+    "usdc": "usd-coin",
+    "doge": "dogecoin",
+    "ada": "cardano",
+    "trx": "tron",
+    "ton": "the-open-network",
+    "toncoin": "the-open-network",
+    "avax": "avalanche-2",
+    "avalanche": "avalanche-2",
+    "shib": "shiba-inu",
+    "dot": "polkadot",
+    "link": "chainlink",
+    "bch": "bitcoin-cash",
+    "ltc": "litecoin",
+    "xmr": "monero",
+    "xlm": "stellar",
+    "atom": "cosmos",
+    "matic": "matic-network",
+    "polygon": "matic-network",
+    "near": "near",
+    "apt": "aptos",
+    "arb": "arbitrum",
+    "op": "optimism",
+    "etc": "ethereum-classic",
+    "fil": "filecoin",
+    "uni": "uniswap",
+    "pepe": "pepe",
+    "dai": "dai",
+}
+SYMBOLS = {coin: symbol for symbol, coin in ALIASES.items() if len(symbol) <= 5 and symbol not in ("xbt", "ether")}
+
+CURRENCIES = {
+    "usd": "$", "eur": "€", "gbp": "£", "jpy": "¥", "cny": "CN¥", "inr": "₹", "rub": "₽", "krw": "₩",
+    "try": "₺", "uah": "₴", "brl": "R$", "cad": "CA$", "aud": "A$", "chf": "CHF ", "sek": "kr ",
+    "pln": "zł ", "btc": "₿", "eth": "Ξ",
+}
+
+# Batched lookups of coins outside the price table
+cold_cache = AsyncTTLCache("crypto", ttl=MAX_AGE / 2, max_entries=512)
+
+
+class CryptoError(ValueError):
+    """Raised for malformed /crypto requests."""
+
+
+@dataclass
+class PriceRequest:
+    """Coins and currencies asked for in one /crypto command."""
+    coins: list[str]
+    currencies: list[str]
+
+
+def parse(args: list[str]) -> PriceRequest:
+    """Parses '/crypto btc eth [in eur gbp]'; commas work as separators too."""
+    tokens = [token for token in re.split(r"[\s,]+", " ".join(args).lower()) if token]
+    if "in" in tokens:
+        split = tokens.index("in")
+        coin_tokens, currencies = tokens[:split], tokens[split + 1:]
+    else:
+        coin_tokens, currencies = tokens, ["usd"]
+    if not coin_tokens:
+        raise CryptoError("Please provide one or more cryptocurrencies (e.g., /crypto btc eth in eur).")
+    coins = list(dict.fromkeys(ALIASES.get(token, token) for token in coin_tokens))
+    currencies = list(dict.fromkeys(currencies)) or ["usd"]
+    if len(coins) > MAX_COINS:
+        raise CryptoError(f"Please ask for at most {MAX_COINS} coins at a time.")
+    if len(currencies) > MAX_CURRENCIES:
+        raise CryptoError(f"Please ask for at most {MAX_CURRENCIES} currencies at a time.")
+    unknown = [currency for currency in currencies if currency not in CURRENCIES]
+    if unknown:
+        raise CryptoError(f"Unsupported currency: {', '.join(unknown)}. Try one of: {', '.join(CURRENCIES)}.")
+    return PriceRequest(coins, currencies)
+
+
+async def fetch_prices(client: httpx.AsyncClient, coins: list[str], currencies: list[str]) -> dict[str, dict]:
+    """Fetches every coin/currency pair in a single simple/price request."""
+    data = await get_json(client, PRICE_API_URL, params={
+        "ids": ",".join(coins),
+        "vs_currencies": ",".join(currencies),
+        "include_last_updated_at": "true",
+    })
+    fetched_at = time.time()
+    for prices in data.values():
+        prices["fetched_at"] = fetched_at
+        prices.setdefault("last_updated_at", fetched_at)
+    return data
+
+
+class PriceTable:
+    """Keeps the prices of popular coins in memory, refreshed by one background task.
+
+    Each entry maps a coin to its prices by currency, plus CoinGecko's
+    last_updated_at and the local fetched_at timestamps. Coins outside the
+    table are fetched together in one batched request and added to it until
+    they age out.
+    """
+
+    def __init__(self, coins: tuple[str, ...] = HOT_COINS, currencies: tuple[str, ...] = HOT_CURRENCIES,
+                 refresh_interval: float = REFRESH_INTERVAL):
+        self.coins = coins
+        self.currencies = currencies
+        self.refresh_interval = refresh_interval
+        self.prices: dict[str, dict] = {}
+        self._task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.failures = 0
+        self.hits = 0
+        self.misses = 0
+
+    def fresh(self, coin: str, currencies: list[str]) -> bool:
+        entry = self.prices.get(coin)
+        return (entry is not None and all(currency in entry for currency in currencies)
+                and time.time() - entry["fetched_at"] < MAX_AGE)
+
+    async def refresh(self, client: httpx.AsyncClient) -> None:
+        data = await fetch_prices(client, list(self.coins), list(self.currencies))
+        self.prices.update(data)
+        # Drop cold coins that have aged out so the table stays small
+        now = time.time()
+        for coin, entry in list(self.prices.items()):
+            if coin not in self.coins and now - entry["fetched_at"] > MAX_AGE:
+                del self.prices[coin]
+        self.refreshes += 1
+
+    async def lookup(self, client: httpx.AsyncClient, request: PriceRequest) -> dict[str, dict]:
+        """Returns prices for the requested coins, fetching any missing ones in one batch.
+
+        If the batch fails, whatever the table still holds is returned and
+        the error is raised only when nothing at all is known.
+        """
+        missing = [coin for coin in request.coins if not self.fresh(coin, request.currencies)]
+        self.hits += len(request.coins) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            key = (tuple(sorted(missing)), tuple(sorted(request.currencies)))
+            try:
+                data = await cold_cache.get_or_fetch(key, lambda: fetch_prices(client, missing, request.currencies))
+                for coin, prices in data.items():
+                    self.prices[coin] = self.prices.get(coin, {}) | prices
+            except httpx.HTTPError:
+                if not any(coin in self.prices for coin in request.coins):
+                    raise
+        return {coin: self.prices[coin] for coin in request.coins if coin in self.prices}
+
+    def start(self, client: httpx.AsyncClient) -> None:
+        self._task = asyncio.create_task(self._refresh_loop(client))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self, client: httpx.AsyncClient) -> None:
+        backoff = self.refresh_interval
+        while True:
+            try:
+                await self.refresh(client)
+                backoff = self.refresh_interval
+            except (httpx.HTTPError, KeyError, TypeError, ValueError) as e:
+                self.failures += 1
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                logger.warning("Refreshing crypto prices failed, retrying in ~%.0fs: %s", backoff, e)
+            await asyncio.sleep(backoff * random.uniform(0.9, 1.1))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "coins": len(self.prices),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+price_table = PriceTable()
+
+
+def is_known(coin: str) -> bool:
+    """Whether a coin id is one we know exists, without asking CoinGecko."""
+    return coin in SYMBOLS or coin in HOT_COINS or coin in price_table.prices
+
+
+def suggest(prefix: str, limit: int = 5) -> list[str]:
+    """Returns known coin ids whose id or ticker starts with a prefix, popular coins first."""
+    prefix = prefix.lower()
+    names = dict.fromkeys(HOT_COINS + tuple(ALIASES.values()) + tuple(price_table.prices))
+    found = [coin for coin in names if coin.startswith(prefix) or SYMBOLS.get(coin, "").startswith(prefix)]
+    return found[:limit]
+
+
+def _format_price(value: float, currency: str) -> str:
+    # Keep four significant digits for coins priced at fractions of a cent
+    digits = 2 if value >= 1 or value <= 0 else 3 - math.floor(math.log10(value))
+    symbol = CURRENCIES[currency]
+    text = f"{symbol}{value:,.{digits}f}"
+    return text if currency in ("usd", "eur", "gbp", "jpy") else f"{text} {currency.upper()}"
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 90:
+        return f"{max(0, round(seconds))}s"
+    if seconds < 90 * 60:
+        return f"{round(seconds / 60)}m"
+    return f"{round(seconds / 3600)}h"
+
+
+def format_result(request: PriceRequest, prices: dict[str, dict]) -> str:
+    lines = []
+    now = time.time()
+    for coin in request.coins:
+        entry = prices.get(coin)
+        if entry is None or not any(currency in entry for currency in request.currencies):
+            lines.append(f"❓ Could not find the price for '{coin}'.")
+            continue
+        quoted = " · ".join(
+            _format_price(entry[currency], currency) for currency in request.currencies if currency in entry
+        )
+        age = now - entry["last_updated_at"]
+        # Stale means we couldn't reach CoinGecko lately, not that the market is quiet
+        stale = " ⚠️ stale" if now - entry["fetched_at"] > MAX_AGE else ""
+        symbol = f" ({SYMBOLS[coin].upper()})" if coin in SYMBOLS else ""
+        name = coin.replace("-", " ").title()
+        lines.append(f"{name}{symbol}: {quoted} (updated {_format_age(age)} ago{stale})")
+    return "\n".join(lines)
+
+
+async def start_price_table(application: Application) -> None:
+    """Starts refreshing the hot price table with the shared HTTP client."""
+    price_table.start(application.bot_data[BOT_DATA_KEY])
+
+
+async def stop_price_table(application: Application) -> None:
+    await price_table.stop()
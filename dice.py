@@ -0,0 +1,181 @@
+import math
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass
+from utils import env_int
+
+MAX_DICE = env_int("DICE_MAX_COUNT", 1_000_000_000)
+MAX_SIDES = env_int("DICE_MAX_SIDES", 1000)
+MAX_MODIFIER = env_int("DICE_MAX_MODIFIER", 1_000_000)
+# Up to this many dice are rolled one by one; beyond it the face counts are sampled
+EXACT_LIMIT = env_int("DICE_EXACT_LIMIT", 10_000)
+BATCH_SIZE = 4096
+MAX_LISTED = env_int("DICE_MAX_LISTED", 20)
+
+DICE_PATTERN = re.compile(r"^(\d*)d(\d+)(?:(kh|kl|dh|dl|k|d)(\d+))?([+-]\d+)?$", re.IGNORECASE)
+
+
+class DiceError(ValueError):
+    """Raised when a dice expression is invalid or over the configured limits."""
+
+
+@dataclass(frozen=True)
+class DiceSpec:
+    """A parsed dice expression such as 4d6kh3+2."""
+    count: int
+    sides: int
+    keep: str | None = None
+    keep_count: int = 0
+    modifier: int = 0
+
+
+@dataclass(frozen=True)
+class RollResult:
+    """The outcome of a roll: a short listing plus totals and statistics."""
+    spec: DiceSpec
+    listed: list[int]
+    total: int
+    mean: float
+    stdev: float
+    lowest: int
+    highest: int
+    approximate: bool
+
+
+def parse(expression: str) -> DiceSpec:
+    """Parses and validates a dice expression before any dice are rolled."""
+    match = DICE_PATTERN.match(expression.replace(" ", ""))
+    if not match:
+        raise DiceError("Please provide dice in NdS format (e.g., /roll 2d6, /roll 4d6kh3+1).")
+    count_text, sides_text, keep, keep_text, modifier_text = match.groups()
+    # Check lengths first so huge digit strings are never converted to int
+    if len(count_text) > 10 or len(sides_text) > 10 or (keep_text and len(keep_text) > 10):
+        raise DiceError("That's too many dice.")
+    count = int(count_text) if count_text else 1
+    sides = int(sides_text)
+    if not 1 <= count <= MAX_DICE:
+        raise DiceError(f"You can roll between 1 and {MAX_DICE:,} dice.")
+    if not 1 <= sides <= MAX_SIDES:
+        raise DiceError(f"Dice must have between 1 and {MAX_SIDES:,} sides.")
+    keep_count = 0
+    if keep:
+        keep = {"k": "kh", "d": "dl"}.get(keep.lower(), keep.lower())
+        keep_count = int(keep_text)
+        if not 1 <= keep_count <= count or (keep[0] == "d" and keep_count == count):
+            raise DiceError("You must keep at least one die and can't keep more than you roll.")
+    modifier = 0
+    if modifier_text:
+        if len(modifier_text) > 10 or abs(int(modifier_text)) > MAX_MODIFIER:
+            raise DiceError(f"Modifiers must be at most {MAX_MODIFIER:,}.")
+        modifier = int(modifier_text)
+    return DiceSpec(count, sides, keep, keep_count, modifier)
+
+
+def _sample_counts(count: int, sides: int, rng: random.Random) -> list[int]:
+    """Samples how many dice landed on each face without rolling them.
+
+    Each face count is drawn from its conditional binomial distribution using
+    the normal approximation, which is accurate at the sizes this is used for.
+    """
+    counts = [0] * (sides + 1)
+    remaining = count
+    for face in range(1, sides):
+        p = 1 / (sides - face + 1)
+        mean = remaining * p
+        sd = math.sqrt(remaining * p * (1 - p))
+        drawn = round(rng.gauss(mean, sd))
+        drawn = min(max(drawn, 0), remaining)
+        counts[face] = drawn
+        remaining -= drawn
+    counts[sides] = remaining
+    return counts
+
+
+def _apply_keep(counts: list[int], spec: DiceSpec) -> list[int]:
+    """Returns the face counts left after keep/drop notation is applied."""
+    if not spec.keep:
+        return counts
+    if spec.keep == "kh":
+        take, from_top = spec.keep_count, True
+    elif spec.keep == "kl":
+        take, from_top = spec.keep_count, False
+    elif spec.keep == "dh":
+        take, from_top = spec.count - spec.keep_count, False
+    else:
+        take, from_top = spec.count - spec.keep_count, True
+    kept = [0] * len(counts)
+    faces = range(len(counts) - 1, 0, -1) if from_top else range(1, len(counts))
+    for face in faces:
+        if take <= 0:
+            break
+        n = min(counts[face], take)
+        kept[face] = n
+        take -= n
+    return kept
+
+
+def roll(spec: DiceSpec, rng: random.Random | None = None) -> RollResult:
+    """Rolls the dice in bounded memory, whatever the number of dice.
+
+    Memory is O(sides + MAX_LISTED): dice are tallied into per-face counts in
+    fixed-size batches, or the counts are sampled directly for huge rolls.
+    """
+    rng = rng or random
+    faces = range(1, spec.sides + 1)
+    listed = rng.choices(faces, k=min(spec.count, MAX_LISTED))
+    counts = [0] * (spec.sides + 1)
+    for face in listed:
+        counts[face] += 1
+
+    remaining = spec.count - len(listed)
+    approximate = remaining > EXACT_LIMIT
+    if approximate:
+        for face, n in enumerate(_sample_counts(remaining, spec.sides, rng)):
+            counts[face] += n
+    else:
+        tally = Counter()
+        while remaining:
+            batch = min(remaining, BATCH_SIZE)
+            tally.update(rng.choices(faces, k=batch))
+            remaining -= batch
+        for face, n in tally.items():
+            counts[face] += n
+
+    kept = _apply_keep(counts, spec)
+    n = sum(kept)
+    total = sum(face * c for face, c in enumerate(kept))
+    mean = total / n
+    variance = sum(c * (face - mean) ** 2 for face, c in enumerate(kept)) / n
+    present = [face for face, c in enumerate(kept) if c]
+    return RollResult(
+        spec=spec,
+        listed=listed,
+        total=total + spec.modifier,
+        mean=mean,
+        stdev=math.sqrt(variance),
+        lowest=present[0],
+        highest=present[-1],
+        approximate=approximate,
+    )
+
+
+def format_result(result: RollResult) -> str:
+    """Formats a roll as a reply that always fits in one Telegram message."""
+    spec = result.spec
+    rolled = ", ".join(map(str, result.listed))
+    if spec.count > len(result.listed):
+        rolled += f", ... ({spec.count - len(result.listed):,} more)"
+    lines = [f"You rolled: {rolled}. Total: {result.total:,}"]
+    if spec.keep:
+        lines.append(f"({spec.keep}{spec.keep_count} applied)")
+    if spec.modifier:
+        lines.append(f"(modifier {spec.modifier:+,})")
+    if spec.count > MAX_LISTED:
+        lines.append(
+            f"Mean: {result.mean:.3f}, Std dev: {result.stdev:.3f}, "
+            f"Min: {result.lowest}, Max: {result.highest}"
+        )
+    if result.approximate:
+        lines.append("(Large roll: face counts were sampled rather than rolled one by one.)")
+    return "\n".join(lines)
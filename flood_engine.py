@@ -0,0 +1,303 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+from utils import logger, env_bool, env_int, env_float
+
+ANTIFLOOD = env_bool("ANTIFLOOD", True)
+# Each limit is the most allowed; one more trips the detector.
+# A user may send FLOOD_MAX_MESSAGES messages per FLOOD_WINDOW seconds in a group
+WINDOW = env_float("FLOOD_WINDOW", 10.0)
+MAX_MESSAGES = env_int("FLOOD_MAX_MESSAGES", 10)
+# The same text this many times in a row from one user, each within a window of the last
+MAX_REPEATS = env_int("FLOOD_MAX_REPEATS", 4)
+# Short replies ("ok", "+1") are often repeated on purpose; floods of them are still caught by rate
+REPEAT_MIN_LENGTH = 4
+# The same text this many times within a window from anyone in the chat, e.g. a raid of fresh accounts
+RAID_DUPLICATES = env_int("FLOOD_RAID_DUPLICATES", 8)
+# Shorter texts ("hi", "good morning") are too common to count as a raid
+RAID_MIN_LENGTH = 24
+# The trip at which a user is banned instead of muted
+BAN_STRIKES = env_int("FLOOD_BAN_STRIKES", 3)
+# Memory bounds: users tracked in all chats together, users per chat, texts per chat
+MAX_USERS = env_int("FLOOD_MAX_USERS", 100_000)
+MAX_USERS_PER_CHAT = env_int("FLOOD_MAX_USERS_PER_CHAT", 2_000)
+MAX_FINGERPRINTS = 64
+# Chats quiet for this long are forgotten
+IDLE_SECONDS = env_float("FLOOD_IDLE_SECONDS", 600.0)
+# Actions for a chat are collected for this long, then applied together
+BATCH_DELAY = env_float("FLOOD_BATCH_DELAY", 1.0)
+# deleteMessages takes at most this many ids
+MAX_BATCH_MESSAGES = 100
+
+FLOOD = "flood"
+REPEAT = "repeat"
+RAID = "raid"
+# What to do about a flagged message's sender; DELETE means they were already dealt with
+MUTE = "mute"
+BAN = "ban"
+DELETE = "delete"
+
+
+def fingerprint(text: str) -> int:
+    """Identifies a text regardless of case and spacing."""
+    return hash(" ".join(text.lower().split()))
+
+
+class Window:
+    """An O(1) sliding window count of events.
+
+    Keeps counts for the current and the previous fixed window. The
+    previous window's events are taken as evenly spaced from its start, and
+    those still inside the sliding window (now - window, now] are counted,
+    so a steady rate of exactly n events per window counts as n.
+    """
+
+    __slots__ = ("start", "previous", "current")
+
+    def __init__(self, now: float):
+        self.start = now
+        self.previous = 0
+        self.current = 0
+
+    def add(self, now: float, window: float) -> float:
+        """Counts one event and returns the estimated count over the last `window` seconds."""
+        elapsed = now - self.start
+        if elapsed >= window:
+            if elapsed < 2 * window:
+                self.previous = self.current
+                self.start += window
+            else:
+                self.previous = 0
+                self.start = now
+            self.current = 0
+            elapsed = now - self.start
+        self.current += 1
+        if not self.previous:
+            return self.current
+        # Previous events at start - window + i * window / previous, for i in range(previous)
+        return max(0, self.previous - 1 - int(elapsed * self.previous / window)) + self.current
+
+
+class UserState:
+    __slots__ = ("window", "last_text", "last_at", "repeats", "strikes", "flagged_until")
+
+    def __init__(self, now: float):
+        self.window = Window(now)
+        self.last_text = 0
+        self.last_at = now
+        self.repeats = 0
+        self.strikes = 0
+        self.flagged_until = 0.0
+
+
+class ChatState:
+    __slots__ = ("users", "texts", "last_seen")
+
+    def __init__(self, now: float):
+        self.users: OrderedDict[int, UserState] = OrderedDict()
+        self.texts: OrderedDict[int, Window] = OrderedDict()
+        self.last_seen = now
+
+
+@dataclass(frozen=True)
+class Verdict:
+    """Why a message was flagged and what to do about its sender."""
+    reason: str
+    action: str
+
+
+class FloodDetector:
+    """Spots users flooding a group, in constant time and bounded memory.
+
+    check() is called for every group message. A user trips the detector
+    by sending more than `max_messages` per `window` seconds, the same text
+    more than `max_repeats` times in a row with less than a window between
+    them, or a text that more than `raid_duplicates` messages in the chat
+    carried within the window. Each trip is a strike;
+    the `ban_strikes`th one bans instead of muting. Once tripped, a user's
+    further messages are flagged for deletion only, until the window has
+    passed.
+
+    Chats are kept in least-recently-active order. Chats idle for
+    `idle_seconds`, and the least active ones once more than `max_users`
+    users are tracked in all, are forgotten; so are a chat's least active
+    users beyond `max_users_per_chat`.
+    """
+
+    def __init__(self, window: float = WINDOW, max_messages: int = MAX_MESSAGES, max_repeats: int = MAX_REPEATS,
+                 raid_duplicates: int = RAID_DUPLICATES, ban_strikes: int = BAN_STRIKES,
+                 max_users: int = MAX_USERS, max_users_per_chat: int = MAX_USERS_PER_CHAT,
+                 idle_seconds: float = IDLE_SECONDS):
+        self.window = window
+        self.max_messages = max_messages
+        self.max_repeats = max_repeats
+        self.raid_duplicates = raid_duplicates
+        self.ban_strikes = ban_strikes
+        self.max_users = max_users
+        self.max_users_per_chat = max_users_per_chat
+        self.idle_seconds = idle_seconds
+        self._chats: OrderedDict[int, ChatState] = OrderedDict()
+        self._users = 0
+        self.checked = 0
+        self.flagged = 0
+        self.trips = {FLOOD: 0, REPEAT: 0, RAID: 0}
+        self.evicted_chats = 0
+        self.forgiven = 0
+
+    def check(self, chat_id: int, user_id: int, text: str | None, now: float) -> Verdict | None:
+        """Records a message and returns a verdict if its sender is flooding."""
+        self.checked += 1
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = ChatState(now)
+        else:
+            self._chats.move_to_end(chat_id)
+        chat.last_seen = now
+
+        user = chat.users.get(user_id)
+        if user is None:
+            user = chat.users[user_id] = UserState(now)
+            self._users += 1
+            if len(chat.users) > self.max_users_per_chat:
+                chat.users.popitem(last=False)
+                self._users -= 1
+        else:
+            chat.users.move_to_end(user_id)
+
+        reason = None
+        if user.window.add(now, self.window) > self.max_messages:
+            reason = FLOOD
+        if text:
+            key = fingerprint(text)
+            if key == user.last_text and now - user.last_at <= self.window and len(text) >= REPEAT_MIN_LENGTH:
+                user.repeats += 1
+                if user.repeats > self.max_repeats:
+                    reason = reason or REPEAT
+            else:
+                user.last_text = key
+                user.repeats = 1
+            user.last_at = now
+            if len(text) >= RAID_MIN_LENGTH:
+                seen = chat.texts.get(key)
+                if seen is None:
+                    seen = chat.texts[key] = Window(now)
+                    if len(chat.texts) > MAX_FINGERPRINTS:
+                        chat.texts.popitem(last=False)
+                else:
+                    chat.texts.move_to_end(key)
+                if seen.add(now, self.window) > self.raid_duplicates:
+                    reason = reason or RAID
+
+        self._evict(now)
+        if user.flagged_until > now:
+            self.flagged += 1
+            return Verdict(reason or FLOOD, DELETE)
+        if reason is None:
+            return None
+        self.trips[reason] += 1
+        self.flagged += 1
+        user.strikes += 1
+        user.repeats = 0
+        user.flagged_until = now + self.window
+        return Verdict(reason, BAN if user.strikes >= self.ban_strikes else MUTE)
+
+    def forgive(self, chat_id: int, user_id: int) -> None:
+        """Forgets a user's messages and strikes in a chat, e.g. because they are an admin."""
+        chat = self._chats.get(chat_id)
+        if chat is not None and chat.users.pop(user_id, None) is not None:
+            self._users -= 1
+            self.forgiven += 1
+
+    def _evict(self, now: float) -> None:
+        chats = self._chats
+        while chats:
+            chat_id, oldest = next(iter(chats.items()))
+            if self._users <= self.max_users and now - oldest.last_seen < self.idle_seconds:
+                break
+            del chats[chat_id]
+            self._users -= len(oldest.users)
+            self.evicted_chats += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "chats": len(self._chats),
+            "users": self._users,
+            "checked": self.checked,
+            "flagged": self.flagged,
+            "flood_trips": self.trips[FLOOD],
+            "repeat_trips": self.trips[REPEAT],
+            "raid_trips": self.trips[RAID],
+            "evicted_chats": self.evicted_chats,
+            "forgiven": self.forgiven,
+        }
+
+
+@dataclass
+class FloodBatch:
+    """Flagged messages of one chat and what to do about their senders."""
+    chat: Any
+    bot: Any
+    # message_id -> sender's user id
+    messages: dict[int, int] = field(default_factory=dict)
+    # user id -> (user, action, reason)
+    users: dict[int, tuple[Any, str, str]] = field(default_factory=dict)
+
+
+class ActionBatcher:
+    """Collects flagged messages per chat and applies them together.
+
+    The first flagged message of a chat opens a batch that is handed to
+    `apply` after `delay` seconds, or as soon as it holds as many messages
+    as one deleteMessages call can take. During a raid, one batch thus
+    covers many messages and users.
+    """
+
+    def __init__(self, apply: Callable[[FloodBatch], Awaitable[None]], delay: float = BATCH_DELAY):
+        self.apply = apply
+        self.delay = delay
+        self._batches: dict[int, FloodBatch] = {}
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.failures = 0
+
+    def add(self, bot: Any, chat: Any, user: Any, message_id: int, verdict: Verdict) -> None:
+        batch = self._batches.get(chat.id)
+        if batch is None:
+            batch = self._batches[chat.id] = FloodBatch(chat, bot)
+            self._timers[chat.id] = asyncio.get_running_loop().call_later(self.delay, self._flush, chat.id)
+        batch.messages[message_id] = user.id
+        if verdict.action != DELETE:
+            batch.users[user.id] = (user, verdict.action, verdict.reason)
+        if len(batch.messages) >= MAX_BATCH_MESSAGES:
+            self._timers[chat.id].cancel()
+            self._flush(chat.id)
+
+    def _flush(self, chat_id: int) -> None:
+        self._timers.pop(chat_id, None)
+        batch = self._batches.pop(chat_id, None)
+        if batch is None:
+            return
+        self.batches += 1
+        task = asyncio.create_task(self._apply(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _apply(self, batch: FloodBatch) -> None:
+        try:
+            await self.apply(batch)
+        except Exception:
+            self.failures += 1
+            logger.exception("Applying anti-flood actions failed")
+
+    async def stop(self) -> None:
+        """Applies the open batches and waits for them."""
+        for timer in self._timers.values():
+            timer.cancel()
+        for chat_id in list(self._batches):
+            self._flush(chat_id)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": len(self._batches), "batches": self.batches, "failures": self.failures}
@@ -0,0 +1,62 @@
+"""The bot's command handlers, grouped into modules that are imported on first use.
+
+COMMANDS is the registry of every command: its handler, given as
+"module:function" within this package, and the usage shown by /help. The
+CommandRouter in router.py dispatches on it, so a module is only imported
+when one of its commands is first used.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Command:
+    """One bot command and where its handler lives."""
+    name: str
+    target: str
+    description: str
+    usage: str = ""
+
+
+COMMANDS = (
+    Command("start", "basic:start", "Welcomes the user."),
+    Command("help", "basic:help_command", "Lists all available commands."),
+    Command("ping", "basic:ping", "Checks if the bot is responsive."),
+    Command("uptime", "basic:uptime", "Shows how long the bot has been running."),
+    Command("info", "basic:info", "Gets information about the user or chat."),
+    Command("joke", "content:joke", "Tells a random joke."),
+    Command("roll", "fun:roll", "Rolls dice (e.g., /roll 2d6, /roll 4d6kh3+1).", "<NdS>"),
+    Command("flip", "basic:flip", "Flips a coin."),
+    Command("rps", "fun:rps", "Play Rock, Paper, Scissors.", "<rock|paper|scissors>"),
+    Command("8ball", "fun:eight_ball", "Ask the magic 8-ball a question.", "<question>"),
+    Command("cat", "content:cat", "Sends a random picture of a cat."),
+    Command("dog", "content:dog", "Sends a random picture of a dog."),
+    Command("quote", "content:quote", "Provides an inspirational quote."),
+    Command("fact", "content:fact", "Get a random interesting fact."),
+    Command("weather", "tools:weather", "Gets the current weather.", "<city>"),
+    Command("crypto", "lookups:crypto", "Gets crypto prices (e.g., /crypto btc eth in eur).",
+            "<coins> [in <currencies>]"),
+    Command("qr", "qr:qr", "Generates a QR code.", "[ec=L|M|Q|H] [size=N] [format=svg] <text>"),
+    Command("shorten", "tools:shorten", "Shortens a long URL.", "<url>"),
+    Command("translate", "tools:translate", "Translates text to a specified language.", "<lang> <text>"),
+    Command("calc", "tools:calc", "A simple calculator.", "<expression>"),
+    Command("wiki", "lookups:wiki", "Searches Wikipedia.", "<query>"),
+    Command("time", "tools:time", "Gets the current time in one or more cities.", "<city>[, <city>...]"),
+    Command("poll", "fun:poll", "Creates a poll in the chat."),
+    Command("define", "lookups:define", "Gets the definition of a word.", "<word>"),
+    Command("pin", "admin:pin", "Pins the message it replies to (admins only)."),
+    Command("unpin", "admin:unpin", "Unpins the current pinned message (admins only)."),
+    Command("kick", "admin:kick", "Kicks a user from the group (admins only).", "@user"),
+    Command("ban", "admin:ban", "Bans a user from the group (admins only).", "@user"),
+    Command("mute", "admin:mute", "Mutes a user for a specified time (admins only).", "@user"),
+)
+
+ROUTES = {command.name: command.target for command in COMMANDS}
+
+
+def help_text() -> str:
+    """Lists every registered command with its usage."""
+    lines = ["Available commands:"]
+    for command in COMMANDS:
+        usage = f" {command.usage}" if command.usage else ""
+        lines.append(f"/{command.name}{usage} - {command.description}")
+    return "\n".join(lines)
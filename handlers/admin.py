@@ -0,0 +1,204 @@
+import time
+from datetime import datetime, timedelta
+from telegram import Chat, Update, ChatPermissions
+from telegram.error import TelegramError
+from telegram.ext import Application, ApplicationHandlerStop, ContextTypes
+from admins import admin_roster
+import flood_engine
+from utils import logger
+
+MUTE_DURATION = timedelta(hours=1)
+
+flood_detector = flood_engine.FloodDetector()
+
+
+async def is_admin(update: Update, user_id: int) -> bool:
+    """Checks if a user is an administrator in the chat."""
+    try:
+        return await admin_roster.is_admin(update.effective_chat, user_id)
+    except Exception as e:
+        logger.error("Error checking admin status: %s", e)
+        return False
+
+
+async def track_chat_admins(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Keeps the cached admin rosters in sync with chat member changes."""
+    if update.my_chat_member:
+        # The bot's own membership changed; reload the roster on next use
+        admin_roster.invalidate(update.my_chat_member.chat.id)
+    if update.chat_member:
+        admin_roster.apply_update(update.chat_member)
+
+
+async def mute_member(chat: Chat, user_id: int, duration: timedelta = MUTE_DURATION) -> None:
+    """Stops a member from sending messages for a while."""
+    permissions = ChatPermissions(can_send_messages=False)
+    await chat.restrict_member(user_id, permissions, until_date=datetime.now() + duration)
+
+
+async def ban_member(chat: Chat, user_id: int) -> None:
+    """Removes a member from the chat for good."""
+    await chat.ban_member(user_id)
+
+
+async def apply_flood_batch(batch: flood_engine.FloodBatch) -> None:
+    """Deletes a chat's flagged messages, mutes or bans their senders and reports it in one message."""
+    chat = batch.chat
+    try:
+        await chat.delete_messages(list(batch.messages))
+    except TelegramError as e:
+        logger.error("Error deleting flood messages: %s", e)
+
+    muted, banned = [], []
+    for user_id, (user, action, reason) in batch.users.items():
+        try:
+            if action == flood_engine.BAN:
+                await ban_member(chat, user_id)
+                banned.append(user.full_name)
+            else:
+                await mute_member(chat, user_id)
+                muted.append(user.full_name)
+        except TelegramError as e:
+            logger.error("Error restricting flooding user: %s", e)
+    lines = []
+    if muted:
+        lines.append(f"Muted for 1 hour for flooding: {', '.join(muted)}.")
+    if banned:
+        lines.append(f"Banned for flooding repeatedly: {', '.join(banned)}.")
+    if lines:
+        await batch.bot.send_message(chat.id, "\n".join(lines))
+
+
+flood_actions = flood_engine.ActionBatcher(apply_flood_batch)
+
+
+async def flood_guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Checks every group message for flooding; flagged ones skip the other handlers."""
+    message = update.effective_message
+    # Anonymous admins and channels post as a chat, not a user
+    if message is None or message.sender_chat or message.from_user is None:
+        return
+    verdict = flood_detector.check(message.chat_id, message.from_user.id, message.text or message.caption,
+                                   time.monotonic())
+    if verdict is None:
+        return
+    if await is_admin(update, message.from_user.id):
+        # Admins are never flagged; don't let the trip count towards a later one
+        flood_detector.forgive(message.chat_id, message.from_user.id)
+        return
+    flood_actions.add(context.bot, message.chat, message.from_user, message.message_id, verdict)
+    raise ApplicationHandlerStop
+
+
+async def stop_flood_guard(application: Application) -> None:
+    """Applies the anti-flood actions still waiting in batches."""
+    await flood_actions.stop()
+
+
+def flood_stats() -> dict:
+    return {"detector": flood_detector.stats(), "actions": flood_actions.stats()}
+
+
+async def pin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Pins the message it replies to (admins only)."""
+    if not update.message.reply_to_message:
+        await update.message.reply_text("Please reply to a message to pin it.")
+        return
+
+    if not await is_admin(update, update.effective_user.id):
+        await update.message.reply_text("You must be an administrator to use this command.")
+        return
+
+    try:
+        await update.message.reply_to_message.pin()
+        await update.message.reply_text("Message pinned.")
+    except Exception as e:
+        logger.error("Error pinning message: %s", e)
+        await update.message.reply_text("Could not pin the message. Make sure I have pin permissions.")
+
+
+async def unpin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Unpins the current pinned message (admins only)."""
+    if not await is_admin(update, update.effective_user.id):
+        await update.message.reply_text("You must be an administrator to use this command.")
+        return
+
+    try:
+        await update.effective_chat.unpin_all_messages()
+        await update.message.reply_text("All messages unpinned.")
+    except Exception as e:
+        logger.error("Error unpinning messages: %s", e)
+        await update.message.reply_text("Could not unpin messages. Make sure I have unpin permissions.")
+
+
+async def kick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Kicks a user from the group (admins only)."""
+    if not update.message.reply_to_message:
+        await update.message.reply_text("Please reply to a user's message to kick them.")
+        return
+
+    target_user = update.message.reply_to_message.from_user
+
+    if not await is_admin(update, update.effective_user.id):
+        await update.message.reply_text("You must be an administrator to use this command.")
+        return
+
+    if await is_admin(update, target_user.id):
+        await update.message.reply_text("I cannot kick an administrator.")
+        return
+
+    try:
+        await update.effective_chat.ban_member(target_user.id)
+        await update.effective_chat.unban_member(target_user.id) # Unban immediately to allow rejoining
+        await update.message.reply_text(f"User {target_user.mention_html()} kicked.")
+    except Exception as e:
+        logger.error("Error kicking user: %s", e)
+        await update.message.reply_text("Could not kick the user. Make sure I have kick permissions.")
+
+
+async def ban(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Bans a user from the group (admins only)."""
+    if not update.message.reply_to_message:
+        await update.message.reply_text("Please reply to a user's message to ban them.")
+        return
+
+    target_user = update.message.reply_to_message.from_user
+
+    if not await is_admin(update, update.effective_user.id):
+        await update.message.reply_text("You must be an administrator to use this command.")
+        return
+
+    if await is_admin(update, target_user.id):
+        await update.message.reply_text("I cannot ban an administrator.")
+        return
+
+    try:
+        await ban_member(update.effective_chat, target_user.id)
+        await update.message.reply_text(f"User {target_user.mention_html()} banned.")
+    except Exception as e:
+        logger.error("Error banning user: %s", e)
+        await update.message.reply_text("Could not ban the user. Make sure I have ban permissions.")
+
+
+async def mute(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Mutes a user for a specified time (admins only)."""
+    if not update.message.reply_to_message:
+        await update.message.reply_text("Please reply to a user's message to mute them.")
+        return
+
+    target_user = update.message.reply_to_message.from_user
+
+    if not await is_admin(update, update.effective_user.id):
+        await update.message.reply_text("You must be an administrator to use this command.")
+        return
+
+    if await is_admin(update, target_user.id):
+        await update.message.reply_text("I cannot mute an administrator.")
+        return
+
+    try:
+        await mute_member(update.effective_chat, target_user.id)
+        await update.message.reply_text(f"User {target_user.mention_html()} muted for 1 hour.")
+    except Exception as e:
+        logger.error("Error muting user: %s", e)
+        await update.message.reply_text("Could not mute the user. Make sure I have restrict permissions.")
@@ -0,0 +1,72 @@
+import random
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+from handlers import help_text
+from utils import start_time
+
+START_TEXT = "Hi! I am a feature-rich Telegram bot. Send /help to see what I can do."
+HELP_TEXT = help_text()
+PING_TEXT = "Pong!"
+
+
+def flip_text() -> str:
+    """Returns the result of a coin flip."""
+    return f"It's {random.choice(['Heads', 'Tails'])}!"
+
+
+# Commands whose reply needs no I/O. The webhook server answers these
+# directly in its HTTP response instead of running the handler.
+FAST_REPLIES = {
+    "start": lambda: START_TEXT,
+    "help": lambda: HELP_TEXT,
+    "ping": lambda: PING_TEXT,
+    "flip": flip_text,
+}
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Welcomes the user."""
+    await update.message.reply_text(START_TEXT)
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Lists all available commands."""
+    await update.message.reply_text(HELP_TEXT)
+
+
+async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Checks if the bot is responsive."""
+    await update.message.reply_text(PING_TEXT)
+
+
+async def uptime(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Shows how long the bot has been running."""
+    now = datetime.now()
+    uptime_delta = now - start_time
+    text = f"Uptime: {uptime_delta}"
+    # The state store remembers earlier runs across restarts
+    store = context.application.persistence
+    if getattr(store, "starts", 0) > 1:
+        text += f"\nFirst started {store.first_started:%Y-%m-%d %H:%M}, restarted {store.starts - 1} times since"
+    await update.message.reply_text(text)
+
+
+async def info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Gets information about the user or chat."""
+    user = update.effective_user
+    chat = update.effective_chat
+    info_text = (
+        f"User ID: {user.id}\n"
+        f"First Name: {user.first_name}\n"
+        f"Last Name: {user.last_name or 'N/A'}\n"
+        f"Username: @{user.username or 'N/A'}\n"
+        f"Chat ID: {chat.id}\n"
+        f"Chat Type: {chat.type}"
+    )
+    await update.message.reply_text(info_text)
+
+
+async def flip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Flips a coin."""
+    await update.message.reply_text(flip_text())
@@ -0,0 +1,94 @@
+import httpx
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+from corpus import Corpus, joke_corpus, quote_corpus, fact_corpus
+from http_client import get_client
+from image_pool import ImagePool, cat_pool, dog_pool
+from utils import logger
+
+# Images to try before giving up when Telegram rejects them
+MAX_IMAGE_ATTEMPTS = 3
+
+
+async def send_corpus_entry(update: Update, context: ContextTypes.DEFAULT_TYPE, corpus: Corpus,
+                            failure: str) -> None:
+    """Sends a local corpus entry, asking the upstream API only if the corpus is empty."""
+    text = corpus.pick(update.effective_chat.id)
+    if text is None:
+        try:
+            text = await corpus.fetch(get_client(context))
+        except (httpx.HTTPError, KeyError) as e:
+            logger.error("Error fetching %s: %s", corpus.name, e)
+            await update.message.reply_text(failure)
+            return
+        await corpus.learn(text)
+    await update.message.reply_text(text)
+
+
+async def send_pool_image(update: Update, context: ContextTypes.DEFAULT_TYPE, pool: ImagePool) -> None:
+    """Sends a prefetched image new to the chat, asking the upstream API only if there is none.
+
+    If the upstream can't be reached either, an image the chat had before is
+    sent, saying so. Images Telegram rejects (a dead URL, an expired file_id)
+    are dropped and the next one is tried.
+    """
+    chat_id = update.effective_chat.id
+    for _ in range(MAX_IMAGE_ATTEMPTS):
+        ready = pool.take(chat_id)
+        caption = None
+        if ready is not None:
+            photo, is_file_id = ready
+        else:
+            try:
+                photo, is_file_id = await pool.fetch(get_client(context)), False
+            except (httpx.HTTPError, KeyError):
+                photo, is_file_id = pool.repeat(chat_id), True
+                if photo is None:
+                    raise
+                caption = f"No new {pool.name} pictures right now, so here's one you've seen before."
+        try:
+            message = await update.message.reply_photo(photo, caption=caption)
+        except BadRequest as e:
+            logger.info("Telegram rejected a %s picture, trying another: %s", pool.name, e)
+            pool.forget(photo)
+            continue
+        if not is_file_id:
+            photo = message.photo[-1].file_id
+            pool.remember(photo)
+        pool.sent(chat_id, photo)
+        return
+    raise BadRequest(f"No {pool.name} picture was accepted")
+
+
+async def joke(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Tells a random joke."""
+    await send_corpus_entry(update, context, joke_corpus, "Sorry, I couldn't fetch a joke right now.")
+
+
+async def cat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sends a random picture of a cat."""
+    try:
+        await send_pool_image(update, context, cat_pool)
+    except (httpx.HTTPError, KeyError, BadRequest) as e:
+        logger.error("Error fetching cat picture: %s", e)
+        await update.message.reply_text("Sorry, I couldn't fetch a cat picture right now.")
+
+
+async def dog(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sends a random picture of a dog."""
+    try:
+        await send_pool_image(update, context, dog_pool)
+    except (httpx.HTTPError, KeyError, BadRequest) as e:
+        logger.error("Error fetching dog picture: %s", e)
+        await update.message.reply_text("Sorry, I couldn't fetch a dog picture right now.")
+
+
+async def quote(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Provides an inspirational quote."""
+    await send_corpus_entry(update, context, quote_corpus, "Sorry, I couldn't fetch a quote right now.")
+
+
+async def fact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Get a random interesting fact."""
+    await send_corpus_entry(update, context, fact_corpus, "Sorry, I couldn't fetch a fact right now.")
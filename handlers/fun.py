@@ -0,0 +1,100 @@
+import random
+from telegram import Update
+from telegram.ext import ContextTypes
+import dice
+
+
+async def roll(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Rolls dice (e.g., /roll 2d6)."""
+    args = context.args
+    if not args:
+        await update.message.reply_text("Please provide dice in NdS format (e.g., /roll 2d6).")
+        return
+
+    try:
+        spec = dice.parse("".join(args))
+    except dice.DiceError as e:
+        await update.message.reply_text(str(e))
+        return
+    await update.message.reply_text(dice.format_result(dice.roll(spec)))
+
+
+async def rps(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Play Rock, Paper, Scissors."""
+    choices = ["rock", "paper", "scissors"]
+    if not context.args or context.args[0].lower() not in choices:
+        await update.message.reply_text("Please choose rock, paper, or scissors.")
+        return
+
+    user_choice = context.args[0].lower()
+    bot_choice = random.choice(choices)
+
+    result = ""
+    if user_choice == bot_choice:
+        result = "It's a tie!"
+    elif (
+        (user_choice == "rock" and bot_choice == "scissors")
+        or (user_choice == "paper" and bot_choice == "rock")
+        or (user_choice == "scissors" and bot_choice == "paper")
+    ):
+        result = f"You win! I chose {bot_choice}."
+    else:
+        result = f"You lose! I chose {bot_choice}."
+
+    await update.message.reply_text(result)
+
+
+async def eight_ball(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ask the magic 8-ball a question."""
+    if not context.args:
+        await update.message.reply_text("Please ask a question.")
+        return
+
+    responses = [
+        "It is certain.",
+        "It is decidedly so.",
+        "Without a doubt.",
+        "Yes - definitely.",
+        "You may rely on it.",
+        "As I see it, yes.",
+        "Most likely.",
+        "Outlook good.",
+        "Yes.",
+        "Signs point to yes.",
+        "Reply hazy, try again.",
+        "Ask again later.",
+        "Better not tell you now.",
+        "Cannot predict now.",
+        "Concentrate and ask again.",
+        "Don't count on it.",
+        "My reply is no.",
+        "My sources say no.",
+        "Outlook not so good.",
+        "Very doubtful.",
+    ]
+    await update.message.reply_text(random.choice(responses))
+
+
+async def poll(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Creates a poll in the chat."""
+    if not context.args or len(context.args) < 3:
+        await update.message.reply_text('Usage: /poll "Question" "Option 1" "Option 2" ...')
+        return
+
+    # The question and options are expected to be quoted strings
+    args_str = " ".join(context.args)
+    parts = [p.strip() for p in args_str.split('"') if p.strip()]
+
+    if len(parts) < 3:
+        await update.message.reply_text('Usage: /poll "Question" "Option 1" "Option 2" ...')
+        return
+
+    question = parts[0]
+    options = parts[1:]
+
+    await context.bot.send_poll(
+        chat_id=update.effective_chat.id,
+        question=question,
+        options=options,
+        is_anonymous=False,
+    )
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import httpx
+from telegram import (
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultsButton,
+    InputFile,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+import crypto_prices
+from handlers.lookups import lookup_definition, wiki_client
+from http_client import get_client
+from inline_engine import CACHE_TIMES, DEADLINE, MAX_RESULTS, MIN_PREFIX, debouncer, result_id, wiki_search
+from resilience import CircuitOpenError, deadline
+from utils import logger, env_float
+
+# Inline answers can only refer to images Telegram already has, so new QR
+# codes are first uploaded to this chat (e.g. a private channel the bot posts in)
+UPLOAD_CHAT_ID = os.getenv("INLINE_UPLOAD_CHAT_ID")
+# An upload stays in that chat for good, so it waits for a longer pause than other lookups,
+# and the QR codes of half-typed texts aren't made
+UPLOAD_DEBOUNCE = env_float("INLINE_UPLOAD_DEBOUNCE", 1.5)
+
+
+class InlineHint(Exception):
+    """Raised when a query can't be answered yet; the message is shown above the results."""
+
+
+def article(title: str, text: str, description: str = "") -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        result_id(title, text), title, InputTextMessageContent(text), description=description[:200]
+    )
+
+
+async def wiki_results(context: ContextTypes.DEFAULT_TYPE, query: str) -> list:
+    if len(query) < MIN_PREFIX:
+        raise InlineHint("Keep typing to search Wikipedia")
+    pages = await wiki_search.get_or_fetch(
+        query.lower(), lambda: wiki_client.search(get_client(context), query, MAX_RESULTS)
+    )
+    return [article(page.title, f"**{page.title}**\n{page.summary}...\n\n{page.url}", page.summary) for page in pages]
+
+
+async def define_results(context: ContextTypes.DEFAULT_TYPE, query: str) -> list:
+    words = query.split()
+    if not words or len(words[0]) < 2:
+        raise InlineHint("Type a word to define")
+    word = words[0]
+    definition = await lookup_definition(get_client(context), word)
+    if not definition:
+        return []
+    return [article(word.capitalize(), f"**{word.capitalize()}**: {definition}", definition)]
+
+
+async def crypto_results(context: ContextTypes.DEFAULT_TYPE, query: str) -> list:
+    try:
+        request = crypto_prices.parse(query.split())
+    except crypto_prices.CryptoError as e:
+        raise InlineHint(str(e)) from None
+    # Complete a half-typed last coin from the coins we know, rather than asking CoinGecko for it
+    *done, last = request.coins
+    options = [[*done, last]]
+    if not crypto_prices.is_known(last):
+        suggestions = crypto_prices.suggest(last, MAX_RESULTS)
+        if suggestions:
+            options = [[*done, coin] for coin in suggestions]
+    coins = list(dict.fromkeys(coin for option in options for coin in option))
+    prices = await crypto_prices.price_table.lookup(
+        get_client(context), crypto_prices.PriceRequest(coins, request.currencies)
+    )
+    results = []
+    for option in options:
+        text = crypto_prices.format_result(crypto_prices.PriceRequest(option, request.currencies), prices)
+        title = ", ".join(coin.replace("-", " ").title() for coin in option)
+        results.append(article(title, text, text))
+    return results
+
+
+async def qr_results(context: ContextTypes.DEFAULT_TYPE, query: str) -> list:
+    # Imported here so inline mode doesn't load qrcode until someone asks for a QR code
+    import qr_engine
+    try:
+        request = qr_engine.parse(query.split())
+    except qr_engine.QRError as e:
+        raise InlineHint(str(e)) from None
+    if qr_engine.file_ids.get(request.key) is None:
+        if UPLOAD_CHAT_ID is None:
+            raise InlineHint("Send /qr to the bot for new QR codes")
+        if len(request.text) < MIN_PREFIX:
+            raise InlineHint("Keep typing the text to encode")
+        # Cancelled by the debouncer if the user types on meanwhile
+        await asyncio.sleep(max(0.0, UPLOAD_DEBOUNCE - debouncer.delay))
+
+    async def upload() -> str:
+        image = await qr_engine.get_image(request)
+        send = context.bot.send_document if request.svg else context.bot.send_photo
+        message = await send(UPLOAD_CHAT_ID, InputFile(image, filename=request.filename))
+        return (message.document if request.svg else message.photo[-1]).file_id
+
+    try:
+        file_id = await qr_engine.file_ids.get_or_fetch(request.key, upload)
+    except qr_engine.QRError as e:
+        raise InlineHint(str(e)) from None
+    if request.svg:
+        return [InlineQueryResultCachedDocument(result_id(request.key), "QR code (SVG)", file_id)]
+    return [InlineQueryResultCachedPhoto(result_id(request.key), file_id)]
+
+
+MODES = {
+    "wiki": (wiki_results, "<query>", "Search Wikipedia"),
+    "define": (define_results, "<word>", "Look up a definition"),
+    "crypto": (crypto_results, "<coins> [in <currencies>]", "Get crypto prices"),
+    "qr": (qr_results, "<text>", "Make a QR code"),
+}
+
+
+def help_results(bot_username: str) -> list:
+    return [
+        article(f"{mode} {usage}", f"Type @{bot_username} {mode} {usage} in any chat.", description)
+        for mode, (_, usage, description) in MODES.items()
+    ]
+
+
+async def answer(query: InlineQuery, context: ContextTypes.DEFAULT_TYPE) -> None:
+    mode, _, text = query.query.strip().partition(" ")
+    mode = mode.lower()
+    button = None
+    if mode not in MODES:
+        results, kind = help_results(context.bot.username), "help"
+    else:
+        build = MODES[mode][0]
+        try:
+            with deadline(DEADLINE):
+                results, kind = await build(context, text.strip()), mode
+        except InlineHint as e:
+            results, kind, button = [], "error", InlineQueryResultsButton(str(e), start_parameter="inline")
+        except CircuitOpenError as e:
+            results, kind = [], "error"
+            button = InlineQueryResultsButton(
+                f"Lookups are paused, try again in {max(1, round(e.retry_in))}s", start_parameter="inline"
+            )
+        except httpx.HTTPError as e:
+            logger.warning("Inline %s lookup failed: %s", mode, e)
+            results, kind = [], "error"
+            button = InlineQueryResultsButton("Lookup failed, please try again", start_parameter="inline")
+    if not results and kind == mode:
+        kind = "error"
+    try:
+        await query.answer(results[:MAX_RESULTS], cache_time=CACHE_TIMES[kind], is_personal=False, button=button)
+    except BadRequest as e:
+        # Usually the query is too old: the user moved on while we were looking it up
+        logger.info("Inline answer rejected: %s", e)
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answers inline queries once the user stops typing."""
+    query = update.inline_query
+    debouncer.submit(query.from_user.id, lambda: answer(query, context))
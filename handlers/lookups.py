@@ -0,0 +1,109 @@
+import httpx
+from telegram import Update
+from telegram.ext import ContextTypes
+from cache import AsyncTTLCache
+import crypto_prices
+from http_client import get_client, get_json
+from resilience import CircuitOpenError
+from utils import logger
+from wiki_engine import WikipediaClient, FOUND, MISSING
+
+DICTIONARY_API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en"
+
+# Upstream lookup caches; TTLs reflect how quickly each source changes
+define_cache = AsyncTTLCache("define", ttl=24 * 60 * 60, max_entries=4096, persist=True)
+wiki_client = WikipediaClient()
+
+
+def unavailable_text(service: str, error: CircuitOpenError) -> str:
+    """A fast reply for when an upstream's circuit breaker is open."""
+    return (
+        f"{service} is having trouble right now, so I'm giving it a break. "
+        f"Please try again in about {max(1, round(error.retry_in))}s."
+    )
+
+
+async def lookup_definition(client: httpx.AsyncClient, word: str) -> str | None:
+    """Returns the first dictionary definition of a word, or None if it has none."""
+    url = f"{DICTIONARY_API_URL}/{word}"
+
+    async def fetch():
+        try:
+            data = await get_json(client, url)
+        except httpx.HTTPStatusError as e:
+            # The dictionary answers unknown words with a 404; cache that as "no definition"
+            if e.response.status_code == 404:
+                return None
+            raise
+        if isinstance(data, list) and data:
+            return data[0]["meanings"][0]["definitions"][0]["definition"]
+        return None
+
+    return await define_cache.get_or_fetch(word.lower(), fetch)
+
+
+async def crypto(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Gets the latest prices of one or more cryptocurrencies."""
+    try:
+        request = crypto_prices.parse(context.args or [])
+        prices = await crypto_prices.price_table.lookup(get_client(context), request)
+    except crypto_prices.CryptoError as e:
+        await update.message.reply_text(str(e))
+        return
+    except CircuitOpenError as e:
+        await update.message.reply_text(unavailable_text("CoinGecko", e))
+        return
+    except httpx.HTTPError as e:
+        logger.error("Error fetching crypto price: %s", e)
+        await update.message.reply_text("Failed to fetch crypto price due to a network error.")
+        return
+    await update.message.reply_text(crypto_prices.format_result(request, prices))
+
+
+async def wiki(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Searches Wikipedia."""
+    if not context.args:
+        await update.message.reply_text("Please provide a search query.")
+        return
+    query = " ".join(context.args)
+    try:
+        result = await wiki_client.lookup(get_client(context), query)
+    except CircuitOpenError as e:
+        await update.message.reply_text(unavailable_text("Wikipedia", e))
+        return
+    except httpx.HTTPError as e:
+        logger.error("Error fetching Wikipedia page: %s", e)
+        await update.message.reply_text("Sorry, I couldn't reach Wikipedia right now.")
+        return
+
+    if result.status == FOUND:
+        await update.message.reply_text(f"**{result.title}**\n{result.summary}...\n\n{result.url}")
+    elif result.status == MISSING:
+        await update.message.reply_text(f"Sorry, I couldn't find a Wikipedia page for '{query}'.")
+    else:
+        options = "\n".join(result.options)
+        await update.message.reply_text(f"'{query}' is ambiguous. Did you mean one of these?\n{options}")
+
+
+async def define(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Gets the definition of a word."""
+    if not context.args:
+        await update.message.reply_text("Please provide a word to define (e.g., /define hello).")
+        return
+
+    word = context.args[0]
+    try:
+        definition = await lookup_definition(get_client(context), word)
+
+        if definition:
+            await update.message.reply_text(f"**{word.capitalize()}**: {definition}")
+        else:
+            await update.message.reply_text(f"Could not find a definition for '{word}'.")
+    except CircuitOpenError as e:
+        await update.message.reply_text(unavailable_text("The dictionary", e))
+    except httpx.HTTPError as e:
+        logger.error("HTTP request failed: %s", e)
+        await update.message.reply_text("Failed to fetch definition due to a network error. Please try again later.")
+    except Exception as e:
+        logger.error("An unexpected error occurred: %s", e)
+        await update.message.reply_text("An unexpected error occurred while fetching the definition. Please try again later.")
@@ -0,0 +1,34 @@
+from telegram import Update, InputFile
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+import qr_engine
+from utils import logger
+
+
+async def qr(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Generates a QR code."""
+    try:
+        request = qr_engine.parse(context.args or [])
+    except qr_engine.QRError as e:
+        await update.message.reply_text(str(e))
+        return
+    send = update.message.reply_document if request.svg else update.message.reply_photo
+
+    # Resend by file_id if Telegram already has this exact image
+    file_id = qr_engine.file_ids.get(request.key)
+    if file_id:
+        try:
+            await send(file_id)
+            return
+        except BadRequest as e:
+            logger.warning("Cached QR file_id rejected, re-uploading: %s", e)
+            qr_engine.file_ids.invalidate(request.key)
+
+    try:
+        image = await qr_engine.get_image(request)
+    except qr_engine.QRError as e:
+        await update.message.reply_text(str(e))
+        return
+    message = await send(InputFile(image, filename=request.filename))
+    sent = message.document if request.svg else message.photo[-1]
+    qr_engine.file_ids.set(request.key, sent.file_id)
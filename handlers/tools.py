@@ -0,0 +1,67 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from calculator import CalcError, evaluate_async
+import timezones
+from utils import logger
+
+
+async def weather(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Gets the current weather."""
+    if not context.args:
+        await update.message.reply_text("Please provide a city name.")
+        return
+    city = " ".join(context.args)
+    # This requires an API key for a weather service.
+    # For this example, we'll just return a placeholder.
+    await update.message.reply_text(f"I can't get the weather for {city} yet, but I'm learning!")
+
+
+async def shorten(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Shortens a long URL."""
+    if not context.args:
+        await update.message.reply_text("Please provide a URL to shorten.")
+        return
+    url = context.args[0]
+    # This requires an API key for a URL shortening service.
+    # For this example, we'll just return a placeholder.
+    await update.message.reply_text(f"I can't shorten {url} yet, but I'm learning!")
+
+
+async def translate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Translates text to a specified language."""
+    if len(context.args) < 2:
+        await update.message.reply_text("Usage: /translate <lang_code> <text>")
+        return
+    lang = context.args[0]
+    text = " ".join(context.args[1:])
+    # This requires a translation API.
+    # For this example, we'll just return a placeholder.
+    await update.message.reply_text(f"I can't translate to {lang} yet, but I'm learning!")
+
+
+async def calc(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """A simple calculator."""
+    if not context.args:
+        await update.message.reply_text("Please provide a mathematical expression.")
+        return
+    expression = "".join(context.args)
+    try:
+        result = await evaluate_async(expression)
+    except CalcError as e:
+        await update.message.reply_text(f"Error: {e}")
+        return
+    except Exception:
+        logger.exception("Evaluating %r failed", expression)
+        await update.message.reply_text("Error: the expression couldn't be evaluated.")
+        return
+    await update.message.reply_text(f"Result: {result}")
+
+
+async def time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Gets the current time in one or more comma-separated cities."""
+    try:
+        results = timezones.current_times(timezones.parse(" ".join(context.args or [])))
+    except timezones.TimezoneError as e:
+        await update.message.reply_text(str(e))
+        return
+    await update.message.reply_text(timezones.format_result(results))
@@ -0,0 +1,78 @@
+from urllib.parse import urlsplit
+import httpx
+from telegram.ext import Application, ContextTypes
+from metrics import InstrumentedTransport
+from resilience import ResilientTransport
+from utils import logger, env_int, env_float, env_bool
+
+# Pool limits, overridable from the environment
+MAX_CONNECTIONS = env_int("HTTP_MAX_CONNECTIONS", 100)
+MAX_KEEPALIVE_CONNECTIONS = env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+KEEPALIVE_EXPIRY = env_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+HTTP2 = env_bool("HTTP_HTTP2", True)
+
+DEFAULT_TIMEOUT = httpx.Timeout(env_float("HTTP_TIMEOUT", 10.0), connect=5.0)
+
+# Per-host timeouts; hosts not listed here use DEFAULT_TIMEOUT
+HOST_TIMEOUTS = {
+    "v2.jokeapi.dev": httpx.Timeout(5.0, connect=3.0),
+    "api.thecatapi.com": httpx.Timeout(5.0, connect=3.0),
+    "dog.ceo": httpx.Timeout(5.0, connect=3.0),
+    "api.quotable.io": httpx.Timeout(4.0, connect=2.0),
+    "uselessfacts.jsph.pl": httpx.Timeout(5.0, connect=3.0),
+    "api.coingecko.com": httpx.Timeout(8.0, connect=3.0),
+    "api.dictionaryapi.dev": httpx.Timeout(8.0, connect=3.0),
+    "en.wikipedia.org": httpx.Timeout(8.0, connect=3.0),
+}
+
+BOT_DATA_KEY = "http_client"
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """Creates the pooled, keep-alive client shared by all handlers."""
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    # Breakers, deadlines and hedging sit in front of the per-attempt timings
+    transport = ResilientTransport(InstrumentedTransport(httpx.AsyncHTTPTransport(http2=HTTP2, limits=limits)))
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=DEFAULT_TIMEOUT,
+        follow_redirects=True,
+    )
+
+
+def timeout_for(url: str) -> httpx.Timeout:
+    """Returns the timeout configured for the host of a URL."""
+    return HOST_TIMEOUTS.get(urlsplit(url).hostname or "", DEFAULT_TIMEOUT)
+
+
+def get_client(context: ContextTypes.DEFAULT_TYPE) -> httpx.AsyncClient:
+    """Returns the application-scoped HTTP client."""
+    return context.bot_data[BOT_DATA_KEY]
+
+
+async def get_json(client: httpx.AsyncClient, url: str, **kwargs):
+    """GETs a URL with its per-host timeout and decodes the JSON body."""
+    kwargs.setdefault("timeout", timeout_for(url))
+    response = await client.get(url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def open_http_client(application: Application) -> None:
+    """Opens the shared HTTP client when the application starts."""
+    application.bot_data[BOT_DATA_KEY] = build_http_client()
+    logger.info(
+        "HTTP client ready (http2=%s, max_connections=%s, max_keepalive=%s)",
+        HTTP2, MAX_CONNECTIONS, MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+async def close_http_client(application: Application) -> None:
+    """Closes the shared HTTP client when the application stops."""
+    client = application.bot_data.pop(BOT_DATA_KEY, None)
+    if client is not None:
+        await client.aclose()
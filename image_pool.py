@@ -0,0 +1,155 @@
+import asyncio
+import os
+import random
+from collections import OrderedDict, deque
+from typing import Any, Callable
+import httpx
+from telegram.ext import Application
+from http_client import get_json, BOT_DATA_KEY
+from utils import logger, env_int, env_float
+
+POOL_SIZE = env_int("IMAGE_POOL_SIZE", 10)
+SEEN_SIZE = env_int("IMAGE_POOL_SEEN_SIZE", 50)
+REFILL_INTERVAL = env_float("IMAGE_POOL_REFILL_INTERVAL", 2.0)
+# Already-sent images a chat won't get again from the pool
+RECENT_SIZE = env_int("IMAGE_POOL_RECENT_SIZE", 20)
+MAX_CHATS = env_int("IMAGE_POOL_MAX_CHATS", 10_000)
+MAX_BACKOFF = env_float("IMAGE_POOL_MAX_BACKOFF", 300.0)
+
+CAT_API_URL = os.getenv("CAT_API_URL", "https://api.thecatapi.com/v1/images/search")
+DOG_API_URL = os.getenv("DOG_API_URL", "https://dog.ceo/api/breeds/image/random")
+
+
+class ImagePool:
+    """Keeps random images ready to send so replies skip the upstream API.
+
+    A background task keeps up to `size` fresh image URLs prefetched. Once an
+    image has been sent, the file_id Telegram assigned to it is kept in a
+    ring of `seen_size` entries, which is used when no fresh URL is left.
+    The last `recent_size` images each chat got are remembered, and the
+    ring only offers a chat images it hasn't had recently.
+    """
+
+    def __init__(self, name: str, url: str, extract: Callable[[Any], str], size: int = POOL_SIZE,
+                 seen_size: int = SEEN_SIZE, refill_interval: float = REFILL_INTERVAL,
+                 recent_size: int = RECENT_SIZE):
+        self.name = name
+        self.url = url
+        self.extract = extract
+        self.refill_interval = refill_interval
+        self.fresh: deque[str] = deque(maxlen=size)
+        self.seen: deque[str] = deque(maxlen=seen_size)
+        self.recent_size = recent_size
+        self._recent: OrderedDict[int, deque[str]] = OrderedDict()
+        self._task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.repeats = 0
+        self.dead = 0
+
+    async def fetch(self, client: httpx.AsyncClient) -> str:
+        """Asks the upstream API for one image URL."""
+        return self.extract(await get_json(client, self.url))
+
+    def _recent_for(self, chat_id: int) -> deque[str]:
+        recent = self._recent.get(chat_id)
+        if recent is None:
+            recent = self._recent[chat_id] = deque(maxlen=self.recent_size)
+            if len(self._recent) > MAX_CHATS:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(chat_id)
+        return recent
+
+    def take(self, chat_id: int) -> tuple[str, bool] | None:
+        """Returns (photo, is_file_id) for an image new to the chat, or None if there is none ready."""
+        if self.fresh:
+            self.hits += 1
+            return self.fresh.popleft(), False
+        recent = self._recent.get(chat_id, ())
+        unseen = [file_id for file_id in self.seen if file_id not in recent]
+        if unseen:
+            self.hits += 1
+            return random.choice(unseen), True
+        self.misses += 1
+        return None
+
+    def repeat(self, chat_id: int) -> str | None:
+        """Returns the file_id of an image the chat had, though not the last one, or None."""
+        recent = self._recent.get(chat_id)
+        last = recent[-1] if recent else None
+        candidates = [file_id for file_id in self.seen if file_id != last]
+        if not candidates:
+            return None
+        self.repeats += 1
+        return random.choice(candidates)
+
+    def sent(self, chat_id: int, file_id: str) -> None:
+        """Records that the chat got an image, by the file_id kept in the ring."""
+        self._recent_for(chat_id).append(file_id)
+
+    def remember(self, file_id: str) -> None:
+        """Keeps the file_id of an image Telegram has now seen."""
+        self.seen.append(file_id)
+
+    def forget(self, file_id: str) -> None:
+        """Drops an image (a URL or file_id) Telegram no longer accepts."""
+        self.dead += 1
+        try:
+            self.seen.remove(file_id)
+        except ValueError:
+            pass
+
+    def start(self, client: httpx.AsyncClient) -> None:
+        self._task = asyncio.create_task(self._refill(client))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refill(self, client: httpx.AsyncClient) -> None:
+        backoff = self.refill_interval
+        while True:
+            if len(self.fresh) < self.fresh.maxlen:
+                try:
+                    self.fresh.append(await self.fetch(client))
+                    backoff = self.refill_interval
+                except (httpx.HTTPError, KeyError, IndexError, TypeError, ValueError) as e:
+                    self.failures += 1
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    logger.warning("Prefetching %s image failed, retrying in ~%.0fs: %s", self.name, backoff, e)
+                    await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                    continue
+            # Jitter keeps refills of different pools and replicas from lining up
+            await asyncio.sleep(self.refill_interval * random.uniform(0.5, 1.5))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "fresh": len(self.fresh),
+            "seen": len(self.seen),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "repeats": self.repeats,
+            "dead": self.dead,
+            "chats": len(self._recent),
+        }
+
+
+cat_pool = ImagePool("cat", CAT_API_URL, lambda data: data[0]["url"])
+dog_pool = ImagePool("dog", DOG_API_URL, lambda data: data["message"])
+POOLS = (cat_pool, dog_pool)
+
+
+async def start_image_pools(application: Application) -> None:
+    """Starts prefetching with the shared HTTP client."""
+    for pool in POOLS:
+        pool.start(application.bot_data[BOT_DATA_KEY])
+
+
+async def stop_image_pools(application: Application) -> None:
+    for pool in POOLS:
+        await pool.stop()
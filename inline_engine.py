@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Hashable
+from telegram.ext import Application
+from cache import AsyncTTLCache
+from utils import logger, env_int, env_float
+
+# Quiet period after a keystroke before an inline query is looked up
+DEBOUNCE = env_float("INLINE_DEBOUNCE", 0.3)
+# Telegram drops answers that take much longer than this
+DEADLINE = env_float("INLINE_DEADLINE", 4.0)
+MAX_RESULTS = env_int("INLINE_MAX_RESULTS", 5)
+MIN_PREFIX = 3
+
+# Search results as (names the value can be found by, value) pairs
+Matches = list[tuple[tuple[str, ...], Any]]
+
+# Seconds Telegram may cache an answer for, by kind of query
+CACHE_TIMES = {
+    "wiki": 60 * 60,
+    "define": 24 * 60 * 60,
+    "crypto": 30,
+    "qr": 24 * 60 * 60,
+    "help": 5 * 60,
+    # Usage hints and errors shouldn't outlive the problem
+    "error": 5,
+}
+
+
+def result_id(*parts: str) -> str:
+    """A stable id for an inline result, within Telegram's 64 byte limit."""
+    return hashlib.blake2b("\0".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class Debouncer:
+    """Runs the latest job per key after a quiet period, cancelling superseded ones.
+
+    Inline queries arrive on every keystroke. A new job for a user cancels
+    that user's previous one, whether it is still waiting out the delay or
+    already waiting on an upstream, so only the query the user stopped at
+    is looked up and answered.
+    """
+
+    def __init__(self, delay: float = DEBOUNCE):
+        self.delay = delay
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self.submitted = 0
+        self.superseded = 0
+        self.answered = 0
+        self.failures = 0
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        previous = self._tasks.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self.superseded += 1
+        self.submitted += 1
+        task = self._tasks[key] = asyncio.create_task(self._run(key, job))
+        return task
+
+    async def _run(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await asyncio.sleep(self.delay)
+            await job()
+            self.answered += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failures += 1
+            logger.exception("Inline query job failed")
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    async def cancel_all(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": len(self._tasks),
+            "submitted": self.submitted,
+            "superseded": self.superseded,
+            "answered": self.answered,
+            "failures": self.failures,
+        }
+
+
+class PrefixCache:
+    """Caches search results by query and answers longer queries from shorter ones.
+
+    Results are lists of (names, value) pairs, `names` being the lowercased
+    names a value can be found by. A list with fewer than `limit` items is
+    complete: nothing else matched its query. Any longer query that extends
+    it is then answered by filtering that list, without calling the upstream. This suits search-as-you-type, where most queries
+    extend the previous one. The cache is shared by all users.
+    """
+
+    def __init__(self, name: str, ttl: float, limit: int = MAX_RESULTS, max_entries: int = 4096,
+                 persist: bool = False):
+        self.limit = limit
+        self.cache = AsyncTTLCache(name, ttl=ttl, max_entries=max_entries, persist=persist)
+        self.prefix_hits = 0
+
+    def _from_prefix(self, query: str) -> Matches | None:
+        for end in range(len(query) - 1, MIN_PREFIX - 1, -1):
+            shorter = self.cache.get(query[:end])
+            if shorter is not None and len(shorter) < self.limit:
+                return [(names, value) for names, value in shorter
+                        if any(name.startswith(query) for name in names)]
+        return None
+
+    async def get_or_fetch(self, query: str, fetch: Callable[[], Awaitable[Matches]]) -> list[Any]:
+        """Returns the values matching a lowercased query, fetching only when no cached list covers it."""
+        found = self.cache.get(query)
+        if found is None:
+            found = self._from_prefix(query)
+            if found is not None:
+                self.prefix_hits += 1
+                self.cache.set(query, found)
+        if found is None:
+            found = await self.cache.get_or_fetch(query, fetch)
+        return [value for _, value in found]
+
+
+debouncer = Debouncer()
+wiki_search = PrefixCache("inline_wiki", ttl=CACHE_TIMES["wiki"], persist=True)
+
+
+def inline_stats() -> dict[str, dict[str, int]]:
+    return {"queries": debouncer.stats(), "wiki_search": {"prefix_hits": wiki_search.prefix_hits}}
+
+
+async def stop_inline(application: Application) -> None:
+    """Cancels inline lookups still waiting or in flight."""
+    await debouncer.cancel_all()
@@ -1,79 +1,148 @@
+import asyncio
 import os
-from telegram.ext import Application, CommandHandler
-from handlers import (
-    start,
-    help_command,
-    ping,
-    uptime,
-    info,
-    joke,
-    roll,
-    flip,
-    rps,
-    eight_ball,
-    cat,
-    dog,
-    quote,
-    fact,
-    weather,
-    crypto,
-    qr,
-    shorten,
-    translate,
-    calc,
-    wiki,
-    time,
-    poll,
-    define,
-    pin,
-    unpin,
-    kick,
-    ban,
-    mute,
-)
+import sys
+from telegram.ext import Application, ChatMemberHandler, InlineQueryHandler, MessageHandler, filters
+from handlers import ROUTES
+from cache import cache_stats
+from corpus import CORPORA, start_corpora, stop_corpora
+from crypto_prices import price_table, start_price_table, stop_price_table
+from flood_engine import ANTIFLOOD
+from http_client import open_http_client, close_http_client
+from image_pool import POOLS, start_image_pools, stop_image_pools
+from inline_engine import inline_stats, stop_inline
+from metrics import InstrumentedRequest, instrument_handlers, register_collector, start_metrics, stop_metrics
+from persistence import PERSISTENCE, StateStore
+from rate_limiter import PriorityRateLimiter
+from resilience import apply_deadlines, breaker_stats
+from router import CommandRouter, lazy_callback
+import sharding
+from update_processor import ChatOrderedUpdateProcessor
+from utils import env_bool
+import webhook
 from telegram import Update
 
+# Import every handler module at startup instead of on each command's first use
+PRELOAD_HANDLERS = env_bool("PRELOAD_HANDLERS", False)
+
+async def post_init(application: Application) -> None:
+    """Sets up shared resources before the bot starts receiving updates."""
+    await open_http_client(application)
+    await start_image_pools(application)
+    await start_corpora(application)
+    await start_price_table(application)
+    await start_metrics(application)
+
+async def post_stop(application: Application) -> None:
+    """Finishes work that still needs the Bot API once updates have stopped."""
+    # Only a loaded admin module can have anti-flood actions waiting
+    if "handlers.admin" in sys.modules:
+        await sys.modules["handlers.admin"].stop_flood_guard(application)
+
+def flood_stats() -> dict:
+    """Anti-flood counters, once the first group message has loaded the admin module."""
+    admin = sys.modules.get("handlers.admin")
+    return admin.flood_stats() if admin is not None else {}
+
+async def post_shutdown(application: Application) -> None:
+    """Releases shared resources after the bot stops."""
+    await stop_metrics(application)
+    await stop_image_pools(application)
+    await stop_corpora(application)
+    await stop_price_table(application)
+    await stop_inline(application)
+    await close_http_client(application)
+    # Only modules some command has loaded can have started worker processes
+    for name in ("calculator", "qr_engine"):
+        if name in sys.modules:
+            sys.modules[name].shutdown()
+
+def build_application(token: str, rate_limit: bool = True) -> Application:
+    """Builds the application and registers every handler."""
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(ChatOrderedUpdateProcessor())
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if rate_limit:
+        builder = builder.rate_limiter(PriorityRateLimiter())
+    store = None
+    if PERSISTENCE:
+        # Warm caches, admin rosters and file_ids survive restarts
+        store = StateStore()
+        for pool in POOLS:
+            store.track(f"image_pool_{pool.name}", lambda pool=pool: list(pool.seen), pool.seen.extend)
+        builder = builder.persistence(store)
+    # Point the bot at another Bot API server, e.g. a local one or a test stand-in
+    api_url = os.getenv("TELEGRAM_API_URL")
+    if api_url:
+        builder = builder.base_url(api_url)
+    application = builder.build()
+
+    if ANTIFLOOD:
+        # Runs before every other handler and keeps flagged messages from reaching them
+        flood_filter = filters.ChatType.GROUPS & ~filters.StatusUpdate.ALL
+        application.add_handler(MessageHandler(flood_filter, lazy_callback("admin:flood_guard")), group=-1)
+
+    # Every command goes through one router, which imports handler modules on first use
+    router = CommandRouter(ROUTES)
+    application.add_handler(router)
+    if PRELOAD_HANDLERS:
+        router.preload()
+
+    # Inline queries (@bot wiki ..., @bot crypto ...) are debounced and answered in the background
+    application.add_handler(InlineQueryHandler(lazy_callback("inline:inline_query")))
+
+    # Keep cached admin rosters up to date for the moderation commands
+    application.add_handler(
+        ChatMemberHandler(lazy_callback("admin:track_chat_admins"), ChatMemberHandler.ANY_CHAT_MEMBER)
+    )
+
+    # Bound the time commands wait on upstream APIs
+    apply_deadlines(application)
+
+    # Time every handler and export the internal counters on the metrics endpoint
+    instrument_handlers(application)
+    register_collector("cache", cache_stats)
+    register_collector("image_pool", lambda: {pool.name: pool.stats() for pool in POOLS})
+    register_collector("corpus", lambda: {corpus.name: corpus.stats() for corpus in CORPORA})
+    register_collector("prices", lambda: {"crypto": price_table.stats()})
+    register_collector("breaker", breaker_stats)
+    if store is not None:
+        register_collector("state", store.stats)
+    register_collector("inline", inline_stats)
+    register_collector("flood", flood_stats)
+    register_collector("router", lambda: {"commands": router.stats()})
+    register_collector("updates", lambda: {"processor": application.update_processor.stats()})
+    if rate_limit:
+        register_collector("sends", lambda: {"rate_limiter": application.bot.rate_limiter.stats()})
+    return application
+
 def main() -> None:
     """Start the bot."""
+    mode = os.getenv("BOT_MODE", "polling").lower()
+    if mode == "webhook":
+        webhook.check_secret()
+
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     if not token:
         token = input("Please enter your Telegram bot token: ")
 
-    application = Application.builder().token(token).build()
-
-    # On different commands - add handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("ping", ping))
-    application.add_handler(CommandHandler("uptime", uptime))
-    application.add_handler(CommandHandler("info", info))
-    application.add_handler(CommandHandler("joke", joke))
-    application.add_handler(CommandHandler("roll", roll))
-    application.add_handler(CommandHandler("flip", flip))
-    application.add_handler(CommandHandler("rps", rps))
-    application.add_handler(CommandHandler("8ball", eight_ball))
-    application.add_handler(CommandHandler("cat", cat))
-    application.add_handler(CommandHandler("dog", dog))
-    application.add_handler(CommandHandler("quote", quote))
-    application.add_handler(CommandHandler("fact", fact))
-    application.add_handler(CommandHandler("weather", weather))
-    application.add_handler(CommandHandler("crypto", crypto))
-    application.add_handler(CommandHandler("qr", qr))
-    application.add_handler(CommandHandler("shorten", shorten))
-    application.add_handler(CommandHandler("translate", translate))
-    application.add_handler(CommandHandler("calc", calc))
-    application.add_handler(CommandHandler("wiki", wiki))
-    application.add_handler(CommandHandler("time", time))
-    application.add_handler(CommandHandler("poll", poll))
-    application.add_handler(CommandHandler("define", define))
-    application.add_handler(CommandHandler("pin", pin))
-    application.add_handler(CommandHandler("unpin", unpin))
-    application.add_handler(CommandHandler("kick", kick))
-    application.add_handler(CommandHandler("ban", ban))
-    application.add_handler(CommandHandler("mute", mute))
+    if sharding.WORKERS > 1:
+        # This process only receives updates; worker processes build their own application
+        asyncio.run(sharding.serve(token, mode))
+        return
+
+    application = build_application(token)
 
     # Run the bot until you press Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if mode == "webhook":
+        asyncio.run(webhook.serve(application))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
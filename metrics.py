@@ -0,0 +1,298 @@
+import asyncio
+import functools
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Callable
+from urllib.parse import urlsplit
+import httpx
+from telegram.ext import Application, ApplicationHandlerStop, CommandHandler
+from telegram.request import HTTPXRequest
+from router import CommandRouter
+from utils import logger, env_int, env_float, set_log_context
+
+METRICS_PORT = env_int("METRICS_PORT", 0)
+# Loopback unless set: the endpoint has no authentication
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+LOG_INTERVAL = env_float("METRICS_LOG_INTERVAL", 0)
+LOOP_LAG_INTERVAL = 0.5
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Characters the Prometheus text format escapes in label values and in help text
+_LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+_HELP_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n"})
+
+_metrics: list["_Metric"] = []
+_collectors: dict[str, Callable[[], dict[str, dict[str, float]]]] = {}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        _metrics.append(self)
+
+    def _label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{str(value).translate(_LABEL_ESCAPES)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help.translate(_HELP_ESCAPES)}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return super().render() + [f"{self.name}{self._label_text(k)} {v}" for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        self.values[labels] = value
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(_Metric):
+    """Counts observations into fixed buckets; observe() is a bisect and two adds."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self.series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def summary(self, *labels) -> tuple[int, float]:
+        """Returns (count, sum) for a label set."""
+        series = self.series.get(labels)
+        if series is None:
+            return 0, 0.0
+        return int(sum(series[:-1])), series[-1]
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+handler_latency = Histogram("bot_handler_seconds", "Handler run time.", ("command",))
+handler_errors = Counter("bot_handler_errors_total", "Handler exceptions.", ("command",))
+handler_in_flight = Gauge("bot_handler_in_flight", "Handlers currently running.", ("command",))
+upstream_latency = Histogram("bot_upstream_seconds", "Upstream HTTP time to response headers.", ("host",))
+upstream_errors = Counter("bot_upstream_errors_total", "Upstream HTTP transport errors.", ("host",))
+bot_api_latency = Histogram("bot_api_seconds", "Bot API call time.", ("method",))
+bot_api_errors = Counter("bot_api_errors_total", "Bot API calls that did not return 200.", ("method",))
+fast_replies = Counter("bot_fast_replies_total", "Commands answered in the webhook response itself.", ("command",))
+loop_lag = Histogram("bot_event_loop_lag_seconds", "How late the event loop woke from a timer.")
+
+
+def register_collector(prefix: str, collect: Callable[[], dict[str, dict[str, float]]]) -> None:
+    """Adds a callback whose stats are exported at scrape time.
+
+    The callback returns {name: {stat: value}}, exported as
+    bot_<prefix>_<stat>{name="<name>"}. Registering a prefix again replaces it.
+    """
+    _collectors[prefix] = collect
+
+
+def render() -> str:
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, collect in _collectors.items():
+        # Each series' samples must be listed together, after its HELP and TYPE lines
+        series: dict[str, list[str]] = {}
+        try:
+            for name, stats in collect().items():
+                label = str(name).translate(_LABEL_ESCAPES)
+                for stat, value in stats.items():
+                    series.setdefault(stat, []).append(f'bot_{prefix}_{stat}{{name="{label}"}} {value}')
+        except Exception as e:
+            logger.error("Metrics collector %s failed: %s", prefix, e)
+            continue
+        for stat, samples in series.items():
+            # Collectors mix counts and levels without saying which is which
+            lines.append(f"# HELP bot_{prefix}_{stat} The {stat} stat of each {prefix} component.")
+            lines.append(f"# TYPE bot_{prefix}_{stat} untyped")
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def _handler_label(handler: Any) -> str:
+    if isinstance(handler, CommandHandler):
+        return sorted(handler.commands)[0]
+    return type(handler).__name__
+
+
+def _timed(callback: Callable, label: str) -> Callable:
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        chat = getattr(update, "effective_chat", None)
+        set_log_context(chat.id if chat else None, label)
+        handler_in_flight.inc(label)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            # Not an error: the handler (e.g. the anti-flood guard) stopped the update on purpose
+            raise
+        except Exception:
+            handler_errors.inc(label)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, label)
+            handler_in_flight.dec(label)
+    return wrapper
+
+
+def instrument_handlers(application: Application) -> None:
+    """Wraps the callback of every registered handler with timing and error counting.
+
+    The wrapper also tags log records with the chat and command being handled.
+    """
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, CommandRouter):
+                # Label by the routed command rather than by the router
+                handler.add_wrapper(_timed)
+            else:
+                handler.callback = _timed(handler.callback, _handler_label(handler))
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Times upstream requests per host around another httpx transport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        started = time.perf_counter()
+        try:
+            return await self.transport.handle_async_request(request)
+        except httpx.HTTPError:
+            upstream_errors.inc(host)
+            raise
+        finally:
+            upstream_latency.observe(time.perf_counter() - started, host)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """Times every Bot API call by method name."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> tuple[int, bytes]:
+        endpoint = urlsplit(url).path.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            bot_api_errors.inc(endpoint)
+            raise
+        finally:
+            bot_api_latency.observe(time.perf_counter() - started, endpoint)
+        if status != 200:
+            bot_api_errors.inc(endpoint)
+        return status, payload
+
+
+async def _watch_loop_lag() -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lag.observe(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL))
+
+
+async def _log_summary() -> None:
+    while True:
+        await asyncio.sleep(LOG_INTERVAL)
+        parts = []
+        for labels in sorted(handler_latency.series):
+            count, total = handler_latency.summary(*labels)
+            parts.append(f"{labels[0]}={count}/{total / count * 1000:.0f}ms")
+        count, total = loop_lag.summary()
+        lag = f"{total / count * 1000:.1f}ms" if count else "n/a"
+        logger.info("Metrics: loop lag avg %s; handlers (calls/avg) %s", lag, " ".join(parts) or "none")
+
+
+async def _serve_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if request_line.split(b" ")[1:2] == [b"/metrics"]:
+            body, status = render().encode(), "200 OK"
+        else:
+            body, status = b"Not Found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+_tasks: list[asyncio.Task] = []
+_server: asyncio.AbstractServer | None = None
+
+
+async def start_metrics(application: Application) -> None:
+    """Starts the loop lag monitor, the /metrics endpoint and the log summary."""
+    global _server
+    _tasks.append(asyncio.create_task(_watch_loop_lag()))
+    if LOG_INTERVAL > 0:
+        _tasks.append(asyncio.create_task(_log_summary()))
+    if METRICS_PORT:
+        _server = await asyncio.start_server(_serve_scrape, METRICS_LISTEN, METRICS_PORT)
+        logger.info("Metrics available on http://%s:%s/metrics", METRICS_LISTEN, METRICS_PORT)
+
+
+async def stop_metrics(application: Application) -> None:
+    global _server
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    if _server is not None:
+        _server.close()
+        _server = None
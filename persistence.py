@@ -0,0 +1,411 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Hashable
+from telegram.ext import BasePersistence, PersistenceInput
+from cache import AsyncTTLCache, unwatch_caches, watch_caches
+from utils import logger, env_bool, env_float
+
+PERSISTENCE = env_bool("STATE_PERSISTENCE", True)
+STATE_DB = os.getenv("STATE_DB", os.path.join("data", "state.db"))
+# Seconds between write-behind flushes; changes made since the last one are lost on a crash
+FLUSH_INTERVAL = env_float("STATE_FLUSH_INTERVAL", 10.0)
+# Serialized values at least this large are compressed
+COMPRESS_MIN_BYTES = 512
+# Restored entries are handed to a cache this many at a time, so the event loop keeps running
+RESTORE_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    name TEXT NOT NULL,
+    key BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    written_at REAL NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expiry ON cache (expires_at);
+CREATE TABLE IF NOT EXISTS data (
+    kind TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+"""
+
+# Marks a pending chat, user or conversation entry that is to be deleted
+_DROP = object()
+
+
+def dumps(value: Any) -> bytes:
+    """Pickles a value, compressing it if large; the first byte says which."""
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 1)
+        if len(packed) < len(data):
+            return b"z" + packed
+    return b"p" + data
+
+
+def loads(blob: bytes) -> Any:
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return pickle.loads(data)
+
+
+def dump_key(key: Hashable) -> bytes:
+    return pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+
+
+class StateStore(BasePersistence):
+    """Keeps warm state in SQLite across restarts.
+
+    Persisted caches (those created with `persist=True`), chat and user
+    data, conversation states and any state registered with track() are
+    saved. The database runs in WAL mode on a thread of its own, so the
+    event loop never waits on the disk. Writes happen behind: caches only
+    record which keys changed, and every `flush_interval` seconds all
+    changes are serialized and written in one transaction.
+
+    At startup each persisted cache is restored in the background as soon
+    as it exists, newest entries first, while the bot already takes
+    updates. Caches of handler modules that load later are restored then.
+    """
+
+    def __init__(self, path: str = STATE_DB, flush_interval: float = FLUSH_INTERVAL):
+        # bot_data holds the shared HTTP client, which can't be saved
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False),
+                         update_interval=flush_interval)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-store")
+        self._db: sqlite3.Connection | None = None
+        self._opened: asyncio.Future | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._restores: set[asyncio.Task] = set()
+        # Caches are restored one at a time, so their batches don't pile up between two loop iterations
+        self._restoring = asyncio.Lock()
+        self._caches: dict[str, AsyncTTLCache] = {}
+        self._tracked: dict[str, tuple[Callable[[], Any], Callable[[Any], None]]] = {}
+        # (kind, key) -> value (or _DROP) waiting for the next flush, and the entries saved so far
+        self._pending: dict[tuple[str, Hashable], Any] = {}
+        self._stored: set[tuple[str, Hashable]] = set()
+        # Last serialized value of each tracked state, written only when it changes
+        self._tracked_blobs: dict[str, bytes] = {}
+        self.first_started: datetime | None = None
+        self.starts = 0
+        self.open_seconds = 0.0
+        self.restore_seconds: dict[str, float] = {}
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.rows_written = 0
+        self.rows_deleted = 0
+        self.failures = 0
+        self.unsaveable = 0
+        self.size_bytes = 0
+        self.wal_bytes = 0
+
+    def track(self, name: str, dump: Callable[[], Any], load: Callable[[Any], None]) -> None:
+        """Saves whatever `dump` returns on every flush, and hands it back to `load` on startup.
+
+        Call before the application is initialized.
+        """
+        self._tracked[name] = (dump, load)
+
+    async def _run(self, function: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def open(self) -> None:
+        """Opens the database and starts restoring caches; the application's initialize() calls this."""
+        if self._opened is None:
+            self._opened = asyncio.ensure_future(self._open())
+        await self._opened
+
+    async def _open(self) -> None:
+        started = time.perf_counter()
+        first_started, self.starts, tracked = await self._run(self._connect, time.time())
+        self.first_started = datetime.fromtimestamp(first_started)
+        for name, value in tracked.items():
+            if name in self._tracked:
+                self._tracked[name][1](value)
+        self.open_seconds = time.perf_counter() - started
+        logger.info("Opened state store %s in %.1fms (start #%d)", self.path, self.open_seconds * 1000, self.starts)
+        watch_caches(self._watch)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _connect(self, now: float) -> tuple[float, int, dict[str, Any]]:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode a crash can only lose the last transactions, never corrupt the file
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        self._db = db
+        meta = self._load_data("meta")
+        first_started = meta.get("first_started", now)
+        starts = meta.get("starts", 0) + 1
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO data (kind, key, value) VALUES ('meta', ?, ?)",
+                [(dump_key("first_started"), dumps(first_started)), (dump_key("starts"), dumps(starts))],
+            )
+        tracked = self._load_data("state")
+        self._tracked_blobs = {name: dumps(value) for name, value in tracked.items()}
+        self._update_size()
+        return first_started, starts, tracked
+
+    def _watch(self, cache: AsyncTTLCache) -> None:
+        if not cache.persist or cache.name in self._caches:
+            return
+        self._caches[cache.name] = cache
+        cache.track_changes()
+        task = asyncio.create_task(self._restore(cache))
+        self._restores.add(task)
+        task.add_done_callback(self._restores.discard)
+
+    async def _restore(self, cache: AsyncTTLCache) -> None:
+        async with self._restoring:
+            await self._restore_cache(cache)
+
+    async def _restore_cache(self, cache: AsyncTTLCache) -> None:
+        started = time.perf_counter()
+        try:
+            rows = await self._run(self._load_cache, cache.name, cache.max_entries, time.time())
+        except sqlite3.Error as e:
+            logger.warning("Couldn't restore the %s cache: %s", cache.name, e)
+            return
+        # Decoding on the store's thread would fight the event loop for the GIL;
+        # small batches here keep each pause short instead
+        restored = 0
+        for start in range(0, len(rows), RESTORE_BATCH):
+            restored += cache.restore(self._decode(cache.name, rows[start:start + RESTORE_BATCH]))
+            await asyncio.sleep(0)
+        self.restore_seconds[cache.name] = time.perf_counter() - started
+        logger.debug("Restored %d %s entries in %.1fms", restored, cache.name,
+                     self.restore_seconds[cache.name] * 1000)
+
+    def _load_cache(self, name: str, limit: int, now: float) -> list[tuple[bytes, float, bytes]]:
+        rows = self._db.execute(
+            "SELECT key, expires_at, value FROM cache WHERE name = ? AND expires_at > ?"
+            " ORDER BY written_at DESC LIMIT ?",
+            (name, now, limit),
+        )
+        found = []
+        while chunk := rows.fetchmany(RESTORE_BATCH):
+            found.extend(chunk)
+            # Hand the GIL back to the event loop between chunks
+            time.sleep(0)
+        return found
+
+    @staticmethod
+    def _decode(name: str, rows: list[tuple[bytes, float, bytes]]) -> list[tuple[Hashable, float, Any]]:
+        entries = []
+        for key, expires_at, value in rows:
+            try:
+                entries.append((pickle.loads(key), expires_at, loads(value)))
+            except Exception as e:
+                # E.g. saved by an older version whose classes have since changed
+                logger.debug("Skipping unreadable %s entry: %s", name, e)
+        return entries
+
+    def _load_data(self, kind: str) -> dict:
+        found = {}
+        for key, value in self._db.execute("SELECT key, value FROM data WHERE kind = ?", (kind,)):
+            try:
+                found[pickle.loads(key)] = loads(value)
+            except Exception as e:
+                logger.debug("Skipping unreadable %s entry: %s", kind, e)
+        return found
+
+    async def _get_data(self, kind: str) -> dict:
+        await self.open()
+        found = await self._run(self._load_data, kind)
+        self._stored.update((kind, key) for key in found)
+        return found
+
+    def _set_data(self, kind: str, key: Hashable, value: Any) -> None:
+        if value is _DROP:
+            if (kind, key) not in self._stored:
+                return
+            self._stored.discard((kind, key))
+        else:
+            self._stored.add((kind, key))
+        self._pending[kind, key] = value
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+            except Exception:
+                # The loop must outlive any one bad flush
+                self.failures += 1
+                logger.exception("Flushing the state store failed")
+
+    async def _flush(self) -> None:
+        # Collect the changes on the event loop; serialize and write them on the store's thread
+        tracked = {name: dump() for name, (dump, _) in self._tracked.items()}
+        caches = [(name, *cache.drain_changes()) for name, cache in self._caches.items()]
+        pending, self._pending = self._pending, {}
+        started = time.perf_counter()
+        try:
+            written, deleted = await self._run(self._write, caches, pending, tracked, time.time())
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Couldn't write to the state store: %s", e)
+            # Nothing was committed; keep the changes for the next flush, behind any newer ones
+            for name, changed, removed in caches:
+                self._caches[name].requeue_changes((key for key, _, _ in changed), removed)
+            self._pending = {**pending, **self._pending}
+            return
+        if written or deleted:
+            self.flushes += 1
+            self.flush_seconds = time.perf_counter() - started
+            self.rows_written += written
+            self.rows_deleted += deleted
+
+    def _serialize(self, kind: str, key: Hashable, value: Any) -> tuple[bytes, bytes] | None:
+        try:
+            return dump_key(key), dumps(value)
+        except Exception as e:
+            # E.g. a lock in someone's chat_data; the rest of the flush is still written
+            self.unsaveable += 1
+            logger.warning("Not saving %s entry %r: %s", kind, key, e)
+            return None
+
+    def _write(self, caches: list, pending: dict, tracked: dict, now: float) -> tuple[int, int]:
+        cache_rows, cache_deletes = [], []
+        for name, changed, removed in caches:
+            for key, expires_at, value in changed:
+                row = self._serialize(name, key, value)
+                if row is not None:
+                    cache_rows.append((name, row[0], expires_at, now, row[1]))
+            cache_deletes.extend((name, dump_key(key)) for key in removed)
+        data_rows, data_deletes = [], []
+        for (kind, key), value in pending.items():
+            if value is _DROP:
+                data_deletes.append((kind, dump_key(key)))
+            else:
+                row = self._serialize(kind, key, value)
+                if row is not None:
+                    data_rows.append((kind, *row))
+        blobs = {}
+        for name, value in tracked.items():
+            row = self._serialize("state", name, value)
+            if row is not None and self._tracked_blobs.get(name) != row[1]:
+                blobs[name] = row[1]
+                data_rows.append(("state", *row))
+        with self._db:
+            self._db.executemany("DELETE FROM cache WHERE name = ? AND key = ?", cache_deletes)
+            self._db.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)", cache_rows)
+            self._db.executemany("DELETE FROM data WHERE kind = ? AND key = ?", data_deletes)
+            self._db.executemany("INSERT OR REPLACE INTO data VALUES (?, ?, ?)", data_rows)
+            expired = self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+        # Only once committed, or a failed write would keep these from being retried
+        self._tracked_blobs.update(blobs)
+        written = len(cache_rows) + len(data_rows)
+        deleted = len(cache_deletes) + len(data_deletes) + expired
+        if written or deleted:
+            self._update_size()
+        return written, deleted
+
+    def _update_size(self) -> None:
+        page_count = self._db.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+        self.size_bytes = page_count * page_size
+        try:
+            self.wal_bytes = os.path.getsize(self.path + "-wal")
+        except OSError:
+            self.wal_bytes = 0
+
+    def _close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return await self._get_data("chat")
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return await self._get_data("user")
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return await self._get_data(f"conversation:{name}")
+
+    # The application hands over the data of every chat and user it saw; most are empty and need no row
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._set_data("chat", chat_id, data or _DROP)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._set_data("user", user_id, data or _DROP)
+
+    async def update_conversation(self, name: str, key: tuple[int | str, ...], new_state: object | None) -> None:
+        self._set_data(f"conversation:{name}", key, _DROP if new_state is None else new_state)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._set_data("chat", chat_id, _DROP)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._set_data("user", user_id, _DROP)
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Writes the remaining changes and closes the database; called on application shutdown."""
+        if self._opened is None:
+            return
+        unwatch_caches(self._watch)
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        for task in self._restores:
+            task.cancel()
+        await asyncio.gather(*self._restores, return_exceptions=True)
+        await self._flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+        self._opened = None
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        stats = {
+            "store": {
+                "starts": self.starts,
+                "open_seconds": round(self.open_seconds, 4),
+                "size_bytes": self.size_bytes,
+                "wal_bytes": self.wal_bytes,
+                "flushes": self.flushes,
+                "last_flush_seconds": round(self.flush_seconds, 4),
+                "rows_written": self.rows_written,
+                "rows_deleted": self.rows_deleted,
+                "failures": self.failures,
+                "unsaveable": self.unsaveable,
+            },
+        }
+        for name, seconds in self.restore_seconds.items():
+            stats[name] = {"restore_seconds": round(seconds, 4)}
+        return stats
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
+import qrcode
+import qrcode.image.svg
+from qrcode.exceptions import DataOverflowError
+from cache import AsyncTTLCache
+from utils import env_int
+
+WORKERS = env_int("QR_WORKERS", 2)
+MAX_PENDING = env_int("QR_MAX_PENDING", 32)
+MAX_TEXT_LENGTH = env_int("QR_MAX_TEXT_LENGTH", 1000)
+MAX_BOX_SIZE = 20
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Encoded images by content hash, and the Telegram file_id each was uploaded as
+image_cache = AsyncTTLCache(
+    "qr_images", ttl=24 * 60 * 60, max_entries=1024, max_bytes=env_int("QR_CACHE_BYTES", 32 * 1024 * 1024)
+)
+file_ids = AsyncTTLCache("qr_file_ids", ttl=30 * 24 * 60 * 60, max_entries=50_000, persist=True)
+
+
+class QRError(ValueError):
+    """Raised for invalid QR options, text that doesn't fit, or when rendering isn't possible right now."""
+
+
+@dataclass(frozen=True)
+class QRRequest:
+    """What to encode and how."""
+    text: str
+    error_correction: str = "M"
+    box_size: int = 10
+    svg: bool = False
+
+    @property
+    def key(self) -> str:
+        """A content hash identifying the rendered image."""
+        raw = f"{self.error_correction}|{self.box_size}|{self.svg}|{self.text}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @property
+    def filename(self) -> str:
+        return "qrcode.svg" if self.svg else "qrcode.png"
+
+
+def parse(args: list[str]) -> QRRequest:
+    """Parses leading ec=, size= and format= options, then the text to encode."""
+    error_correction, box_size, svg = "M", 10, False
+    while args and "=" in args[0]:
+        name, _, value = args[0].partition("=")
+        name = name.lower()
+        if name == "ec" and value.upper() in ERROR_CORRECTION:
+            error_correction = value.upper()
+        elif name == "size" and value.isdigit() and 1 <= int(value) <= MAX_BOX_SIZE:
+            box_size = int(value)
+        elif name == "format" and value.lower() in ("png", "svg"):
+            svg = value.lower() == "svg"
+        else:
+            break
+        args = args[1:]
+    text = " ".join(args)
+    if not text:
+        raise QRError("Please provide text to encode in the QR code.")
+    if len(text) > MAX_TEXT_LENGTH:
+        raise QRError(f"Text is too long for a QR code (max {MAX_TEXT_LENGTH} characters).")
+    return QRRequest(text, error_correction, box_size, svg)
+
+
+def render(request: QRRequest) -> bytes:
+    """Encodes a QR code as PNG or SVG bytes. Runs in a worker process."""
+    code = qrcode.QRCode(error_correction=ERROR_CORRECTION[request.error_correction], box_size=request.box_size)
+    code.add_data(request.text)
+    try:
+        code.make(fit=True)
+    except (DataOverflowError, ValueError):
+        # Even the largest version can't hold the data; depending on where fitting
+        # overshoots, qrcode raises DataOverflowError or a ValueError about version 41
+        raise QRError(f"The text doesn't fit in a QR code with error correction {request.error_correction}; "
+                      "try a shorter text or ec=L.") from None
+    bio = BytesIO()
+    if request.svg:
+        code.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(bio)
+    else:
+        code.make_image().save(bio, "PNG")
+    return bio.getvalue()
+
+
+_pool: ProcessPoolExecutor | None = None
+_pending = 0
+
+
+async def render_async(request: QRRequest) -> bytes:
+    """Renders off the event loop, refusing work once MAX_PENDING renders are queued."""
+    global _pool, _pending
+    if _pending >= MAX_PENDING:
+        raise QRError("I'm busy generating QR codes right now, please try again in a moment.")
+    if _pool is None:
+        # Forking would copy the logging, state store and event loop threads' locks into the workers
+        _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    pool = _pool
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, render, request)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer); the pool can't be used again
+        if _pool is pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        raise QRError("Generating the QR code failed, please try again.") from None
+    finally:
+        _pending -= 1
+
+
+async def get_image(request: QRRequest) -> bytes:
+    """Returns the encoded image, rendering it only if it isn't cached."""
+    return await image_cache.get_or_fetch(request.key, lambda: render_async(request))
+
+
+def shutdown() -> None:
+    """Stops the worker processes, if any were started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,308 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from typing import Any, Callable, Coroutine
+from telegram import TelegramObject
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+from utils import logger, env_int, env_float
+
+GLOBAL_RATE = env_float("SEND_GLOBAL_RATE", 30.0)
+GLOBAL_BURST = env_int("SEND_GLOBAL_BURST", 1)
+CHAT_RATE = env_float("SEND_CHAT_RATE", 1.0)
+CHAT_BURST = env_int("SEND_CHAT_BURST", 1)
+GROUP_RATE = env_float("SEND_GROUP_RATE", 20 / 60)
+GROUP_BURST = env_int("SEND_GROUP_BURST", 1)
+# Sends that may wait for one chat's bucket; beyond this the lowest-priority one is dropped
+MAX_QUEUED_PER_CHAT = env_int("SEND_MAX_QUEUED_PER_CHAT", 10)
+MAX_RETRIES = env_int("SEND_MAX_RETRIES", 2)
+MAX_IDLE_BUCKETS = env_int("SEND_MAX_IDLE_BUCKETS", 10_000)
+
+# Priority classes; lower values are sent first
+PRIORITY_MODERATION = 0
+PRIORITY_REPLY = 1
+PRIORITY_MEDIA = 2
+
+ENDPOINT_PRIORITIES = {
+    "banChatMember": PRIORITY_MODERATION,
+    "unbanChatMember": PRIORITY_MODERATION,
+    "restrictChatMember": PRIORITY_MODERATION,
+    "deleteMessage": PRIORITY_MODERATION,
+    "deleteMessages": PRIORITY_MODERATION,
+    "pinChatMessage": PRIORITY_MODERATION,
+    "unpinChatMessage": PRIORITY_MODERATION,
+    "unpinAllChatMessages": PRIORITY_MODERATION,
+    "sendMessage": PRIORITY_REPLY,
+    "editMessageText": PRIORITY_REPLY,
+    "sendPhoto": PRIORITY_MEDIA,
+    "sendDocument": PRIORITY_MEDIA,
+    "sendPoll": PRIORITY_MEDIA,
+    "sendAnimation": PRIORITY_MEDIA,
+    "sendMediaGroup": PRIORITY_MEDIA,
+    "copyMessage": PRIORITY_MEDIA,
+    "forwardMessage": PRIORITY_MEDIA,
+}
+
+# Sends whose identical duplicates may share one request while it is pending
+COALESCED_ENDPOINTS = {"sendMessage", "sendPhoto", "sendPoll", "sendDocument", "sendAnimation"}
+
+
+class SendDropped(TelegramError):
+    """Raised for a send dropped because its chat had too many sends waiting."""
+
+
+def _jsonable(value: Any) -> Any:
+    # Reply markups, reply parameters and the like; uploads (InputFile) aren't serializable
+    if isinstance(value, TelegramObject):
+        return value.to_dict()
+    raise TypeError(f"{type(value).__name__} can't be part of a coalescing key")
+
+
+def coalescing_key(endpoint: str, data: dict[str, Any]) -> tuple[str, str] | None:
+    """Identifies a send by its payload, or returns None if it can't be coalesced."""
+    try:
+        return endpoint, json.dumps(data, sort_keys=True, default=_jsonable)
+    except (TypeError, ValueError):
+        return None
+
+
+class PriorityTokenBucket:
+    """A token bucket that hands out tokens to waiters in priority order.
+
+    A rate of 0 or less means no limit. With `max_waiting` set, a waiter
+    beyond that many makes the lowest-priority one give up with SendDropped;
+    moderation (priority 0) is never dropped.
+    """
+
+    def __init__(self, rate: float, capacity: int, max_waiting: int | None = None):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.max_waiting = max_waiting
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+
+    def _refill(self, now: float) -> None:
+        if self.rate <= 0:
+            self.tokens = float(self.capacity)
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self) -> bool:
+        """True when nobody is waiting and the bucket is full again."""
+        self._refill(time.monotonic())
+        return not self._waiters and self.tokens >= self.capacity
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is free right now and nobody is waiting for it."""
+        now = time.monotonic()
+        self._refill(now)
+        if self._waiters or now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds: float) -> None:
+        """Stops handing out tokens for a while, e.g. after a RetryAfter."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self, priority: int) -> None:
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self.paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        if self.max_waiting is not None and len(self._waiters) >= self.max_waiting:
+            self._shed(priority)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    def _shed(self, priority: int) -> None:
+        """Makes room for a waiter of `priority` by dropping the lowest-priority, newest one."""
+        waiters = [waiter for waiter in self._waiters if not waiter[2].done()]
+        worst = max(waiters, default=None)
+        if worst is not None and worst[0] > max(priority, PRIORITY_MODERATION):
+            waiters.remove(worst)
+            worst[2].set_exception(SendDropped("Too many messages are waiting to be sent to this chat"))
+        elif priority > PRIORITY_MODERATION:
+            raise SendDropped("Too many messages are waiting to be sent to this chat")
+        heapq.heapify(waiters)
+        self._waiters = waiters
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            if self._waiters[0][2].done():
+                # The waiter was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            self.tokens -= 1
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """Schedules outgoing Bot API sends within Telegram's flood limits.
+
+    Every send takes a token from its chat's bucket and then from the global
+    bucket, and waiters are served in priority order (moderation actions
+    first, then text replies, then media). RetryAfter errors pause the
+    affected bucket and the request is retried. Identical sends that are
+    still pending share one request. Calls that don't send to a chat pass
+    straight through. Once MAX_QUEUED_PER_CHAT sends wait for one chat, the
+    lowest-priority one fails with SendDropped instead of replying minutes
+    late.
+
+    A priority can be forced for a single call with ``rate_limit_args``.
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+        self._global = PriorityTokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats: dict[int | str, PriorityTokenBucket] = {}
+        self._pending: dict[tuple, asyncio.Future] = {}
+        self.sent = 0
+        self.throttled = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.retry_after_events = 0
+        self.dropped = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: int | str) -> PriorityTokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_BUCKETS:
+                self._prune()
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = PriorityTokenBucket(CHAT_RATE, CHAT_BURST, MAX_QUEUED_PER_CHAT)
+            else:
+                # Groups, supergroups and channels (negative IDs or @usernames)
+                bucket = PriorityTokenBucket(GROUP_RATE, GROUP_BURST, MAX_QUEUED_PER_CHAT)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self) -> None:
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle()]:
+            del self._chats[chat_id]
+
+    def try_acquire(self, chat_id: int | str) -> bool:
+        """Counts a send to the chat if it may go out right now without waiting.
+
+        For replies made outside the Bot API client, such as those in a webhook
+        response; when this returns False the reply should go the usual way.
+        """
+        chat_bucket = self._chat_bucket(chat_id)
+        if not chat_bucket.try_acquire():
+            return False
+        if not self._global.try_acquire():
+            chat_bucket.refund()
+            return False
+        self.sent += 1
+        return True
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict[str, Any] | list[dict[str, Any]]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> bool | dict[str, Any] | list[dict[str, Any]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None or endpoint not in ENDPOINT_PRIORITIES:
+            return await callback(*args, **kwargs)
+
+        key = coalescing_key(endpoint, data) if endpoint in COALESCED_ENDPOINTS else None
+        if key is not None and key in self._pending:
+            self.coalesced += 1
+            return await asyncio.shield(self._pending[key])
+
+        priority = rate_limit_args if rate_limit_args is not None else ENDPOINT_PRIORITIES[endpoint]
+        if key is None:
+            return await self._send(callback, args, kwargs, chat_id, priority)
+
+        future = asyncio.ensure_future(self._send(callback, args, kwargs, chat_id, priority))
+        self._pending[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._pending.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._pending.pop(key, None))
+
+    async def _send(self, callback, args, kwargs, chat_id: int | str, priority: int):
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                await chat_bucket.acquire(priority)
+            except SendDropped:
+                self.dropped += 1
+                logger.warning("Dropping a send to chat %s: too many sends are waiting", chat_id)
+                raise
+            try:
+                await self._global.acquire(priority)
+            except BaseException:
+                # E.g. cancelled while waiting; the chat's token was never used
+                chat_bucket.refund()
+                raise
+            if time.monotonic() - started > 0.001:
+                self.throttled += 1
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                self.retry_after_events += 1
+                delay = e.retry_after
+                delay = delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+                logger.warning("Flood limit hit for chat %s; retrying in %ss", chat_id, delay)
+                chat_bucket.pause(delay)
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+
+    def stats(self) -> dict[str, int]:
+        """Returns send, throttle, retry and queue counters."""
+        return {
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "retry_after_events": self.retry_after_events,
+            "dropped": self.dropped,
+            "queued_global": self._global.waiting,
+            "queued_chats": sum(bucket.waiting for bucket in self._chats.values()),
+            "chat_buckets": len(self._chats),
+        }
@@ -0,0 +1,271 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import random
+import time
+from collections import deque
+from typing import Callable, Iterator
+import httpx
+from telegram.ext import Application, CommandHandler
+from router import CommandRouter
+from utils import logger, env_int, env_float, env_bool
+
+# How long a command may spend waiting on upstream APIs, in seconds
+DEFAULT_DEADLINE = env_float("COMMAND_DEADLINE", 5.0)
+COMMAND_DEADLINES = {
+    "joke": 3.0,
+    "quote": 3.0,
+    "fact": 3.0,
+    "cat": 4.0,
+    "dog": 4.0,
+    "crypto": 3.0,
+    "define": 3.0,
+    "wiki": 4.0,
+}
+
+BREAKER_FAILURES = env_int("BREAKER_FAILURES", 5)
+BREAKER_RESET_TIMEOUT = env_float("BREAKER_RESET_TIMEOUT", 30.0)
+# A call cut off by its command's deadline only counts against the host if it had waited this long;
+# shorter ones ran out of the caller's budget, not the host's patience
+BREAKER_SLOW_CALL = env_float("BREAKER_SLOW_CALL", 2.0)
+
+HEDGE = env_bool("HEDGE_REQUESTS", True)
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = env_float("HEDGE_MIN_DELAY", 0.05)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Raised without calling an upstream host whose circuit breaker is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit open for {host}; retrying in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Raised when the command's deadline passes before the upstream answers."""
+
+
+class CircuitBreaker:
+    """Stops calling a host after repeated failures, then probes it again.
+
+    After `failures` consecutive failures the breaker opens and calls fail
+    fast for `reset_timeout` seconds. Then a single probe is let through
+    (half-open); its success closes the breaker and its failure reopens it.
+    """
+
+    def __init__(self, host: str, failures: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.host = host
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+
+    def check(self) -> None:
+        """Raises CircuitOpenError unless a call may go ahead."""
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if now >= self.retry_at:
+            # Let one probe through; another may go if it hasn't reported back by then
+            self.state = HALF_OPEN
+            self.retry_at = now + self.reset_timeout
+            logger.info("Circuit for %s half-open, probing", self.host)
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.host, self.retry_at - now)
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("Circuit for %s closed", self.host)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failures:
+            if self.state != OPEN:
+                self.trips += 1
+                logger.warning("Circuit for %s open after %s failures", self.host, self.consecutive_failures)
+            self.state = OPEN
+            # Jitter keeps replicas from probing a recovering host at the same moment
+            self.retry_at = time.monotonic() + self.reset_timeout * random.uniform(1.0, 1.1)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "open": int(self.state != CLOSED),
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+# One breaker per host, shared by every client in the process
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+
+def breaker_stats() -> dict[str, dict[str, float]]:
+    """Returns the breaker counters of every host called so far."""
+    return {host: breaker.stats() for host, breaker in _breakers.items()}
+
+
+def remaining_time() -> float | None:
+    """Seconds left before the current command's deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bounds the upstream calls made inside the block to `seconds` in total."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _with_deadline(callback: Callable, seconds: float) -> Callable:
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        with deadline(seconds):
+            return await callback(update, context)
+    return wrapper
+
+
+def apply_deadlines(application: Application) -> None:
+    """Gives every command handler an upstream deadline from COMMAND_DEADLINES."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, CommandRouter):
+                handler.add_wrapper(
+                    lambda callback, command: _with_deadline(callback, COMMAND_DEADLINES.get(command, DEFAULT_DEADLINE))
+                )
+            elif isinstance(handler, CommandHandler):
+                seconds = max(COMMAND_DEADLINES.get(command, DEFAULT_DEADLINE) for command in handler.commands)
+                handler.callback = _with_deadline(handler.callback, seconds)
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Wraps an httpx transport with deadlines, circuit breakers and hedging.
+
+    Each request is bounded by the current command's deadline, if any. Every
+    host has a CircuitBreaker fed by transport errors, timeouts, 5xx and 429
+    responses. A request cut off by its command's deadline only counts as a
+    failure if it had already waited BREAKER_SLOW_CALL seconds. GET requests still unanswered after the host's recent p95
+    latency are hedged: a second attempt is sent and the first answer wins.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, hedge: bool = HEDGE):
+        self.transport = transport
+        self.hedge = hedge
+        self._latencies: dict[str, deque[float]] = {}
+        self._hedge_delays: dict[str, float] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _record_latency(self, host: str, elapsed: float) -> None:
+        samples = self._latencies.get(host)
+        if samples is None:
+            samples = self._latencies[host] = deque(maxlen=200)
+        samples.append(elapsed)
+        # Re-derive the hedge delay every few samples rather than on every call
+        if len(samples) >= HEDGE_MIN_SAMPLES and len(samples) % 10 == 0:
+            ordered = sorted(samples)
+            self._hedge_delays[host] = max(HEDGE_MIN_DELAY, ordered[int(len(ordered) * HEDGE_QUANTILE)])
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        breaker = breaker_for(host)
+        breaker.check()
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded("Command deadline passed before the request was sent", request=request)
+            # Cap each phase's timeout to the time left
+            timeouts = request.extensions.get("timeout", {})
+            request.extensions["timeout"] = {
+                phase: remaining if value is None else min(value, remaining) for phase, value in timeouts.items()
+            } or {"connect": remaining, "read": remaining, "write": remaining, "pool": remaining}
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(remaining):
+                response = await self._send(request, host)
+        except TimeoutError:
+            self._deadline_passed(breaker, started)
+            raise DeadlineExceeded("Command deadline passed waiting for the upstream", request=request) from None
+        except httpx.TimeoutException:
+            left = remaining_time()
+            if left is not None and left <= 0.01:
+                # The phase timeout was capped to the deadline, and that is what ran out
+                self._deadline_passed(breaker, started)
+                raise DeadlineExceeded("Command deadline passed waiting for the upstream", request=request) from None
+            breaker.record_failure()
+            raise
+        except httpx.HTTPError:
+            breaker.record_failure()
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+            self._record_latency(host, time.monotonic() - started)
+        return response
+
+    @staticmethod
+    def _deadline_passed(breaker: CircuitBreaker, started: float) -> None:
+        if time.monotonic() - started >= BREAKER_SLOW_CALL:
+            breaker.record_failure()
+
+    async def _send(self, request: httpx.Request, host: str) -> httpx.Response:
+        delay = self._hedge_delays.get(host)
+        if not self.hedge or delay is None or request.method not in ("GET", "HEAD"):
+            return await self.transport.handle_async_request(request)
+        # Copy before sending since transports may rewrite the request
+        hedge_request = httpx.Request(request.method, request.url, headers=request.headers,
+                                      extensions=dict(request.extensions))
+        first = asyncio.create_task(self.transport.handle_async_request(request))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.hedges += 1
+                pending.add(asyncio.create_task(self.transport.handle_async_request(hedge_request)))
+            error: BaseException | None = None
+            while True:
+                if done:
+                    winners = [task for task in done if task.exception() is None]
+                    if winners:
+                        if winners[0] is not first:
+                            self.hedge_wins += 1
+                        for extra in winners[1:]:
+                            await extra.result().aclose()
+                        return winners[0].result()
+                    error = next(iter(done)).exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
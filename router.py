@@ -0,0 +1,116 @@
+import importlib
+import time
+from typing import Any, Callable
+from telegram import MessageEntity, Update
+from telegram.ext import BaseHandler
+from utils import logger
+
+# A wrapper factory takes a handler callback and its command and returns the wrapped callback
+Wrapper = Callable[[Callable, str], Callable]
+
+
+def load_callback(target: str, package: str = "handlers") -> Callable:
+    """Imports the handler named by "module:function" within `package`."""
+    module_name, _, name = target.partition(":")
+    return getattr(importlib.import_module(f"{package}.{module_name}"), name)
+
+
+def lazy_callback(target: str, package: str = "handlers") -> Callable:
+    """Returns a callback for any handler class that imports its module on first use."""
+    callback = None
+
+    async def run(update: Any, context: Any) -> Any:
+        nonlocal callback
+        if callback is None:
+            callback = load_callback(target, package)
+        return await callback(update, context)
+    return run
+
+
+class CommandRouter(BaseHandler):
+    """Dispatches every bot command with one dict lookup.
+
+    Replaces a CommandHandler per command, which the application would
+    otherwise try one after another for each update. `routes` maps each
+    command to "module:function" within `package`; the module is imported
+    when the command is first used and the resolved callback is cached.
+
+    Wrappers added with add_wrapper are applied to each callback as it is
+    resolved, innermost first, so per-command instrumentation keeps working.
+    """
+
+    def __init__(self, routes: dict[str, str], package: str = "handlers", block: bool = True):
+        super().__init__(self.dispatch, block=block)
+        self.routes = {command.lower(): target for command, target in routes.items()}
+        self.package = package
+        self._wrappers: list[Wrapper] = []
+        self._callbacks: dict[str, Callable] = {}
+        self.import_seconds: dict[str, float] = {}
+
+    @property
+    def commands(self) -> frozenset[str]:
+        return frozenset(self.routes)
+
+    def add_wrapper(self, wrapper: Wrapper) -> None:
+        """Wraps the callback of every command, including ones already resolved."""
+        self._wrappers.append(wrapper)
+        self._callbacks.clear()
+
+    def resolve(self, command: str) -> Callable:
+        """Returns the wrapped callback for a command, importing its module if needed."""
+        callback = self._callbacks.get(command)
+        if callback is None:
+            target = self.routes[command]
+            module_path = f"{self.package}.{target.partition(':')[0]}"
+            started = time.perf_counter()
+            callback = load_callback(target, self.package)
+            if module_path not in self.import_seconds:
+                self.import_seconds[module_path] = time.perf_counter() - started
+                logger.debug("Loaded %s in %.1fms", module_path, self.import_seconds[module_path] * 1000)
+            for wrapper in self._wrappers:
+                callback = wrapper(callback, command)
+            self._callbacks[command] = callback
+        return callback
+
+    def preload(self) -> None:
+        """Imports every handler module now rather than on first use."""
+        for command in self.routes:
+            self.resolve(command)
+
+    def check_update(self, update: object) -> tuple[str, list[str]] | None:
+        """Returns (command, args) for a message addressed to one of the routed commands."""
+        if not isinstance(update, Update):
+            return None
+        # Same update types as CommandHandler's default filter
+        message = update.message or update.edited_message
+        if not message or not message.text or not message.entities:
+            return None
+        entity = message.entities[0]
+        if entity.type != MessageEntity.BOT_COMMAND or entity.offset != 0:
+            return None
+        command, _, target = message.text[1:entity.length].partition("@")
+        if target and target.lower() != (message.get_bot().username or "").lower():
+            return None
+        command = command.lower()
+        if command not in self.routes:
+            return None
+        return command, message.text.split()[1:]
+
+    async def handle_update(self, update: Update, application: Any, check_result: tuple[str, list[str]],
+                            context: Any) -> Any:
+        command, context.args = check_result
+        return await self.resolve(command)(update, context)
+
+    async def dispatch(self, update: Update, context: Any) -> Any:
+        """Runs the command in `update`; lets the router be used as a plain callback."""
+        check_result = self.check_update(update)
+        if check_result is not None:
+            return await self.handle_update(update, None, check_result, context)
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "routes": len(self.routes),
+            "resolved": len(self._callbacks),
+            "modules_loaded": len(self.import_seconds),
+        }
@@ -0,0 +1,449 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+import httpx
+from telegram import Bot, Update
+import webhook
+from metrics import METRICS_PORT, register_collector, start_metrics, stop_metrics
+from persistence import STATE_DB
+from rate_limiter import GLOBAL_RATE
+from utils import logger, env_int, env_float
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# More than one worker runs the bot as an ingress process feeding worker processes
+WORKERS = env_int("BOT_WORKERS", 1)
+# Updates a worker may have unacknowledged before the ingress stops taking new ones
+MAX_PENDING = env_int("WORKER_MAX_PENDING", 256)
+# Updates waiting to be sent to a worker, and how long a full queue may stay full
+QUEUE_SIZE = env_int("WORKER_QUEUE_SIZE", 256)
+SEND_TIMEOUT = env_float("WORKER_SEND_TIMEOUT", 10.0)
+HEALTH_INTERVAL = env_float("WORKER_HEALTH_INTERVAL", 5.0)
+HEALTH_TIMEOUT = env_float("WORKER_HEALTH_TIMEOUT", 20.0)
+MAX_RESTART_BACKOFF = env_float("WORKER_MAX_RESTART_BACKOFF", 30.0)
+DRAIN_TIMEOUT = env_float("WORKER_DRAIN_TIMEOUT", 10.0)
+POLL_TIMEOUT = env_int("POLL_TIMEOUT", 30)
+
+# Frames are a header (payload length, kind, sequence number) and a payload
+HEADER = struct.Struct("!IcQ")
+HELLO, UPDATE, ACK, DROPPED, PING, PONG = b"H", b"U", b"A", b"D", b"P", b"O"
+
+
+def shard_key(data: dict) -> int | None:
+    """Returns the chat (or, failing that, user) of a raw update.
+
+    Mirrors update_processor.ordering_key on the decoded JSON, so the
+    ingress never has to build Update objects.
+    """
+    for field, value in data.items():
+        if field == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+    return None
+
+
+def shard_for(data: dict, shards: int) -> int:
+    key = shard_key(data)
+    if key is None:
+        return data.get("update_id", 0) % shards
+    return zlib.crc32(key.to_bytes(8, "big", signed=True)) % shards
+
+
+def write_frame(writer: asyncio.StreamWriter, kind: bytes, seq: int = 0, payload: bytes = b"") -> None:
+    writer.write(HEADER.pack(len(payload), kind, seq) + payload)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[bytes, int, bytes]:
+    length, kind, seq = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, seq, await reader.readexactly(length) if length else b""
+
+
+class WorkerProcess:
+    """The ingress side of one worker: its process, connection and unacknowledged updates.
+
+    Updates are queued by enqueue() and written to the worker by its own
+    sender task, so a stuck worker only holds up its own queue. Every
+    update sent is kept until the worker acknowledges it, so a restarted
+    worker is sent the updates its predecessor never finished. Once
+    `max_pending` updates are unacknowledged, the sender waits.
+    """
+
+    def __init__(self, index: int, count: int, token: str, socket_path: str, max_pending: int = MAX_PENDING,
+                 queue_size: int = QUEUE_SIZE):
+        self.index = index
+        self.count = count
+        self.token = token
+        self.socket_path = socket_path
+        self.max_pending = max_pending
+        self.process: asyncio.subprocess.Process | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(queue_size)
+        self.unacked: OrderedDict[int, bytes] = OrderedDict()
+        self.connected = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._seq = 0
+        self.last_pong = 0.0
+        self.reported: dict[str, float] = {}
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.restarts = 0
+        self.unhealthy = 0
+        self._killed = False
+
+    def env(self) -> dict[str, str]:
+        env = dict(os.environ, TELEGRAM_BOT_TOKEN=self.token, BOT_WORKER_INDEX=str(self.index),
+                   BOT_WORKER_SOCKET=self.socket_path)
+        # Chats are split between workers, but the bot-wide send rate is shared
+        env["SEND_GLOBAL_RATE"] = str(GLOBAL_RATE / self.count)
+        # Each worker keeps the state of its own chats, and its own start count, in a file of its own
+        base, ext = os.path.splitext(STATE_DB)
+        env["STATE_DB"] = f"{base}.worker{self.index}{ext}"
+        if METRICS_PORT:
+            env["METRICS_PORT"] = str(METRICS_PORT + 1 + self.index)
+        return env
+
+    async def spawn(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(sys.executable, "-m", "sharding", cwd=ROOT, env=self.env())
+        self.last_pong = time.monotonic()
+        self._killed = False
+
+    def mark_unhealthy(self, reason: str) -> None:
+        """Kills the worker so its supervisor restarts it, unless that is already under way."""
+        if self._killed or self.process is None or self.process.returncode is not None:
+            return
+        self._killed = True
+        self.unhealthy += 1
+        logger.error("Worker %s %s, killing it", self.index, reason)
+        self.process.kill()
+
+    def attach(self, writer: asyncio.StreamWriter) -> None:
+        """Adopts a worker's connection and resends everything it hasn't acknowledged."""
+        self.writer = writer
+        for seq, body in self.unacked.items():
+            write_frame(writer, UPDATE, seq, body)
+        self.last_pong = time.monotonic()
+        self.connected.set()
+
+    def detach(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = None
+        self.connected.clear()
+
+    async def enqueue(self, body: bytes, timeout: float = SEND_TIMEOUT) -> None:
+        """Queues an update for the worker.
+
+        Raises asyncio.TimeoutError, and marks the worker unhealthy, if the
+        queue stays full for `timeout` seconds.
+        """
+        try:
+            self.queue.put_nowait(body)
+            return
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self.queue.put(body), timeout)
+        except asyncio.TimeoutError:
+            self.mark_unhealthy(f"took no updates for {timeout:.0f}s")
+            raise
+
+    async def run_sender(self) -> None:
+        while True:
+            await self.send(await self.queue.get())
+
+    async def send(self, body: bytes) -> None:
+        while len(self.unacked) >= self.max_pending:
+            self._room.clear()
+            await self._room.wait()
+        self._seq += 1
+        self.unacked[self._seq] = body
+        self.sent += 1
+        if self.writer is not None:
+            write_frame(self.writer, UPDATE, self._seq, body)
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                # Resent once the worker is back
+                pass
+
+    def ack(self, seq: int, dropped: bool = False) -> None:
+        if self.unacked.pop(seq, None) is not None:
+            if dropped:
+                self.dropped += 1
+            else:
+                self.acked += 1
+        if len(self.unacked) < self.max_pending:
+            self._room.set()
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "alive": int(self.connected.is_set()),
+            "queued": self.queue.qsize(),
+            "unacked": len(self.unacked),
+            "sent": self.sent,
+            "acked": self.acked,
+            "dropped": self.dropped,
+            "restarts": self.restarts,
+            "unhealthy": self.unhealthy,
+            **{f"worker_{name}": value for name, value in self.reported.items()},
+        }
+
+
+class ShardedIngress:
+    """Fans raw updates out to worker processes, sharded by chat.
+
+    Each worker is a full copy of the bot, started with `python -m sharding`,
+    that connects back over a Unix socket. All updates of a chat go to the
+    same worker, which keeps them in order as the single-process bot does.
+    That also keeps per-chat state such as admin rosters, recently sent
+    jokes and send rate buckets in one place; caches of global data are
+    simply held by every worker. Workers that exit, stop answering health
+    checks or leave their send queue full are restarted with backoff.
+    """
+
+    def __init__(self, token: str, workers: int = WORKERS, max_pending: int = MAX_PENDING,
+                 queue_size: int = QUEUE_SIZE):
+        self._dir = tempfile.mkdtemp(prefix="bot-workers-")
+        self.socket_path = os.path.join(self._dir, "ingress.sock")
+        self.workers = [WorkerProcess(i, workers, token, self.socket_path, max_pending, queue_size)
+                        for i in range(workers)]
+        self._server: asyncio.AbstractServer | None = None
+        self._supervisors: list[asyncio.Task] = []
+        self._senders: list[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._accept, self.socket_path)
+        self._supervisors = [asyncio.create_task(self._supervise(worker)) for worker in self.workers]
+        self._senders = [asyncio.create_task(worker.run_sender()) for worker in self.workers]
+
+    async def wait_ready(self) -> None:
+        """Waits until every worker has connected."""
+        await asyncio.gather(*(worker.connected.wait() for worker in self.workers))
+
+    async def dispatch(self, data: dict, body: bytes) -> None:
+        """Queues a raw update for its chat's worker.
+
+        Waits only while that worker's queue is full, and raises
+        asyncio.TimeoutError if it stays full for WORKER_SEND_TIMEOUT.
+        """
+        await self.workers[shard_for(data, len(self.workers))].enqueue(body)
+
+    async def wait_idle(self, timeout: float | None = None) -> bool:
+        """Waits until every update queued has been acknowledged. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(worker.unacked or not worker.queue.empty() for worker in self.workers):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Lets workers finish what they were sent, then shuts them down."""
+        if not await self.wait_idle(timeout):
+            logger.warning("Stopping workers with %s updates unacknowledged",
+                           sum(len(worker.unacked) + worker.queue.qsize() for worker in self.workers))
+        self._stopping = True
+        for task in self._senders:
+            task.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        for worker in self.workers:
+            worker.detach()
+        await asyncio.wait(self._supervisors, timeout=timeout)
+        for task in self._supervisors:
+            task.cancel()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        worker = None
+        try:
+            kind, index, _ = await read_frame(reader)
+            if kind != HELLO or index >= len(self.workers):
+                return
+            worker = self.workers[index]
+            worker.attach(writer)
+            logger.info("Worker %s connected", index)
+            while True:
+                kind, seq, payload = await read_frame(reader)
+                if kind in (ACK, DROPPED):
+                    worker.ack(seq, dropped=kind == DROPPED)
+                elif kind == PONG:
+                    worker.last_pong = time.monotonic()
+                    worker.reported = json.loads(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if worker is not None and worker.writer is writer:
+                worker.detach()
+            writer.close()
+
+    async def _supervise(self, worker: WorkerProcess) -> None:
+        backoff = 1.0
+        while not self._stopping:
+            started = time.monotonic()
+            await worker.spawn()
+            health = asyncio.create_task(self._check_health(worker))
+            code = await worker.process.wait()
+            health.cancel()
+            worker.detach()
+            if self._stopping:
+                return
+            worker.restarts += 1
+            # Back off only if the worker keeps dying soon after starting
+            backoff = 1.0 if time.monotonic() - started > 60 else min(backoff * 2, MAX_RESTART_BACKOFF)
+            logger.error("Worker %s exited with code %s, restarting in %.0fs", worker.index, code, backoff)
+            await asyncio.sleep(backoff)
+
+    async def _check_health(self, worker: WorkerProcess) -> None:
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            if worker.writer is not None:
+                write_frame(worker.writer, PING)
+            if time.monotonic() - worker.last_pong > HEALTH_TIMEOUT:
+                worker.mark_unhealthy("missed its health checks")
+                return
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {f"worker{worker.index}": worker.stats() for worker in self.workers}
+
+
+async def poll(bot: Bot, ingress: ShardedIngress) -> None:
+    """Long-polls getUpdates and hands each raw update to the ingress.
+
+    Nothing is decoded into Update objects here. While a worker's queue is
+    full, dispatch waits and so does the next getUpdates call; if it stays
+    full, the rest of the batch is fetched again later.
+    """
+    offset = 0
+    backoff = 1.0
+    async with httpx.AsyncClient(timeout=POLL_TIMEOUT + 10) as client:
+        while True:
+            try:
+                response = await client.post(f"{bot.base_url}/getUpdates", json={
+                    "offset": offset,
+                    "timeout": POLL_TIMEOUT,
+                    "allowed_updates": Update.ALL_TYPES,
+                })
+                response.raise_for_status()
+                updates = webhook.loads(response.content)["result"]
+                backoff = 1.0
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                logger.warning("getUpdates failed, retrying in %.0fs: %s", backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+                continue
+            try:
+                for data in updates:
+                    await ingress.dispatch(data, webhook.dumps(data))
+                    offset = data["update_id"] + 1
+            except asyncio.TimeoutError:
+                logger.warning("A worker is backed up, fetching updates again in %.0fs", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+
+
+async def serve(token: str, mode: str) -> None:
+    """Runs the ingress in polling or webhook mode until SIGINT or SIGTERM."""
+    bot = Bot(token, base_url=os.getenv("TELEGRAM_API_URL") or "https://api.telegram.org/bot")
+    await bot.initialize()
+    ingress = ShardedIngress(token)
+    await ingress.start()
+    register_collector("workers", ingress.stats)
+    await start_metrics(None)
+    logger.info("Started %s workers", len(ingress.workers))
+
+    server, poller = None, None
+    if mode == "webhook":
+        server = await webhook.start_server(bot, ingress.dispatch)
+    else:
+        await bot.delete_webhook()
+        poller = asyncio.create_task(poll(bot, ingress))
+    try:
+        await webhook.wait_for_stop()
+    finally:
+        logger.info("Stopping ingress")
+        if server is not None:
+            await server.drain()
+        if poller is not None:
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+        await ingress.stop()
+        await stop_metrics(None)
+        await bot.shutdown()
+
+
+async def run_worker(application, index: int, socket_path: str) -> None:
+    """Runs the application on updates read from the ingress until it disconnects."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    write_frame(writer, HELLO, index)
+    tasks: set[asyncio.Task] = set()
+
+    async def handle(seq: int, body: bytes) -> None:
+        # Acknowledged only once the update has run, so a crash before then gets it resent
+        ran = True
+        try:
+            update = Update.de_json(webhook.loads(body), application.bot)
+            ran = await application.update_processor.process_and_wait(update, application.process_update(update))
+        except Exception:
+            logger.exception("Worker %s failed to process an update", index)
+        finally:
+            if not writer.is_closing():
+                write_frame(writer, ACK if ran else DROPPED, seq)
+
+    try:
+        while True:
+            kind, seq, payload = await read_frame(reader)
+            if kind == UPDATE:
+                # Tasks start in arrival order, which the update processor keeps per chat
+                task = asyncio.create_task(handle(seq, payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            elif kind == PING:
+                stats = {"tasks": len(tasks), **application.update_processor.stats()}
+                write_frame(writer, PONG, 0, json.dumps(stats).encode())
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def worker_main() -> None:
+    import main
+    # Ctrl-C reaches the whole process group; the ingress decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    index = int(os.environ["BOT_WORKER_INDEX"])
+    application = main.build_application(os.environ["TELEGRAM_BOT_TOKEN"])
+    asyncio.run(run_worker(application, index, os.environ["BOT_WORKER_SOCKET"]))
+
+
+if __name__ == "__main__":
+    worker_main()
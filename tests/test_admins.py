@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from telegram import ChatMember
+
+import cache
+from admins import AdminRoster
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def member_update(chat_id: int, user_id: int, status: str) -> SimpleNamespace:
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id),
+                           new_chat_member=SimpleNamespace(user=SimpleNamespace(id=user_id), status=status))
+
+
+def test_member_updates_patch_the_roster_without_extending_its_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    roster = AdminRoster(ttl=600)
+    roster.cache.set(5, frozenset({1}))
+    clock.now += 250
+    roster.apply_update(member_update(5, 2, ChatMember.ADMINISTRATOR))
+    clock.now += 250
+    roster.apply_update(member_update(5, 1, ChatMember.MEMBER))
+    assert roster.cache.get(5) == frozenset({2})
+    # Patched twice, the roster loaded 500s ago is still reloaded once its 600s are up
+    clock.now += 150
+    assert roster.cache.get(5) is None
+
+
+def test_an_update_for_a_chat_without_a_roster_caches_nothing():
+    roster = AdminRoster(ttl=600)
+    roster.apply_update(member_update(7, 2, ChatMember.ADMINISTRATOR))
+    assert roster.cache.get(7) is None
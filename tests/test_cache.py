@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import AsyncTTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_concurrent_misses_share_one_fetch():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": calls}
+
+    async def run():
+        c = AsyncTTLCache("test-single-flight", ttl=60)
+        results = await asyncio.gather(*(c.get_or_fetch("key", fetch) for _ in range(10)))
+        assert results == [{"value": 1}] * 10
+        assert await c.get_or_fetch("key", fetch) == {"value": 1}
+        return c.stats()
+
+    stats = asyncio.run(run())
+    assert calls == 1
+    assert (stats["misses"], stats["coalesced"], stats["hits"], stats["inflight"]) == (1, 9, 1, 0)
+
+
+def test_fetch_errors_reach_every_caller_and_are_not_cached():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise LookupError("upstream down")
+
+    async def run():
+        c = AsyncTTLCache("test-single-flight-error", ttl=60)
+        results = await asyncio.gather(*(c.get_or_fetch("key", fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, LookupError) for result in results)
+        assert len(c) == 0
+        with pytest.raises(LookupError):
+            await c.get_or_fetch("key", fetch)
+
+    asyncio.run(run())
+    assert calls == 2
+
+
+def test_cancelled_caller_does_not_fail_the_others():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def run():
+        c = AsyncTTLCache("test-single-flight-cancel", ttl=60)
+        first = asyncio.ensure_future(c.get_or_fetch("key", fetch))
+        second = asyncio.ensure_future(c.get_or_fetch("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "value"
+
+    asyncio.run(run())
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = AsyncTTLCache("test-ttl", ttl=10)
+    c.set("default", 1)
+    c.set("short", 2, ttl=1)
+    clock.now += 5
+    assert (c.get("default"), c.get("short")) == (1, None)
+    clock.now += 6
+    assert c.get("default") is None
+    assert len(c) == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    c = AsyncTTLCache("test-lru", ttl=60, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert (c.get("a"), c.get("b"), c.get("c")) == (1, None, 3)
+    assert c.evictions == 1
+
+
+def test_entries_are_evicted_to_stay_within_the_byte_bound():
+    value = "x" * 1000
+    size = cache._deep_sizeof(value)
+    c = AsyncTTLCache("test-bytes", ttl=60, max_bytes=size * 2 + size // 2)
+    for key in "abc":
+        c.set(key, value)
+    assert (c.get("a"), c.get("b"), c.get("c")) == (None, value, value)
+    assert c.stats()["bytes"] == size * 2
+    # A value larger than the whole cache isn't stored at all
+    c.set("huge", "x" * 10000)
+    assert c.get("huge") is None
+    assert len(c) == 2
+
+
+def test_replace_keeps_the_entry_expiry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    c = AsyncTTLCache("test-replace", ttl=10)
+    c.track_changes()
+    c.set("key", 1)
+    c.drain_changes()
+    clock.now += 6
+    assert c.replace("key", 2)
+    assert c.get("key") == 2
+    assert [key for key, _, _ in c.drain_changes()[0]] == ["key"]
+    clock.now += 5
+    assert c.get("key") is None
+    # Nothing to replace once it has expired, or was never there
+    assert not c.replace("key", 3)
+    assert not c.replace("other", 3)
+    assert len(c) == 0
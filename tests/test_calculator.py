@@ -0,0 +1,29 @@
+import pytest
+
+from calculator import CalcError, evaluate
+
+
+@pytest.mark.parametrize("expression", ["(-8) ** 0.5", "(-1) ** (1 / 3)", "((-8) ** 0.5) * 0"])
+def test_complex_results_are_rejected(expression):
+    with pytest.raises(CalcError, match="not a real number"):
+        evaluate(expression)
+
+
+def test_real_powers_of_negative_numbers_still_work():
+    assert evaluate("(-8) ** 2") == 64
+    assert evaluate("(-8) ** -1") == -0.125
+    assert evaluate("(-8.0) ** 3") == -512.0
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("2.0 ** 4000", "too large"),
+    ("10.0 ** 309", "too large"),
+    ("1e308 * 10", "too large"),
+    ("(2 ** 1023) / 0.5", "too large"),
+    ("1e400", "too large"),
+    ("1 / 0", "Division by zero"),
+    ("1.5 // 0", "Division by zero"),
+])
+def test_overflow_and_division_by_zero_are_calc_errors(expression, message):
+    with pytest.raises(CalcError, match=message):
+        evaluate(expression)
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from dice import MAX_DICE, DiceError, DiceSpec, _apply_keep, _sample_counts, parse, roll
+
+
+@pytest.mark.parametrize("count,sides", [(1, 1), (10_001, 1), (50_000, 6), (10**9, 20), (12_345, 1000)])
+def test_sampled_face_counts_add_up_to_the_dice_rolled(count, sides):
+    counts = _sample_counts(count, sides, random.Random(count))
+    assert len(counts) == sides + 1
+    assert counts[0] == 0
+    assert all(n >= 0 for n in counts)
+    assert sum(counts) == count
+
+
+def test_sampled_face_counts_are_roughly_uniform():
+    counts = _sample_counts(6_000_000, 6, random.Random(1))
+    assert all(abs(n - 1_000_000) < 10_000 for n in counts[1:])
+
+
+@pytest.mark.parametrize("keep,keep_count,expected", [
+    ("kh", 3, [0, 0, 0, 0, 0, 1, 2]),
+    ("kl", 3, [0, 2, 1, 0, 0, 0, 0]),
+    ("dh", 2, [0, 2, 1, 1, 0, 1, 0]),
+    ("dl", 4, [0, 0, 0, 0, 0, 1, 2]),
+])
+def test_keep_and_drop_take_dice_from_the_right_end(keep, keep_count, expected):
+    # Rolled 1, 1, 2, 3, 5, 6, 6
+    counts = [0, 2, 1, 1, 0, 1, 2]
+    kept = _apply_keep(counts, DiceSpec(7, 6, keep, keep_count))
+    assert kept == expected
+    assert counts == [0, 2, 1, 1, 0, 1, 2]
+
+
+def test_keep_on_a_sampled_roll_keeps_exactly_that_many():
+    spec = parse("1000000d6kh10")
+    result = roll(spec, random.Random(3))
+    assert result.approximate
+    assert result.total == 60
+    assert (result.lowest, result.highest) == (6, 6)
+
+
+@pytest.mark.parametrize("expression", ["0d6", "2d0", "2d1001", f"{MAX_DICE + 1}d6", "99999999999d6",
+                                        "4d6kh5", "4d6dl4", "d6+9999999", "2x6"])
+def test_out_of_bounds_expressions_are_rejected(expression):
+    with pytest.raises(DiceError):
+        parse(expression)
+
+
+def test_rolls_stay_within_their_bounds():
+    for expression in ("3d6+2", "20000d6", "4d6kl1-1"):
+        spec = parse(expression)
+        n = spec.keep_count or spec.count
+        result = roll(spec, random.Random(7))
+        assert n + spec.modifier <= result.total <= n * spec.sides + spec.modifier
+        assert 1 <= result.lowest <= result.highest <= spec.sides
@@ -0,0 +1,47 @@
+from flood_engine import BAN, MUTE, REPEAT, FloodDetector
+
+
+def test_steady_rate_at_the_limit_is_not_flagged():
+    detector = FloodDetector(window=10, max_messages=10)
+    verdicts = [detector.check(-1, 1, f"message {i}", float(i)) for i in range(100)]
+    assert verdicts == [None] * 100
+
+
+def test_rate_above_the_limit_is_flagged():
+    detector = FloodDetector(window=10, max_messages=10)
+    verdicts = [detector.check(-1, 1, f"message {i}", i * 0.5) for i in range(20)]
+    assert verdicts[:10] == [None] * 10
+    assert verdicts[10] is not None and verdicts[10].action == MUTE
+
+
+def test_repeats_far_apart_are_not_flagged():
+    detector = FloodDetector(window=10, max_repeats=4)
+    verdicts = [detector.check(-1, 1, "same thing again", i * 300.0) for i in range(10)]
+    assert verdicts == [None] * 10
+
+
+def test_short_repeats_are_not_flagged():
+    detector = FloodDetector(window=10, max_repeats=4)
+    verdicts = [detector.check(-1, 1, "+1", i * 2.0) for i in range(10)]
+    assert verdicts == [None] * 10
+
+
+def test_quick_repeats_are_flagged_once_per_trip():
+    detector = FloodDetector(window=10, max_repeats=4, ban_strikes=2)
+    verdicts = [detector.check(-1, 1, "buy my course now", i * 2.0) for i in range(5)]
+    assert verdicts[:4] == [None] * 4
+    assert verdicts[4].reason == REPEAT and verdicts[4].action == MUTE
+    # The trip resets the count: after the window, the user starts over
+    later = [detector.check(-1, 1, "buy my course now", 100 + i * 2.0) for i in range(5)]
+    assert later[:4] == [None] * 4
+    assert later[4].action == BAN
+
+
+def test_forgiven_user_starts_over():
+    detector = FloodDetector(window=10, max_messages=2)
+    for i in range(3):
+        verdict = detector.check(-1, 1, f"message {i}", float(i))
+    assert verdict is not None
+    detector.forgive(-1, 1)
+    assert detector.check(-1, 1, "message 3", 3.0) is None
+    assert detector.stats()["forgiven"] == 1
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import httpx
+
+import image_pool
+from image_pool import CAT_API_URL, ImagePool
+from upstream_stubs import StubTransport, UpstreamStubs
+
+HOST = "api.thecatapi.com"
+
+
+def cat_pool(size: int = 3) -> ImagePool:
+    return ImagePool("cat", CAT_API_URL, lambda data: data[0]["url"], size=size, seen_size=5, refill_interval=0.01)
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_pool_refills_to_its_size_and_tops_up_after_a_take():
+    async def run():
+        stubs = UpstreamStubs()
+        await stubs.start()
+        pool = cat_pool()
+        async with httpx.AsyncClient(transport=StubTransport(stubs.port)) as client:
+            pool.start(client)
+            await wait_until(lambda: len(pool.fresh) == 3)
+            # A full pool doesn't ask for more
+            await asyncio.sleep(0.1)
+            assert stubs.calls[HOST] == 3
+            photo, is_file_id = pool.take(chat_id=1)
+            await wait_until(lambda: len(pool.fresh) == 3)
+            await pool.stop()
+        await stubs.stop()
+        return stubs, pool, photo, is_file_id
+
+    stubs, pool, photo, is_file_id = asyncio.run(run())
+    assert photo.startswith("https://example.com/cat/")
+    assert not is_file_id
+    assert photo not in pool.fresh
+    assert stubs.calls[HOST] == 4
+    assert pool.stats()["hits"] == 1
+
+
+def test_prefetch_backs_off_while_the_api_fails_and_recovers(monkeypatch):
+    monkeypatch.setattr(image_pool, "MAX_BACKOFF", 0.1)
+    # No jitter: waits go 0.02, 0.04, 0.08, then stay at 0.1
+    monkeypatch.setattr(image_pool.random, "uniform", lambda a, b: 1.0)
+
+    async def run():
+        stubs = UpstreamStubs(host_error_rate={HOST: 1.0})
+        await stubs.start()
+        pool = cat_pool()
+        async with httpx.AsyncClient(transport=StubTransport(stubs.port)) as client:
+            pool.start(client)
+            await asyncio.sleep(0.5)
+            failures = pool.failures
+            stubs.host_error_rate[HOST] = 0.0
+            await wait_until(lambda: len(pool.fresh) == 3, timeout=1.0)
+            await pool.stop()
+        await stubs.stop()
+        return stubs, pool, failures
+
+    stubs, pool, failures = asyncio.run(run())
+    # Retrying every 10ms would have failed about 50 times
+    assert 3 <= failures <= 8
+    assert pool.failures == failures
+    assert stubs.calls[HOST] == failures + 3
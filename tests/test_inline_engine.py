@@ -0,0 +1,105 @@
+import asyncio
+
+from inline_engine import Debouncer, PrefixCache
+
+
+def test_only_the_last_query_of_a_burst_runs():
+    ran = []
+
+    async def job(text):
+        ran.append(text)
+
+    async def run():
+        debouncer = Debouncer(delay=0.2)
+        for text in ("h", "he", "hel", "hell", "hello"):
+            debouncer.submit("user", lambda text=text: job(text))
+            await asyncio.sleep(0.005)
+        other = debouncer.submit("other user", lambda: job("bye"))
+        await asyncio.gather(other, *debouncer._tasks.values(), return_exceptions=True)
+        return debouncer.stats()
+
+    stats = asyncio.run(run())
+    assert sorted(ran) == ["bye", "hello"]
+    assert stats == {"pending": 0, "submitted": 6, "superseded": 4, "answered": 2, "failures": 0}
+
+
+def test_a_query_superseded_while_in_flight_is_cancelled():
+    finished = []
+
+    async def slow(text):
+        await asyncio.sleep(0.05)
+        finished.append(text)
+
+    async def run():
+        debouncer = Debouncer(delay=0)
+        first = debouncer.submit("user", lambda: slow("first"))
+        await asyncio.sleep(0.01)
+        second = debouncer.submit("user", lambda: slow("second"))
+        await asyncio.gather(first, second, return_exceptions=True)
+        assert first.cancelled()
+
+    asyncio.run(run())
+    assert finished == ["second"]
+
+
+def test_failing_jobs_are_counted_and_cancel_all_stops_the_rest():
+    async def fail():
+        raise RuntimeError("upstream broke")
+
+    async def never():
+        await asyncio.Event().wait()
+
+    async def run():
+        debouncer = Debouncer(delay=0)
+        await debouncer.submit("a", fail)
+        debouncer.submit("b", never)
+        await asyncio.sleep(0.01)
+        await debouncer.cancel_all()
+        return debouncer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["failures"] == 1
+    assert stats["pending"] == 0
+
+
+def matches(*names):
+    return [((name,), name.title()) for name in names]
+
+
+def test_longer_queries_are_answered_from_a_complete_shorter_list():
+    calls = []
+
+    async def fetch_for(query, found):
+        calls.append(query)
+        return found
+
+    async def run():
+        cache = PrefixCache("test_inline_complete", ttl=60, limit=5)
+        assert await cache.get_or_fetch("lon", lambda: fetch_for("lon", matches("london", "long beach"))) == [
+            "London", "Long Beach"]
+        assert await cache.get_or_fetch("long", lambda: fetch_for("long", [])) == ["Long Beach"]
+        assert await cache.get_or_fetch("londo", lambda: fetch_for("londo", [])) == ["London"]
+        return cache.prefix_hits
+
+    assert asyncio.run(run()) == 2
+    assert calls == ["lon"]
+
+
+def test_a_full_shorter_list_may_be_missing_matches_so_it_is_not_used():
+    calls = []
+
+    async def fetch(query):
+        calls.append(query)
+        return matches(*(f"{query}{i}" for i in range(3)))
+
+    async def run():
+        cache = PrefixCache("test_inline_full", ttl=60, limit=3)
+        await cache.get_or_fetch("par", lambda: fetch("par"))
+        await cache.get_or_fetch("pari", lambda: fetch("pari"))
+        # Below the minimum prefix length, nothing is derived either
+        await cache.get_or_fetch("pa", lambda: fetch("pa"))
+        await cache.get_or_fetch("p", lambda: fetch("p"))
+        return cache.prefix_hits
+
+    assert asyncio.run(run()) == 0
+    assert calls == ["par", "pari", "pa", "p"]
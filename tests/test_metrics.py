@@ -0,0 +1,40 @@
+import metrics
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_escape_total", "Line one\nback\\slash.", ("command",))
+    try:
+        counter.inc('say "hi"\\now\nplease')
+        lines = counter.render()
+    finally:
+        metrics._metrics.remove(counter)
+    assert lines[0] == "# HELP test_escape_total Line one\\nback\\\\slash."
+    assert lines[-1] == 'test_escape_total{command="say \\"hi\\"\\\\now\\nplease"} 1'
+
+
+def test_collector_names_are_escaped():
+    metrics.register_collector("test_escape", lambda: {'a"b\nc': {"size": 1}})
+    try:
+        text = metrics.render()
+    finally:
+        del metrics._collectors["test_escape"]
+    assert 'bot_test_escape_size{name="a\\"b\\nc"} 1\n' in text
+
+
+def test_collector_series_are_typed_and_grouped():
+    metrics.register_collector("test_group", lambda: {"a": {"hits": 1, "size": 2}, "b": {"hits": 3, "size": 4}})
+    try:
+        lines = metrics.render().splitlines()
+    finally:
+        del metrics._collectors["test_group"]
+    start = lines.index("# HELP bot_test_group_hits The hits stat of each test_group component.")
+    assert lines[start:start + 8] == [
+        "# HELP bot_test_group_hits The hits stat of each test_group component.",
+        "# TYPE bot_test_group_hits untyped",
+        'bot_test_group_hits{name="a"} 1',
+        'bot_test_group_hits{name="b"} 3',
+        "# HELP bot_test_group_size The size stat of each test_group component.",
+        "# TYPE bot_test_group_size untyped",
+        'bot_test_group_size{name="a"} 2',
+        'bot_test_group_size{name="b"} 4',
+    ]
@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+import threading
+
+import cache
+from persistence import StateStore
+
+
+def saved_users(path):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM data WHERE kind = 'user'").fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_unpicklable_value_is_skipped(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    async def run():
+        store = StateStore(path, flush_interval=3600)
+        await store.open()
+        await store.update_user_data(1, {"lock": threading.Lock()})
+        await store.update_user_data(2, {"name": "fine"})
+        await store._flush()
+        await store.update_user_data(3, {"name": "later"})
+        await store.flush()
+        return store
+
+    store = asyncio.run(run())
+    assert store.unsaveable == 1
+    assert store.failures == 0
+    assert saved_users(path) == 2
+
+
+def test_failed_write_is_retried(tmp_path):
+    cache._registry.clear()
+    path = str(tmp_path / "state.db")
+
+    async def run():
+        store = StateStore(path, flush_interval=3600)
+        await store.open()
+        wiki = cache.AsyncTTLCache("test_wiki", ttl=3600, persist=True)
+        wiki.set("python", "a language")
+        await store.update_user_data(1, {"name": "kept"})
+        write = store._write
+
+        def broken(*args):
+            raise sqlite3.OperationalError("disk I/O error")
+        store._write = broken
+        await store._flush()
+        store._write = write
+        await store.flush()
+        return store
+
+    store = asyncio.run(run())
+    cache._registry.clear()
+    assert store.failures == 1
+    assert saved_users(path) == 1
+    db = sqlite3.connect(path)
+    assert db.execute("SELECT COUNT(*) FROM cache WHERE name = 'test_wiki'").fetchone()[0] == 1
+    db.close()
@@ -0,0 +1,41 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import qr_engine
+from qr_engine import QRError, QRRequest, render, render_async
+
+
+def test_render_encodes_png_and_svg():
+    assert render(QRRequest("hello")).startswith(b"\x89PNG")
+    assert b"<svg" in render(QRRequest("hello", svg=True))
+
+
+@pytest.mark.parametrize("text, error_correction", [("x" * 1300, "H"), ("x" * 3000, "L"), ("\U0001f600" * 1000, "M")])
+def test_text_that_does_not_fit_is_a_qr_error(text, error_correction):
+    with pytest.raises(QRError, match="doesn't fit"):
+        render(QRRequest(text, error_correction))
+
+
+def test_a_broken_pool_is_replaced(monkeypatch):
+    context = multiprocessing.get_context("spawn")
+    broken = ProcessPoolExecutor(max_workers=1, mp_context=context)
+    with pytest.raises(BrokenProcessPool):
+        # A worker dying, as it would when killed, breaks the whole pool
+        broken.submit(os._exit, 1).result()
+    monkeypatch.setattr(qr_engine, "_pool", broken)
+
+    async def run():
+        with pytest.raises(QRError):
+            await render_async(QRRequest("hello"))
+        assert qr_engine._pool is None
+        return await render_async(QRRequest("hello"))
+
+    try:
+        assert asyncio.run(run()).startswith(b"\x89PNG")
+    finally:
+        qr_engine.shutdown()
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from telegram.ext import ExtBot
+
+import rate_limiter
+from fake_bot_api import FakeBotAPI
+from rate_limiter import PRIORITY_MEDIA, PriorityRateLimiter, SendDropped
+
+GROUP = -1001
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Scales the limiter's rates so tests take fractions of a second."""
+    def set_limits(chat_rate=1000.0, group_rate=1000.0, global_rate=1000.0, max_queued=10):
+        monkeypatch.setattr(rate_limiter, "CHAT_RATE", chat_rate)
+        monkeypatch.setattr(rate_limiter, "GROUP_RATE", group_rate)
+        monkeypatch.setattr(rate_limiter, "GLOBAL_RATE", global_rate)
+        monkeypatch.setattr(rate_limiter, "MAX_QUEUED_PER_CHAT", max_queued)
+    return set_limits
+
+
+async def start(api: FakeBotAPI) -> tuple[ExtBot, PriorityRateLimiter]:
+    await api.start()
+    limiter = PriorityRateLimiter()
+    bot = ExtBot("123:test", base_url=f"http://127.0.0.1:{api.port}/bot", rate_limiter=limiter)
+    await bot.initialize()
+    return bot, limiter
+
+
+async def stop(bot: ExtBot, api: FakeBotAPI) -> None:
+    await bot.shutdown()
+    await api.stop()
+
+
+class RecordingBotAPI(FakeBotAPI):
+    """Records the text, or the method, of each send in the order it arrives."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.order = []
+
+    async def handle(self, http_method, target, headers, body):
+        method = target.rsplit("/", 1)[-1]
+        if method != "getMe":
+            self.order.append(self._parse(headers.get("content-type", ""), body).get("text", method))
+        return await super().handle(http_method, target, headers, body)
+
+
+def test_waiting_sends_go_out_in_priority_order(limits):
+    limits(group_rate=20.0)
+
+    async def run():
+        api = RecordingBotAPI(group_per_minute=1000, global_rate=1000)
+        bot, limiter = await start(api)
+        try:
+            # Takes the chat's only token; everything after it has to wait
+            first = asyncio.ensure_future(bot.send_message(GROUP, "first"))
+            await asyncio.sleep(0.01)
+            await asyncio.gather(
+                first,
+                *(bot.send_message(GROUP, f"media {i}", rate_limit_args=PRIORITY_MEDIA) for i in range(2)),
+                bot.send_message(GROUP, "reply"),
+                bot.ban_chat_member(GROUP, 42),
+            )
+        finally:
+            await stop(bot, api)
+        return api, limiter
+
+    api, limiter = asyncio.run(run())
+    assert api.order == ["first", "banChatMember", "reply", "media 0", "media 1"]
+    assert api.rejected == {}
+    assert limiter.throttled == 4
+
+
+def test_a_full_chat_queue_drops_the_lowest_priority_sends(limits):
+    limits(group_rate=20.0, max_queued=2)
+
+    async def run():
+        api = FakeBotAPI(group_per_minute=1000, global_rate=1000)
+        bot, limiter = await start(api)
+        try:
+            first = asyncio.ensure_future(bot.send_message(GROUP, "sent at once"))
+            await asyncio.sleep(0.01)
+            results = await asyncio.gather(
+                first,
+                bot.send_message(GROUP, "reply 1"),
+                bot.send_message(GROUP, "media", rate_limit_args=PRIORITY_MEDIA),
+                bot.send_message(GROUP, "reply 2"),
+                bot.send_message(GROUP, "reply 3"),
+                bot.ban_chat_member(GROUP, 42),
+                return_exceptions=True,
+            )
+        finally:
+            await stop(bot, api)
+        return api, limiter, results
+
+    api, limiter, results = asyncio.run(run())
+    dropped = [i for i, result in enumerate(results) if isinstance(result, SendDropped)]
+    # The media send makes room for reply 2; reply 3 finds only equals and gives up;
+    # the ban, never dropped, makes room by shedding reply 2
+    assert dropped == [2, 3, 4]
+    assert limiter.dropped == 3
+    assert api.calls["sendMessage"] == 2
+    assert api.calls["banChatMember"] == 1
+
+
+def test_retry_after_pauses_the_chat_and_retries(limits):
+    limits()
+
+    async def run():
+        # The limiter thinks it may send at will; the API knows better
+        api = FakeBotAPI(chat_rate=1, global_rate=1000)
+        bot, limiter = await start(api)
+        try:
+            messages = await asyncio.gather(bot.send_message(5, "one"), bot.send_message(5, "two"))
+        finally:
+            await stop(bot, api)
+        return api, limiter, messages
+
+    api, limiter, messages = asyncio.run(run())
+    assert sorted(message.text for message in messages) == ["one", "two"]
+    assert api.rejected == {"sendMessage": 1}
+    assert (limiter.retry_after_events, limiter.retries, limiter.sent) == (1, 1, 2)
+
+
+def test_a_send_cancelled_while_waiting_for_the_global_bucket_returns_its_chat_token(limits):
+    limits(chat_rate=0.001, global_rate=0.001)
+
+    async def callback():
+        return True
+
+    async def run():
+        limiter = PriorityRateLimiter()
+        # Someone else just took the only global token
+        assert limiter._global.try_acquire()
+        send = asyncio.ensure_future(
+            limiter.process_request(callback, (), {}, "banChatMember", {"chat_id": 5, "user_id": 1}, None))
+        await asyncio.sleep(0.01)
+        assert limiter._chat_bucket(5).tokens < 1
+        send.cancel()
+        await asyncio.gather(send, return_exceptions=True)
+        assert limiter._chat_bucket(5).try_acquire()
+
+    asyncio.run(run())
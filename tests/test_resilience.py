@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import resilience
+from resilience import CLOSED, OPEN, CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientTransport
+from upstream_stubs import UPSTREAM_HOST_HEADER, StubTransport, UpstreamStubs
+
+HOST = "api.coingecko.com"
+URL = f"https://{HOST}/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
+
+
+class SlowFirstCall(UpstreamStubs):
+    """Holds the first request to each host for `spike_latency` seconds."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen: set[str] = set()
+
+    async def handle(self, method, target, headers, body):
+        host = headers.get(UPSTREAM_HOST_HEADER, "")
+        if host not in self.seen:
+            self.seen.add(host)
+            await asyncio.sleep(self.spike_latency)
+        return await super().handle(method, target, headers, body)
+
+
+class RecordingTransport(StubTransport):
+    """Remembers each request's timeouts and which attempts were cancelled."""
+
+    def __init__(self, port: int):
+        super().__init__(port)
+        self.timeouts: list[dict] = []
+        self.cancelled = 0
+
+    async def handle_async_request(self, request):
+        self.timeouts.append(dict(request.extensions.get("timeout", {})))
+        try:
+            return await super().handle_async_request(request)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    """Gives each test fresh breakers that reset quickly."""
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "CircuitBreaker",
+                        lambda host: CircuitBreaker(host, failures=3, reset_timeout=0.1))
+
+
+async def client_for(stubs: UpstreamStubs, hedge: bool = False) -> tuple[httpx.AsyncClient, ResilientTransport]:
+    await stubs.start()
+    inner = RecordingTransport(stubs.port)
+    transport = ResilientTransport(inner, hedge=hedge)
+    return httpx.AsyncClient(transport=transport), transport
+
+
+def test_breaker_opens_fails_fast_then_closes_after_a_good_probe():
+    async def run():
+        stubs = UpstreamStubs(host_error_rate={HOST: 1.0})
+        client, _ = await client_for(stubs)
+        async with client:
+            for _ in range(3):
+                assert (await client.get(URL)).status_code == 503
+            breaker = resilience.breaker_for(HOST)
+            assert breaker.state == OPEN
+            with pytest.raises(CircuitOpenError):
+                await client.get(URL)
+            # Failed fast, without calling the host
+            assert stubs.calls[HOST] == 3
+
+            await asyncio.sleep(0.12)
+            stubs.host_error_rate[HOST] = 0.0
+            assert (await client.get(URL)).status_code == 200
+            assert breaker.state == CLOSED
+            assert breaker.stats()["trips"] == 1
+        await stubs.stop()
+
+    asyncio.run(run())
+
+
+def test_failed_probe_reopens_the_breaker():
+    async def run():
+        stubs = UpstreamStubs(host_error_rate={HOST: 1.0})
+        client, _ = await client_for(stubs)
+        async with client:
+            for _ in range(3):
+                await client.get(URL)
+            breaker = resilience.breaker_for(HOST)
+            await asyncio.sleep(0.12)
+            # The probe is let through and fails
+            assert (await client.get(URL)).status_code == 503
+            assert breaker.state == OPEN
+            with pytest.raises(CircuitOpenError):
+                await client.get(URL)
+            assert stubs.calls[HOST] == 4
+            assert breaker.stats()["trips"] == 2
+        await stubs.stop()
+
+    asyncio.run(run())
+
+
+def test_hedged_request_wins_and_the_slow_attempt_is_cancelled():
+    async def run():
+        stubs = SlowFirstCall(spike_latency=5.0)
+        client, transport = await client_for(stubs, hedge=True)
+        transport._hedge_delays[HOST] = 0.05
+        async with client:
+            started = time.monotonic()
+            response = await client.get(URL)
+            elapsed = time.monotonic() - started
+        await stubs.stop()
+        return response, elapsed, transport
+
+    response, elapsed, transport = asyncio.run(run())
+    assert response.status_code == 200
+    assert elapsed < 1.0
+    assert (transport.hedges, transport.hedge_wins) == (1, 1)
+    assert transport.transport.cancelled == 1
+
+
+def test_deadline_cuts_off_a_slow_host_without_tripping_its_breaker():
+    async def run():
+        stubs = UpstreamStubs(host_spike_rate={HOST: 1.0}, spike_latency=5.0)
+        client, transport = await client_for(stubs)
+        async with client:
+            with resilience.deadline(0.2):
+                started = time.monotonic()
+                with pytest.raises(DeadlineExceeded):
+                    await client.get(URL)
+                elapsed = time.monotonic() - started
+        await stubs.stop()
+        return elapsed, transport
+
+    elapsed, transport = asyncio.run(run())
+    assert elapsed < 1.0
+    # Every phase's timeout was capped to what was left of the deadline
+    assert all(value <= 0.2 for value in transport.transport.timeouts[0].values())
+    breaker = resilience.breaker_for(HOST)
+    assert (breaker.state, breaker.consecutive_failures) == (CLOSED, 0)
+
+
+def test_spent_deadline_fails_before_sending():
+    async def run():
+        stubs = UpstreamStubs()
+        client, _ = await client_for(stubs)
+        async with client:
+            with resilience.deadline(0):
+                with pytest.raises(DeadlineExceeded):
+                    await client.get(URL)
+        await stubs.stop()
+        return stubs
+
+    assert asyncio.run(run()).calls == {}
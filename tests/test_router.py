@@ -0,0 +1,83 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import pytest
+from telegram import Update
+
+from router import CommandRouter
+
+HANDLERS = {
+    "greet.py": "async def hello(update, context):\n    return 'hello ' + ' '.join(context.args)\n",
+    "other.py": "async def bye(update, context):\n    return 'bye'\n",
+}
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    name = f"routed_{tmp_path.name}"
+    (tmp_path / name).mkdir()
+    (tmp_path / name / "__init__.py").write_text("")
+    for filename, source in HANDLERS.items():
+        (tmp_path / name / filename).write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield name
+    for module in [module for module in sys.modules if module.startswith(name)]:
+        del sys.modules[module]
+
+
+def command(text: str, length: int | None = None) -> Update:
+    u = Update.de_json({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": length or len(text.split()[0])}],
+        },
+    }, None)
+    u.message.set_bot(SimpleNamespace(username="testbot"))
+    return u
+
+
+def test_modules_are_imported_on_first_use_only(package):
+    router = CommandRouter({"Hello": "greet:hello", "bye": "other:bye"}, package=package)
+    assert f"{package}.greet" not in sys.modules
+    callback = router.resolve("hello")
+    assert f"{package}.greet" in sys.modules
+    assert f"{package}.other" not in sys.modules
+    assert router.resolve("hello") is callback
+    assert router.stats() == {"routes": 2, "resolved": 1, "modules_loaded": 1}
+
+
+def test_preload_imports_every_module(package):
+    router = CommandRouter({"hello": "greet:hello", "bye": "other:bye"}, package=package)
+    router.preload()
+    assert {f"{package}.greet", f"{package}.other"} <= set(sys.modules)
+    assert router.stats()["resolved"] == 2
+
+
+def test_wrappers_apply_innermost_first_including_to_resolved_callbacks(package):
+    router = CommandRouter({"hello": "greet:hello"}, package=package)
+    router.resolve("hello")
+
+    def tag(label):
+        def wrapper(callback, name):
+            async def wrapped(update, context):
+                return f"{label}({name}: {await callback(update, context)})"
+            return wrapped
+        return wrapper
+
+    router.add_wrapper(tag("inner"))
+    router.add_wrapper(tag("outer"))
+    context = SimpleNamespace(args=None)
+    assert asyncio.run(router.dispatch(command("/hello world"), context)) == "outer(hello: inner(hello: hello world))"
+
+
+def test_check_update_routes_only_known_commands_for_this_bot(package):
+    router = CommandRouter({"hello": "greet:hello"}, package=package)
+    assert router.check_update(command("/HELLO a b")) == ("hello", ["a", "b"])
+    assert router.check_update(command("/hello@TestBot a")) == ("hello", ["a"])
+    assert router.check_update(command("/hello@otherbot a")) is None
+    assert router.check_update(command("/unknown")) is None
+    assert router.check_update(object()) is None
+    # Nothing was imported just to check updates
+    assert f"{package}.greet" not in sys.modules
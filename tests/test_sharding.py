@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+import sharding
+from sharding import ShardedIngress, WorkerProcess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Process:
+    returncode = None
+
+    def __init__(self):
+        self.killed = 0
+
+    def kill(self):
+        self.killed += 1
+        self.returncode = -9
+
+
+def worker(index: int, max_pending: int = 4, queue_size: int = 2) -> WorkerProcess:
+    w = WorkerProcess(index, 2, "token", "/nonexistent", max_pending, queue_size)
+    w.process = Process()
+    return w
+
+
+def test_stuck_worker_does_not_hold_up_others():
+    async def run():
+        # The stuck worker never acknowledges, so its sender stops after one update
+        stuck, healthy = worker(0, max_pending=1), worker(1)
+        senders = [asyncio.create_task(w.run_sender()) for w in (stuck, healthy)]
+        for _ in range(3):
+            await stuck.enqueue(b"x", timeout=0.1)
+        await asyncio.wait_for(healthy.enqueue(b"y", timeout=0.1), 0.05)
+        await asyncio.sleep(0)
+        assert healthy.sent == 1
+        for task in senders:
+            task.cancel()
+
+    asyncio.run(run())
+
+
+def test_full_queue_times_out_and_marks_worker_unhealthy():
+    async def run():
+        w = worker(0, queue_size=1)
+        await w.enqueue(b"x", timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await w.enqueue(b"y", timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await w.enqueue(b"z", timeout=0.05)
+        # Killed once; the second timeout finds the worker already down
+        assert w.process.killed == 1
+        assert w.stats()["unhealthy"] == 1
+        assert w.stats()["queued"] == 1
+
+    asyncio.run(run())
+
+
+STUB_WORKER = """
+import asyncio, os, sys
+sys.path.insert(0, {root!r})
+import sharding
+from update_processor import ChatOrderedUpdateProcessor
+
+
+class Application:
+    bot = None
+    post_init = post_stop = post_shutdown = None
+
+    def __init__(self):
+        self.update_processor = ChatOrderedUpdateProcessor(4)
+
+    async def initialize(self):
+        pass
+
+    start = stop = shutdown = initialize
+
+    async def process_update(self, update):
+        if os.environ.get("STUB_HANG"):
+            await asyncio.Event().wait()
+        with open(os.environ["STUB_LOG"], "a") as f:
+            f.write(f"{{update.update_id}}\\n")
+
+
+asyncio.run(sharding.run_worker(Application(), int(os.environ["BOT_WORKER_INDEX"]), os.environ["BOT_WORKER_SOCKET"]))
+"""
+
+
+def update(update_id: int, chat_id: int = 7) -> dict:
+    return {"update_id": update_id,
+            "message": {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "hi"}}
+
+
+def test_updates_queued_behind_a_chat_survive_a_worker_crash(tmp_path, monkeypatch):
+    log = tmp_path / "processed.txt"
+    spawned = []
+
+    async def spawn(self):
+        # The first worker hangs on the chat's first update; its replacement works
+        env = dict(self.env(), STUB_LOG=str(log), STUB_HANG="" if spawned else "1")
+        spawned.append(self.index)
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", STUB_WORKER.format(root=ROOT), env=env)
+        self.last_pong = time.monotonic()
+        self._killed = False
+
+    monkeypatch.setattr(sharding.WorkerProcess, "spawn", spawn)
+    monkeypatch.setattr(sharding, "MAX_RESTART_BACKOFF", 0.1)
+
+    async def reported(w: WorkerProcess, stat: str) -> float:
+        w.reported = {}
+        sharding.write_frame(w.writer, sharding.PING)
+        while stat not in w.reported:
+            await asyncio.sleep(0.01)
+        return w.reported[stat]
+
+    async def chat_depth(w: WorkerProcess, depth: int) -> None:
+        while await reported(w, "queued") < depth:
+            await asyncio.sleep(0.01)
+
+    async def run():
+        ingress = ShardedIngress("token", workers=1)
+        await ingress.start()
+        try:
+            await asyncio.wait_for(ingress.wait_ready(), 30)
+            for update_id in (1, 2, 3):
+                await ingress.dispatch(update(update_id), json.dumps(update(update_id)).encode())
+            w = ingress.workers[0]
+            await asyncio.wait_for(chat_depth(w, 3), 10)
+            # Two of them are only queued behind the first; none has run
+            assert list(w.unacked) == [1, 2, 3]
+
+            w.process.kill()
+            assert await ingress.wait_idle(30)
+            assert w.restarts == 1
+            assert w.acked == 3
+        finally:
+            await ingress.stop(timeout=5)
+
+    asyncio.run(run())
+    assert log.read_text().split() == ["1", "2", "3"]
+
+
+def test_workers_keep_state_in_files_of_their_own():
+    paths = {WorkerProcess(i, 3, "token", "/nonexistent").env()["STATE_DB"] for i in range(3)}
+    assert len(paths) == 3
+    assert sharding.STATE_DB not in paths
@@ -0,0 +1,33 @@
+import gc
+import weakref
+
+from timezones import CityIndex
+
+
+def index_of(tmp_path, name: str, lines: str) -> CityIndex:
+    path = tmp_path / name
+    path.write_text(lines, encoding="utf-8")
+    return CityIndex(str(path))
+
+
+def test_fuzzy_cache_is_per_index(tmp_path):
+    paris = index_of(tmp_path, "a.txt", "@Europe/Paris\nparis\n")
+    perth = index_of(tmp_path, "b.txt", "@Australia/Perth\nperth\n")
+    assert paris.lookup("parsi") == ("paris", "Europe/Paris")
+    assert perth.lookup("parsi") is None
+    assert perth.lookup("pertj") == ("perth", "Australia/Perth")
+
+
+def test_names_are_built_once(tmp_path):
+    index = index_of(tmp_path, "a.txt", "@Europe/Paris\nparis\nparis france\n")
+    assert index.names() == ["paris", "paris france"]
+    assert index.names() is index.names()
+
+
+def test_index_is_not_kept_alive_by_its_cache(tmp_path):
+    index = index_of(tmp_path, "a.txt", "@Europe/Paris\nparis\n")
+    index.lookup("parsi")
+    ref = weakref.ref(index)
+    del index
+    gc.collect()
+    assert ref() is None
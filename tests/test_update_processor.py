@@ -0,0 +1,100 @@
+import asyncio
+
+from telegram import Update
+
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "hi"},
+    }, None)
+
+
+def test_updates_of_a_chat_run_in_order_while_chats_run_concurrently():
+    log = []
+
+    async def handle(u: Update, delay: float):
+        log.append(("start", u.update_id))
+        await asyncio.sleep(delay)
+        log.append(("end", u.update_id))
+
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8)
+        updates = [(update(1, 10), 0.03), (update(2, 10), 0.0), (update(3, 20), 0.0), (update(4, 10), 0.0)]
+        await asyncio.gather(*(processor.process_update(u, handle(u, delay)) for u, delay in updates))
+        # Chat 10 queued behind its first update; process_update returned before those ran
+        while processor.stats()["active_chats"]:
+            await asyncio.sleep(0.01)
+        return processor
+
+    processor = asyncio.run(run())
+    chat_10 = [event for event in log if event[1] in (1, 2, 4)]
+    assert chat_10 == [("start", 1), ("end", 1), ("start", 2), ("end", 2), ("start", 4), ("end", 4)]
+    # Chat 20 didn't wait for chat 10's slow update
+    assert log.index(("end", 3)) < log.index(("end", 1))
+    assert processor.processed == 4
+
+
+def test_updates_over_the_chat_limit_are_dropped():
+    ran = []
+
+    async def handle(u: Update):
+        ran.append(u.update_id)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8, max_pending_per_chat=3)
+        results = await asyncio.gather(*(processor.process_and_wait(u, handle(u))
+                                         for u in (update(i, 10) for i in range(1, 6))))
+        return processor, results
+
+    processor, results = asyncio.run(run())
+    # One running and two waiting; the rest are dropped without running
+    assert results == [True, True, True, False, False]
+    assert ran == [1, 2, 3]
+    assert processor.dropped == 2
+
+
+def test_process_and_wait_returns_once_a_queued_update_has_run():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8)
+        release = asyncio.Event()
+        done = []
+
+        async def first():
+            await release.wait()
+
+        async def second():
+            done.append(2)
+
+        first_task = asyncio.ensure_future(processor.process_and_wait(update(1, 10), first()))
+        second_task = asyncio.ensure_future(processor.process_and_wait(update(2, 10), second()))
+        await asyncio.sleep(0.01)
+        assert not second_task.done()
+        release.set()
+        assert await second_task is True
+        assert done == [2]
+        assert await first_task is True
+
+    asyncio.run(run())
+
+
+def test_a_failing_update_does_not_stall_its_chat():
+    ran = []
+
+    async def fail():
+        raise RuntimeError("handler bug")
+
+    async def succeed():
+        ran.append(2)
+
+    async def run():
+        processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8)
+        results = await asyncio.gather(processor.process_and_wait(update(1, 10), fail()),
+                                       processor.process_and_wait(update(2, 10), succeed()))
+        assert results == [True, True]
+
+    asyncio.run(run())
+    assert ran == [2]
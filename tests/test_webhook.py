@@ -0,0 +1,156 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+from fake_bot_api import FakeBotAPI
+from metrics import fast_replies
+from update_processor import ChatOrderedUpdateProcessor
+from webhook import PATH, SECRET_HEADER, MalformedUpdate, WebhookServer, check_secret, update_dispatcher
+
+SECRET = "s3cret"
+
+
+class Limiter:
+    def __init__(self, free: bool):
+        self.free = free
+
+    def try_acquire(self, chat_id):
+        return self.free
+
+
+def command(text: str, update_id: int = 1) -> bytes:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": text},
+    }).encode()
+
+
+def post(body: bytes, content_length: str | None = None) -> bytes:
+    length = str(len(body)) if content_length is None else content_length
+    return (f"POST {PATH} HTTP/1.1\r\n{SECRET_HEADER}: {SECRET}\r\nContent-Length: {length}\r\n\r\n").encode() + body
+
+
+def exchange(request: bytes, rate_limiter=None, error: Exception | None = None) -> tuple[int, bytes, list]:
+    dispatched = []
+
+    async def dispatch(data, body):
+        if error is not None:
+            raise error
+        dispatched.append(data)
+
+    async def run():
+        bot = SimpleNamespace(username="testbot", rate_limiter=rate_limiter)
+        server = WebhookServer(bot, dispatch, SECRET, listen="127.0.0.1", port=0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        payload = await reader.readexactly(length)
+        writer.close()
+        await server.drain(timeout=1)
+        return int(head.split(b" ")[1]), payload
+
+    status, payload = asyncio.run(run())
+    return status, payload, dispatched
+
+
+def test_fast_reply_is_answered_and_counted():
+    before = fast_replies.values.get(("ping",), 0)
+    status, payload, dispatched = exchange(post(command("/ping")))
+    assert status == 200
+    assert json.loads(payload)["method"] == "sendMessage"
+    assert dispatched == []
+    assert fast_replies.values[("ping",)] == before + 1
+
+
+def test_fast_reply_without_a_free_token_goes_to_the_handlers():
+    status, payload, dispatched = exchange(post(command("/ping")), rate_limiter=Limiter(free=False))
+    assert status == 200
+    assert payload == b""
+    assert len(dispatched) == 1
+
+
+def test_non_json_body_is_a_bad_request():
+    status, _, dispatched = exchange(post(b"not json"))
+    assert status == 400
+    assert dispatched == []
+
+
+def test_json_that_is_not_an_update_is_a_bad_request():
+    for body in (b"[1, 2]", b'{"message": {}}', b'{"update_id": 1, "message": {"text": "/ping"}}'):
+        status, _, dispatched = exchange(post(body))
+        assert status == 400, body
+        assert dispatched == []
+
+
+def test_bad_content_length_is_a_bad_request():
+    status, _, _ = exchange(post(b"{}", content_length="lots"))
+    assert status == 400
+    status, _, _ = exchange(post(b"{}", content_length="-1"))
+    assert status == 400
+
+
+def test_bad_request_line_is_a_bad_request():
+    status, _, _ = exchange(b"GARBAGE\r\n\r\n")
+    assert status == 400
+
+
+def test_dispatch_errors_are_answered_rather_than_dropping_the_connection():
+    assert exchange(post(command("hello")), error=asyncio.TimeoutError())[0] == 503
+    assert exchange(post(command("hello")), error=MalformedUpdate("bad chat"))[0] == 400
+    assert exchange(post(command("hello")), error=RuntimeError("handler bug"))[0] == 500
+
+
+def test_secret_is_required_unless_this_process_registers_the_webhook(monkeypatch):
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    monkeypatch.delenv("WEBHOOK_URL", raising=False)
+    with pytest.raises(RuntimeError):
+        check_secret()
+    monkeypatch.setenv("WEBHOOK_URL", "https://bot.example.com")
+    check_secret()
+    monkeypatch.delenv("WEBHOOK_URL")
+    monkeypatch.setenv("WEBHOOK_SECRET", SECRET)
+    check_secret()
+
+
+def test_dispatch_waits_for_room_and_times_out_while_updates_pile_up():
+    async def run():
+        api = FakeBotAPI()
+        await api.start()
+        application = (ApplicationBuilder().token("123:test").base_url(f"http://127.0.0.1:{api.port}/bot")
+                       .updater(None).concurrent_updates(ChatOrderedUpdateProcessor()).build())
+        release = asyncio.Event()
+        handled = []
+
+        async def handler(update, context):
+            await release.wait()
+            handled.append(update.update_id)
+
+        application.add_handler(TypeHandler(Update, handler))
+        await application.initialize()
+        await application.start()
+        dispatch = update_dispatcher(application, max_pending=2, timeout=0.05)
+        try:
+            # Two chats take both places even though their handlers haven't finished
+            for update_id in (1, 2):
+                await dispatch(json.loads(command("/start", update_id)), b"")
+            with pytest.raises(asyncio.TimeoutError):
+                await dispatch(json.loads(command("/start", 3)), b"")
+            with pytest.raises(MalformedUpdate):
+                await dispatch({"update_id": 4, "message": {"chat": {"id": 5}}}, b"")
+            release.set()
+            await dispatch(json.loads(command("/start", 5)), b"")
+        finally:
+            await application.stop()
+            await application.shutdown()
+            await api.stop()
+        return handled
+
+    assert sorted(asyncio.run(run())) == [1, 2, 5]
@@ -0,0 +1,152 @@
+import asyncio
+
+import httpx
+import pytest
+
+import cache
+from persistence import StateStore
+from wiki_engine import AMBIGUOUS, FOUND, MISSING, WikipediaClient
+
+API_URL = "https://en.wikipedia.org/w/api.php"
+
+PAGES = {
+    "Python (programming language)": {
+        "title": "Python (programming language)",
+        "extract": "Python is a programming language.\nMore detail.",
+        "fullurl": "https://en.wikipedia.org/wiki/Python_(programming_language)",
+    },
+    "Mercury": {
+        "title": "Mercury",
+        "pageprops": {"disambiguation": ""},
+        "links": [{"title": f"Mercury ({kind})"} for kind in ("planet", "element", "mythology", "band", "car", "film")],
+    },
+}
+REDIRECTS = {"Python language": "Python (programming language)"}
+
+
+class FakeMediaWiki:
+    """Answers title queries and prefix searches from PAGES, counting requests."""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        self.requests.append(params)
+        if params.get("generator") == "prefixsearch":
+            return httpx.Response(200, json=self.search(params["gpssearch"], int(params["gpslimit"])))
+        title = params["titles"]
+        query = {}
+        if title in REDIRECTS:
+            query["redirects"] = [{"from": title, "to": REDIRECTS[title]}]
+            title = REDIRECTS[title]
+        query["pages"] = [PAGES.get(title, {"title": title, "missing": True})]
+        return httpx.Response(200, json={"query": query})
+
+    @staticmethod
+    def search(prefix: str, limit: int) -> dict:
+        names = sorted(name for name in list(PAGES) + list(REDIRECTS) if name.lower().startswith(prefix.lower()))
+        pages, redirects = [], []
+        for index, name in enumerate(names[:limit], 1):
+            title = REDIRECTS.get(name, name)
+            if title != name:
+                redirects.append({"from": name, "to": title, "index": index})
+            if title not in {page["title"] for page in pages}:
+                pages.append({**PAGES[title], "index": index})
+        # MediaWiki returns pages in no particular order; `index` ranks them
+        return {"query": {"pages": pages[::-1], "redirects": redirects}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    """Every WikipediaClient registers a "wiki" cache; a stale one would shadow the next."""
+    cache._registry.clear()
+    yield
+    cache._registry.clear()
+
+
+def client_and_api() -> tuple[httpx.AsyncClient, FakeMediaWiki]:
+    api = FakeMediaWiki()
+    return httpx.AsyncClient(transport=httpx.MockTransport(api)), api
+
+
+def test_one_query_returns_summary_url_and_disambiguation():
+    async def run():
+        client, api = client_and_api()
+        wiki = WikipediaClient(API_URL)
+        async with client:
+            article = await wiki.lookup(client, "python_language")
+            ambiguous = await wiki.lookup(client, "mercury")
+            missing = await wiki.lookup(client, "no such article")
+        return api, article, ambiguous, missing
+
+    api, article, ambiguous, missing = asyncio.run(run())
+    assert len(api.requests) == 3
+    assert api.requests[0]["titles"] == "Python language"
+    assert set(api.requests[0]["prop"].split("|")) == {"extracts", "info", "pageprops", "links"}
+    assert api.requests[0]["redirects"] == "1"
+    assert (article.status, article.title, article.summary) == (
+        FOUND, "Python (programming language)", "Python is a programming language.")
+    assert article.url.endswith("/Python_(programming_language)")
+    assert (ambiguous.status, len(ambiguous.options)) == (AMBIGUOUS, 5)
+    assert missing.status == MISSING
+
+
+def test_lookups_share_requests_and_cache_entries():
+    async def run():
+        client, api = client_and_api()
+        wiki = WikipediaClient(API_URL)
+        async with client:
+            results = await asyncio.gather(*(wiki.lookup(client, "Python language") for _ in range(5)))
+            # The redirect target was cached under its own title too
+            resolved = await wiki.lookup(client, "python (programming language)")
+        return api, results, resolved
+
+    api, results, resolved = asyncio.run(run())
+    assert len(api.requests) == 1
+    assert all(result is results[0] for result in results)
+    assert resolved.title == "Python (programming language)"
+
+
+def test_prefix_search_ranks_results_and_names_redirects():
+    async def run():
+        client, api = client_and_api()
+        async with client:
+            return api, await WikipediaClient(API_URL).search(client, "py", limit=5)
+
+    api, found = asyncio.run(run())
+    assert api.requests[0]["generator"] == "prefixsearch"
+    assert api.requests[0]["gpssearch"] == "py"
+    assert len(found) == 1
+    names, article = found[0]
+    assert set(names) == {"python (programming language)", "python language"}
+    assert article.summary == "Python is a programming language."
+
+
+def test_looked_up_articles_survive_a_restart(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    async def first_run():
+        store = StateStore(path, flush_interval=3600)
+        await store.open()
+        client, api = client_and_api()
+        async with client:
+            await WikipediaClient(API_URL).lookup(client, "Mercury")
+        await store.flush()
+
+    async def second_run():
+        store = StateStore(path, flush_interval=3600)
+        await store.open()
+        wiki = WikipediaClient(API_URL)
+        await asyncio.gather(*store._restores)
+        client, api = client_and_api()
+        async with client:
+            result = await wiki.lookup(client, "Mercury")
+        await store.flush()
+        return api, result
+
+    asyncio.run(first_run())
+    cache._registry.clear()
+    api, result = asyncio.run(second_run())
+    assert api.requests == []
+    assert result.status == AMBIGUOUS
@@ -0,0 +1,178 @@
+import difflib
+import os
+import re
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from utils import env_int
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.txt")
+MAX_CITIES = env_int("TIME_MAX_CITIES", 10)
+MIN_PREFIX = 3
+
+
+class TimezoneError(ValueError):
+    """Raised when a city can't be resolved to a time zone."""
+
+
+def normalize(name: str) -> str:
+    """Lowercases, strips accents and punctuation, and collapses spaces."""
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.sub(r"[_\-.,']", " ", name).split())
+
+
+class CityIndex:
+    """Maps city and alias names to IANA zones, loaded from DATA_PATH on first use.
+
+    The sorted names are packed into a single string with an array of offsets
+    and an array of zone numbers, rather than a dict of small strings, which
+    keeps the index to a few tens of KiB and allows prefix lookups by bisection.
+    """
+
+    def __init__(self, path: str = DATA_PATH):
+        self.path = path
+        self._blob = ""
+        self._offsets = array("I")
+        self._zone_of = array("H")
+        self._zones: list[str] = []
+        self._loaded = False
+        self._names: list[str] | None = None
+        # Per index, so the cache neither outlives it nor mixes in other indexes' names
+        self._fuzzy = lru_cache(maxsize=1024)(self._closest)
+
+    def _load(self) -> None:
+        entries = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("@"):
+                    self._zones.append(line[1:])
+                else:
+                    entries.append((line, len(self._zones) - 1))
+        entries.sort()
+        offset = 0
+        for name, zone in entries:
+            self._offsets.append(offset)
+            self._zone_of.append(zone)
+            offset += len(name)
+        self._offsets.append(offset)
+        self._blob = "".join(name for name, _ in entries)
+        self._loaded = True
+
+    def __len__(self) -> int:
+        if not self._loaded:
+            self._load()
+        return len(self._zone_of)
+
+    def _name(self, i: int) -> str:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+    def _bisect(self, key: str) -> int:
+        """Returns the position of the first name >= key."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def names(self) -> list[str]:
+        """Returns every name in order; built on the first call, which fuzzy lookups need."""
+        if self._names is None:
+            self._names = [self._name(i) for i in range(len(self))]
+        return self._names
+
+    def lookup(self, query: str) -> tuple[str, str] | None:
+        """Returns (matched name, zone) for an exact, prefix or close match."""
+        key = normalize(query)
+        if not key:
+            return None
+        i = self._bisect(key)
+        if i < len(self) and self._name(i).startswith(key) and (self._name(i) == key or len(key) >= MIN_PREFIX):
+            return self._name(i), self._zones[self._zone_of[i]]
+        match = self._fuzzy(key)
+        if match is None:
+            return None
+        return match, self._zones[self._zone_of[self._bisect(match)]]
+
+    def _closest(self, key: str) -> str | None:
+        matches = difflib.get_close_matches(key, self.names(), n=1, cutoff=0.8)
+        return matches[0] if matches else None
+
+    def suggestions(self, prefix: str, limit: int = 5) -> list[str]:
+        """Returns up to `limit` names starting with a prefix."""
+        key = normalize(prefix)
+        i = self._bisect(key)
+        found = []
+        while i < len(self) and len(found) < limit and self._name(i).startswith(key):
+            found.append(self._name(i))
+            i += 1
+        return found
+
+
+city_index = CityIndex()
+
+
+@dataclass
+class CityTime:
+    """The current time for one requested city."""
+    query: str
+    name: str
+    zone: str
+    now: datetime
+
+
+def resolve(query: str) -> tuple[str, str]:
+    """Returns (name, zone) for a city, alias or IANA zone name."""
+    if "/" in query or query.strip().upper() == "UTC":
+        try:
+            ZoneInfo(query.strip())
+            return query.strip(), query.strip()
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    found = city_index.lookup(query)
+    if found is None:
+        hint = city_index.suggestions(query[:MIN_PREFIX]) if len(query) >= MIN_PREFIX else []
+        message = f"I don't know where '{query}' is."
+        if hint:
+            message += f" Did you mean: {', '.join(name.title() for name in hint)}?"
+        raise TimezoneError(message)
+    return found
+
+
+def parse(text: str) -> list[str]:
+    """Splits a comma-separated list of cities."""
+    cities = [city.strip() for city in text.split(",") if city.strip()]
+    if not cities:
+        raise TimezoneError("Please provide a city name.")
+    if len(cities) > MAX_CITIES:
+        raise TimezoneError(f"Please ask for at most {MAX_CITIES} cities at a time.")
+    return cities
+
+
+def current_times(cities: list[str]) -> list[CityTime]:
+    """Resolves each city and reads the current time there."""
+    results = []
+    for query in cities:
+        name, zone = resolve(query)
+        results.append(CityTime(query, name, zone, datetime.now(ZoneInfo(zone))))
+    return results
+
+
+def format_result(results: list[CityTime]) -> str:
+    lines = []
+    for result in results:
+        # Show the user's spelling for exact matches, and the matched name otherwise
+        name = result.query if normalize(result.query) == normalize(result.name) else result.name.title()
+        offset = result.now.strftime("%z")
+        lines.append(
+            f"🕐 {name} ({result.zone}): {result.now:%H:%M, %a %d %b} (UTC{offset[:3]}:{offset[3:]})"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from utils import logger, env_int
+
+MAX_CONCURRENT_UPDATES = env_int("BOT_CONCURRENT_UPDATES", 64)
+MAX_PENDING_PER_CHAT = env_int("BOT_MAX_PENDING_PER_CHAT", 50)
+
+
+class _ChatQueue:
+    """The updates waiting behind the one a chat is processing."""
+
+    __slots__ = ("waiting",)
+
+    def __init__(self):
+        self.waiting: deque[tuple[Awaitable, float]] = deque()
+
+
+def ordering_key(update: object) -> int | None:
+    """Returns the chat (or, failing that, user) an update must be ordered within."""
+    if isinstance(update, Update):
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently across chats but strictly in order within a chat.
+
+    The base class gives each update one of max_concurrent_updates slots
+    before calling do_process_update. The first update of an idle chat
+    keeps its slot and then works through the updates that queued up behind
+    it in the meantime; those are handed over and return at once. A busy
+    chat thus holds a single slot, and a slow or flooded one never holds up
+    other chats. Updates arriving for a chat with max_pending_per_chat
+    already queued are dropped, logged and counted. Callers that need to
+    know when a queued update has actually run use process_and_wait().
+    """
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES, max_pending_per_chat: int = MAX_PENDING_PER_CHAT):
+        super().__init__(max_concurrent_updates)
+        self.max_pending_per_chat = max_pending_per_chat
+        self._chats: dict[int, _ChatQueue] = {}
+        # Coroutine -> future resolved once it has run (True) or been dropped (False)
+        self._done: dict[Awaitable, asyncio.Future] = {}
+        self.in_flight = 0
+        self.processed = 0
+        self.dropped = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = ordering_key(update)
+        if key is None:
+            await self._run(coroutine, 0.0)
+            return
+
+        chat = self._chats.get(key)
+        if chat is not None:
+            # The chat is busy: queue behind it and give the slot back
+            if len(chat.waiting) + 1 >= self.max_pending_per_chat:
+                self._close(coroutine)
+                self.dropped += 1
+                logger.warning("Dropping update %s for chat %s: %s updates already queued",
+                               getattr(update, "update_id", None), key, len(chat.waiting) + 1)
+                return
+            chat.waiting.append((coroutine, time.monotonic()))
+            return
+
+        chat = self._chats[key] = _ChatQueue()
+        try:
+            await self._run(coroutine, 0.0)
+            while chat.waiting:
+                coroutine, enqueued_at = chat.waiting.popleft()
+                await self._run(coroutine, time.monotonic() - enqueued_at)
+        finally:
+            del self._chats[key]
+            # Only left over if the task was cancelled; don't leave them unawaited
+            for coroutine, _ in chat.waiting:
+                self._close(coroutine)
+
+    async def process_and_wait(self, update: object, coroutine: Awaitable) -> bool:
+        """Processes an update and returns once it has run.
+
+        Unlike process_update, this doesn't return as soon as the update is
+        queued behind its chat. Returns False if the update was dropped.
+        """
+        done = asyncio.get_running_loop().create_future()
+        self._done[coroutine] = done
+        try:
+            await self.process_update(update, coroutine)
+            return await done
+        finally:
+            self._done.pop(coroutine, None)
+
+    def _resolve(self, coroutine: Awaitable, ran: bool) -> None:
+        done = self._done.pop(coroutine, None)
+        if done is not None and not done.done():
+            done.set_result(ran)
+
+    def _close(self, coroutine: Awaitable) -> None:
+        coroutine.close()
+        self._resolve(coroutine, False)
+
+    async def _run(self, coroutine: Awaitable, waited: float) -> None:
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self.in_flight += 1
+        try:
+            await coroutine
+        except Exception:
+            # Application.process_update reports handler errors itself; keep the chat's queue going
+            logger.exception("Processing an update failed")
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+            self._resolve(coroutine, True)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, float]:
+        """Returns queue depth, throughput and wait time counters."""
+        # A busy chat's depth counts the update it is processing
+        depths = [len(chat.waiting) + 1 for chat in self._chats.values()]
+        return {
+            "active_chats": len(depths),
+            "queued": sum(depths),
+            "max_chat_depth": max(depths, default=0),
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "wait_time_avg": self.wait_time_total / self.processed if self.processed else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
@@ -1,10 +1,155 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import sys
+import time
 from datetime import datetime
 import logging
+import logging.handlers
 
-# Enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO
+start_time = datetime.now()
+
+
+def env_int(name: str, default: int) -> int:
+    """Reads an integer setting from the environment."""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_float(name: str, default: float) -> float:
+    """Reads a float setting from the environment."""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """Reads a boolean setting from the environment."""
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Repeats of the same warning or error are logged at most once per interval
+LOG_SAMPLE_INTERVAL = env_float("LOG_SAMPLE_INTERVAL", 60.0)
+
+# The chat and command the current update is being handled for
+_log_context: contextvars.ContextVar[tuple[int | None, str | None]] = contextvars.ContextVar(
+    "log_context", default=(None, None)
 )
-logger = logging.getLogger(__name__)
 
-start_time = datetime.now()
+
+def set_log_context(chat_id: int | None, command: str | None) -> None:
+    """Tags log records from the current task with a chat and command."""
+    _log_context.set((chat_id, command))
+
+
+class ContextFilter(logging.Filter):
+    """Copies the chat/command context onto records before they leave the task."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.chat_id, record.command = _log_context.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through one record per interval for each repeated warning or error.
+
+    Records are grouped by logger, level and unformatted message, so log
+    calls must pass their arguments lazily (logger.error("...: %s", e)).
+    The next record let through reports how many were suppressed.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._seen: dict[tuple, list] = {}  # key -> [last emitted, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        entry = self._seen.get(key)
+        if entry is None:
+            if len(self._seen) >= 1024:
+                self._seen.clear()
+            self._seen[key] = [now, 0]
+            return True
+        if now - entry[0] < self.interval:
+            entry[1] += 1
+            return False
+        record.suppressed = entry[1]
+        entry[0], entry[1] = now, 0
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted, so formatting happens on the writer thread.
+
+    Log arguments are therefore formatted slightly later; pass values rather
+    than objects that are mutated right after logging.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        if getattr(record, "chat_id", None) is not None or getattr(record, "command", None):
+            text += f" [chat={record.chat_id} command={record.command}]"
+        if getattr(record, "suppressed", 0):
+            text += f" ({record.suppressed} similar suppressed)"
+        return text
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("chat_id", "command", "suppressed"):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Routes all logging through a queue to a background writer thread."""
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_INTERVAL))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+# Enable logging
+log_listener = setup_logging()
+logger = logging.getLogger(__name__)
@@ -0,0 +1,318 @@
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+import time
+from http import HTTPStatus
+from typing import Awaitable, Callable
+from telegram import Bot, Update
+from telegram.ext import Application
+from handlers.basic import FAST_REPLIES
+from flood_engine import ANTIFLOOD
+from metrics import fast_replies, handler_latency
+from utils import logger, env_int, env_float
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+PORT = env_int("WEBHOOK_PORT", 8443)
+PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+MAX_BODY_SIZE = env_int("WEBHOOK_MAX_BODY_SIZE", 1024 * 1024)
+DRAIN_TIMEOUT = env_float("WEBHOOK_DRAIN_TIMEOUT", 10.0)
+# Single-process mode: updates accepted but not yet handled, and how long a request waits for room
+MAX_PENDING = env_int("WEBHOOK_MAX_PENDING", 256)
+DISPATCH_TIMEOUT = env_float("WEBHOOK_DISPATCH_TIMEOUT", 10.0)
+HEADER_LIMIT = 16 * 1024
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class MalformedUpdate(ValueError):
+    """Raised by dispatch for an update it can't decode."""
+
+
+def loads(body: bytes):
+    """Decodes a JSON body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(data) -> bytes:
+    """Encodes a JSON body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def fast_reply(data: dict, bot_username: str | None) -> tuple[str, dict] | None:
+    """Builds a Bot API method call answering an update without running handlers.
+
+    Works on the raw decoded JSON so that updates it answers never pay for
+    building Update objects. Returns (command, method call), or None for
+    updates that need a handler.
+    """
+    message = data.get("message")
+    if not message:
+        return None
+    # Group messages must pass the anti-flood check first
+    if ANTIFLOOD and message["chat"].get("type") != "private":
+        return None
+    text = message.get("text")
+    if not text or text[0] != "/":
+        return None
+    words = text[1:].split(maxsplit=1)
+    if not words:
+        return None
+    command, _, target = words[0].partition("@")
+    if target and (not bot_username or target.lower() != bot_username.lower()):
+        return None
+    reply = FAST_REPLIES.get(command.lower())
+    if reply is None:
+        return None
+    method = {"method": "sendMessage", "chat_id": message["chat"]["id"], "text": reply()}
+    if message.get("is_topic_message") and "message_thread_id" in message:
+        method["message_thread_id"] = message["message_thread_id"]
+    return command.lower(), method
+
+
+class WebhookServer:
+    """A small asyncio HTTP/1.1 server that receives webhook updates.
+
+    Requests must carry the secret token Telegram was given in setWebhook.
+    Updates that FAST_REPLIES can answer are answered in the HTTP response
+    itself, if the bot's rate limiter has a token free for the chat, and are
+    counted with the handlers' metrics; everything else is passed, decoded
+    and raw, to `dispatch`. The response waits for dispatch, so a slow
+    consumer slows Telegram down; if dispatch raises asyncio.TimeoutError,
+    the answer is a 503 and Telegram sends the update again later.
+    Malformed requests, and updates dispatch rejects with MalformedUpdate,
+    get a 400; any other error in dispatch is logged and gets a 500.
+    """
+
+    def __init__(self, bot: Bot, dispatch: Callable[[dict, bytes], Awaitable[None]], secret_token: str,
+                 listen: str = LISTEN, port: int = PORT, path: str = PATH):
+        self.bot = bot
+        self.dispatch = dispatch
+        self.secret_token = secret_token.encode()
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[asyncio.Task] = set()
+        self._busy = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._draining = False
+        self.requests = 0
+        self.fast_replies = 0
+        self.rejected = 0
+        self.malformed = 0
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._accept, self.listen, self.port, limit=HEADER_LIMIT)
+        logger.info("Webhook server listening on %s:%s%s", self.listen, self.port, self.path)
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Stops accepting requests and waits for in-flight ones to finish."""
+        self._draining = True
+        if self._server is not None:
+            self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook drain timed out with %s requests in flight", self._busy)
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while not self._draining:
+                keep_alive = await self._serve_one(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _serve_one(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        head = await reader.readuntil(b"\r\n\r\n")
+        self._busy += 1
+        self._idle.clear()
+        try:
+            try:
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, version = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if line:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    raise ValueError(f"negative Content-Length {length}")
+            except ValueError:
+                # Where the body would end is unknown, so the connection can't be reused
+                self.malformed += 1
+                await self._respond(writer, HTTPStatus.BAD_REQUEST, keep_alive=False)
+                return False
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+            if length > MAX_BODY_SIZE:
+                await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, keep_alive=False)
+                return False
+            body = await reader.readexactly(length) if length else b""
+
+            if method != "POST" or target != self.path:
+                status, payload = HTTPStatus.NOT_FOUND, None
+            elif not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret_token):
+                self.rejected += 1
+                status, payload = HTTPStatus.FORBIDDEN, None
+            else:
+                status, payload = await self._handle_update(body)
+            await self._respond(writer, status, payload, keep_alive and not self._draining)
+            return keep_alive
+        finally:
+            self._busy -= 1
+            if self._busy == 0:
+                self._idle.set()
+
+    async def _handle_update(self, body: bytes) -> tuple[HTTPStatus, bytes | None]:
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            data = loads(body)
+            if not isinstance(data, dict) or "update_id" not in data:
+                raise ValueError("not an update")
+            reply = fast_reply(data, self.bot.username)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.malformed += 1
+            logger.warning("Rejecting a malformed webhook update: %s", e)
+            return HTTPStatus.BAD_REQUEST, None
+        if reply is not None:
+            command, method = reply
+            # Fast replies still count against the chat's send rate; without a free token, the handler answers
+            limiter = getattr(self.bot, "rate_limiter", None)
+            if limiter is None or not hasattr(limiter, "try_acquire") or limiter.try_acquire(method["chat_id"]):
+                self.fast_replies += 1
+                fast_replies.inc(command)
+                handler_latency.observe(time.perf_counter() - started, command)
+                return HTTPStatus.OK, dumps(method)
+        try:
+            await self.dispatch(data, body)
+        except asyncio.TimeoutError:
+            return HTTPStatus.SERVICE_UNAVAILABLE, None
+        except MalformedUpdate as e:
+            self.malformed += 1
+            logger.warning("Rejecting a malformed webhook update: %s", e)
+            return HTTPStatus.BAD_REQUEST, None
+        except Exception:
+            logger.exception("Dispatching webhook update %s failed", data["update_id"])
+            return HTTPStatus.INTERNAL_SERVER_ERROR, None
+        return HTTPStatus.OK, None
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, payload: bytes | None = None, keep_alive: bool = True) -> None:
+        headers = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Length: {len(payload) if payload else 0}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if payload:
+            headers.append("Content-Type: application/json")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + (payload or b""))
+        await writer.drain()
+
+
+def check_secret() -> None:
+    """Raises RuntimeError if WEBHOOK_SECRET is needed but unset.
+
+    Without WEBHOOK_URL the webhook is registered by someone else, who has
+    to know the secret; a random one is only good when this process
+    registers the webhook itself.
+    """
+    if not os.getenv("WEBHOOK_SECRET") and not os.getenv("WEBHOOK_URL"):
+        raise RuntimeError("WEBHOOK_SECRET must be set when WEBHOOK_URL is not")
+
+
+async def start_server(bot: Bot, dispatch: Callable[[dict, bytes], Awaitable[None]]) -> WebhookServer:
+    """Starts a WebhookServer and registers it with Telegram if WEBHOOK_URL is set."""
+    check_secret()
+    secret_token = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    webhook_url = os.getenv("WEBHOOK_URL")
+    server = WebhookServer(bot, dispatch, secret_token)
+    await server.start()
+    if webhook_url:
+        await bot.set_webhook(
+            webhook_url + PATH,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    return server
+
+
+async def wait_for_stop() -> None:
+    """Returns on SIGINT or SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+def update_dispatcher(application: Application, max_pending: int = MAX_PENDING,
+                      timeout: float = DISPATCH_TIMEOUT) -> Callable[[dict, bytes], Awaitable[None]]:
+    """Returns a dispatch function that hands updates to the application's update processor.
+
+    Updates skip the application's update queue, which PTB drains into
+    tasks at once. At most `max_pending` of them may be accepted but not
+    yet handled; dispatch waits for room and raises asyncio.TimeoutError
+    if there is none for `timeout` seconds. The application must be running.
+    """
+    pending = asyncio.Semaphore(max_pending)
+
+    async def process(update: Update) -> None:
+        try:
+            await application.update_processor.process_and_wait(update, application.process_update(update))
+        finally:
+            pending.release()
+
+    async def dispatch(data: dict, body: bytes) -> None:
+        try:
+            update = Update.de_json(data, application.bot)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise MalformedUpdate(e) from e
+        await asyncio.wait_for(pending.acquire(), timeout)
+        application.create_task(process(update), update=update)
+
+    return dispatch
+
+
+async def serve(application: Application) -> None:
+    """Runs the application in webhook mode until SIGINT or SIGTERM."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    # Running first, so tasks created for updates are awaited when it stops
+    await application.start()
+    server = await start_server(application.bot, update_dispatcher(application))
+    try:
+        await wait_for_stop()
+    finally:
+        logger.info("Draining webhook server")
+        await server.drain()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,138 @@
+import os
+from dataclasses import dataclass, field
+import httpx
+from cache import AsyncTTLCache
+from http_client import timeout_for
+from utils import env_int
+
+API_URL = os.getenv("WIKI_API_URL", "https://en.wikipedia.org/w/api.php")
+USER_AGENT = "Telegram-PY-bot-simple (https://github.com/mwmQi/Telegram-PY-bot-simple)"
+MAX_OPTIONS = 5
+
+FOUND = "found"
+MISSING = "missing"
+AMBIGUOUS = "ambiguous"
+
+
+@dataclass(frozen=True)
+class WikiResult:
+    """The outcome of a Wikipedia lookup."""
+    status: str
+    title: str
+    summary: str = ""
+    url: str = ""
+    options: list[str] = field(default_factory=list)
+
+
+def normalize_title(query: str) -> str:
+    """Normalizes a title the way MediaWiki does before looking it up."""
+    title = " ".join(query.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+class WikipediaClient:
+    """Looks up Wikipedia articles without blocking the event loop.
+
+    Title, introduction, canonical URL, disambiguation status and the links
+    of disambiguation pages all come back from a single API query.
+    """
+
+    def __init__(self, api_url: str = API_URL, ttl: float = 60 * 60, max_entries: int | None = None):
+        self.api_url = api_url
+        self.cache = AsyncTTLCache(
+            "wiki", ttl=ttl, max_entries=max_entries or env_int("WIKI_CACHE_ENTRIES", 2048), persist=True
+        )
+
+    async def lookup(self, client: httpx.AsyncClient, query: str) -> WikiResult:
+        """Returns the article for a query, served from cache when possible."""
+        title = normalize_title(query)
+        return await self.cache.get_or_fetch(title, lambda: self._fetch(client, title))
+
+    async def _fetch(self, client: httpx.AsyncClient, title: str) -> WikiResult:
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "redirects": "1",
+            "titles": title,
+            "prop": "extracts|info|pageprops|links",
+            "exintro": "1",
+            "explaintext": "1",
+            "inprop": "url",
+            "ppprop": "disambiguation",
+            "plnamespace": "0",
+            "pllimit": "50",
+        }
+        response = await client.get(
+            self.api_url,
+            params=params,
+            headers={"User-Agent": USER_AGENT},
+            timeout=timeout_for(self.api_url),
+        )
+        response.raise_for_status()
+        result = self.parse(title, response.json())
+        if result.status == FOUND and result.title != title:
+            # Remember the resolved title too, so redirects and aliases share an entry
+            self.cache.set(result.title, result)
+        return result
+
+    async def search(self, client: httpx.AsyncClient, prefix: str,
+                     limit: int = MAX_OPTIONS) -> list[tuple[tuple[str, ...], WikiResult]]:
+        """Returns up to `limit` articles whose title, or a redirect to them, starts with `prefix`.
+
+        Each article comes with the lowercased names it can be found by.
+        """
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "redirects": "1",
+            "generator": "prefixsearch",
+            "gpssearch": prefix,
+            "gpslimit": str(limit),
+            "prop": "extracts|info",
+            "exintro": "1",
+            "explaintext": "1",
+            "exlimit": str(limit),
+            "exsentences": "2",
+            "inprop": "url",
+        }
+        response = await client.get(
+            self.api_url,
+            params=params,
+            headers={"User-Agent": USER_AGENT},
+            timeout=timeout_for(self.api_url),
+        )
+        response.raise_for_status()
+        return self.parse_search(response.json())
+
+    @staticmethod
+    def parse_search(data: dict) -> list[tuple[tuple[str, ...], WikiResult]]:
+        """Turns a prefix search response into (names, article) pairs, best match first."""
+        query = data.get("query", {})
+        redirected_from = {redirect["to"]: redirect["from"] for redirect in query.get("redirects", [])}
+        found = []
+        for page in sorted(query.get("pages", []), key=lambda page: page.get("index", 0)):
+            if page.get("missing") or page.get("invalid"):
+                continue
+            title = page["title"]
+            summary = page.get("extract", "").split("\n")[0]
+            result = WikiResult(FOUND, title, summary=summary, url=page.get("fullurl", ""))
+            names = {title.lower(), redirected_from.get(title, title).lower()}
+            found.append((tuple(names), result))
+        return found
+
+    @staticmethod
+    def parse(title: str, data: dict) -> WikiResult:
+        """Turns an API query response into a WikiResult."""
+        pages = data.get("query", {}).get("pages", [])
+        if not pages:
+            return WikiResult(MISSING, title)
+        page = pages[0]
+        if page.get("missing") or page.get("invalid"):
+            return WikiResult(MISSING, page.get("title", title))
+        if "disambiguation" in page.get("pageprops", {}):
+            options = [link["title"] for link in page.get("links", [])[:MAX_OPTIONS]]
+            return WikiResult(AMBIGUOUS, page["title"], options=options)
+        summary = page.get("extract", "").split("\n")[0]
+        return WikiResult(FOUND, page["title"], summary=summary, url=page.get("fullurl", ""))